@@ -0,0 +1,281 @@
+# backend/admission.py - Admission control for OpenAI-bound chat turns (quota buckets, per-client caps, load shedding)
+import asyncio
+import math
+import threading
+import time
+
+
+class AdmissionRejected(Exception):
+    """The turn can't start in time. `status` is 503 (overloaded) or 429 (per-client cap); send Retry-After."""
+
+    def __init__(self, message: str, reason: str, status: int, retry_after: float):
+        super().__init__(message)
+        self.reason = reason
+        self.status = status
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class TokenBucket:
+    """Refills at `per_minute` tokens per minute up to one minute's worth.
+
+    Reservations may drive the level negative: the deficit is how long later callers must wait,
+    so waiting requests are served in arrival order without a separate queue structure.
+    A per_minute of 0 means unlimited.
+    """
+
+    def __init__(self, per_minute: float):
+        self.per_minute = per_minute
+        self.capacity = per_minute
+        self.level = per_minute
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float, rate_scale: float):
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.per_minute * rate_scale / 60)
+        self._updated = now
+
+    def delay_for(self, amount: float, now: float, rate_scale: float = 1.0) -> float:
+        """Seconds until `amount` tokens are available (0 if available now)."""
+        if not self.per_minute:
+            return 0.0
+        self._refill(now, rate_scale)
+        amount = min(amount, self.capacity) # a single oversized request must still be admissible
+        deficit = amount - self.level
+        return 0.0 if deficit <= 0 else deficit * 60 / (self.per_minute * rate_scale)
+
+    def take(self, amount: float) -> float:
+        """Reserves amount (capped at capacity) and returns what was actually reserved."""
+        if not self.per_minute:
+            return 0.0
+        amount = min(amount, self.capacity)
+        self.level -= amount
+        return amount
+
+    def give_back(self, amount: float, now: float, rate_scale: float = 1.0):
+        """Returns unused reservations (positive) or charges usage beyond them (negative)."""
+        if self.per_minute:
+            self._refill(now, rate_scale)
+            self.level = min(self.capacity, self.level + amount)
+
+    def clamp(self, remaining: float, now: float, rate_scale: float = 1.0):
+        """Aligns the level with the provider's own count (x-ratelimit-remaining-* headers)."""
+        if self.per_minute:
+            self._refill(now, rate_scale)
+            self.level = min(self.level, remaining)
+
+
+class AdmissionTicket:
+    """Admission for one turn. wait() (or await wait_async()) before the first LLM call, release() after.
+
+    A turn reserves a request for each completion it may make (two for tool turns). Call
+    refund_call() when the second completion turns out not to be needed, and record_usage() with
+    each completion's reported usage so the token bucket is charged what the turn really used.
+    Used as a context manager, entering waits and leaving releases.
+    """
+
+    def __init__(self, controller, client_id, delay: float, reserved_calls: int = 1, reserved_tokens: float = 0.0):
+        self.controller = controller
+        self.client_id = client_id
+        self.delay = delay
+        self.reserved_calls = reserved_calls
+        self.reserved_tokens = reserved_tokens
+        self.used_tokens = None # None until a completion reports usage
+        self._waited = False
+        self._released = False
+
+    def refund_call(self):
+        """Gives back one reserved completion that this turn won't make."""
+        if self.reserved_calls > 0 and not self._released:
+            self.reserved_calls -= 1
+            self.controller._refund_call()
+
+    def record_usage(self, usage):
+        """Adds one completion's usage (an OpenAI usage object or dict with total_tokens); None is ignored."""
+        total = usage.get("total_tokens") if isinstance(usage, dict) else getattr(usage, "total_tokens", None)
+        if isinstance(total, (int, float)):
+            self.used_tokens = (self.used_tokens or 0) + total
+
+    def wait(self):
+        if self.delay > 0:
+            time.sleep(self.delay)
+        self._done_waiting()
+
+    async def wait_async(self):
+        if self.delay > 0:
+            await asyncio.sleep(self.delay)
+        self._done_waiting()
+
+    def _done_waiting(self):
+        if not self._waited:
+            self._waited = True
+            self.controller._finish_waiting(self.delay > 0, self.delay)
+
+    def __enter__(self):
+        self.wait()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            if not self._waited:
+                self._waited = True
+                self.controller._finish_waiting(self.delay > 0, 0.0)
+            self.controller._release(self.client_id, self.reserved_tokens, self.used_tokens)
+
+
+class AdmissionController:
+    """Gates turns that will call OpenAI.
+
+    - requests_per_minute / tokens_per_minute: token buckets sized to the OpenAI quota (0 = unlimited).
+    - per_client_concurrency: turns one client may have admitted at once (0 = unlimited); excess gets 429.
+    - max_queue / max_wait_seconds: at most max_queue turns may wait for quota, each for at most
+      max_wait_seconds. A turn whose wait would be longer is shed immediately with 503 instead of
+      tying up a worker until the client times out.
+    - observe_upstream(): provider 429s halve the effective rate and pause admissions for the
+      Retry-After period (AIMD); successful responses restore the rate gradually.
+    """
+
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0, per_client_concurrency: int = 0,
+                 max_queue: int = 256, max_wait_seconds: float = 10.0, min_rate_scale: float = 0.1, recovery_step: float = 0.05):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.per_client_concurrency = per_client_concurrency
+        self.max_queue = max_queue
+        self.max_wait_seconds = max_wait_seconds
+        self.min_rate_scale = min_rate_scale
+        self.recovery_step = recovery_step
+        self.rate_scale = 1.0
+        self._backoff_until = 0.0
+        self._backoff_step = 1.0
+        self._active = {} # client id -> admitted turns
+        self._waiting = 0
+        self._lock = threading.Lock()
+        self.admitted = 0
+        self.delayed = 0
+        self.wait_seconds_total = 0.0
+        self.max_queue_depth = 0
+        self.shed = {"queue_full": 0, "deadline": 0, "client_limit": 0}
+        self.upstream_rate_limited = 0
+        self.refunded_calls = 0
+        self.usage_tokens = 0
+        self.charged_requests = 0
+        self.charged_tokens = 0
+
+    def admit(self, client_id, estimated_tokens: float, calls: int = 1) -> AdmissionTicket:
+        """Reserves quota for one turn of up to `calls` completions or raises AdmissionRejected.
+        Never blocks; the ticket carries the wait."""
+        with self._lock:
+            now = time.monotonic()
+            if self.per_client_concurrency and self._active.get(client_id, 0) >= self.per_client_concurrency:
+                self.shed["client_limit"] += 1
+                raise AdmissionRejected("Too many concurrent requests from this client.", "client_limit", 429, 1)
+
+            delay = max(
+                self.requests.delay_for(calls, now, self.rate_scale),
+                self.tokens.delay_for(estimated_tokens, now, self.rate_scale),
+                self._backoff_until - now
+            )
+            if delay > 0 and self._waiting >= self.max_queue:
+                self.shed["queue_full"] += 1
+                raise AdmissionRejected("Server is busy, please retry shortly.", "queue_full", 503, delay)
+            if delay > self.max_wait_seconds:
+                self.shed["deadline"] += 1
+                raise AdmissionRejected("Server is busy, please retry shortly.", "deadline", 503, delay)
+
+            self.requests.take(calls)
+            reserved_tokens = self.tokens.take(estimated_tokens)
+            self._active[client_id] = self._active.get(client_id, 0) + 1
+            if delay > 0:
+                self._waiting += 1
+                self.max_queue_depth = max(self.max_queue_depth, self._waiting)
+                self.delayed += 1
+            self.admitted += 1
+            return AdmissionTicket(self, client_id, max(0.0, delay), calls, reserved_tokens)
+
+    def charge(self, requests: int, tokens: float):
+        """Charges OpenAI usage made outside an admitted turn's completions (embedding requests) to the
+        same buckets. Never blocks or sheds: the deficit delays the turns admitted after it."""
+        with self._lock:
+            now = time.monotonic()
+            self.requests.give_back(-requests, now, self.rate_scale)
+            self.tokens.give_back(-tokens, now, self.rate_scale)
+            self.charged_requests += requests
+            self.charged_tokens += tokens
+
+    def _finish_waiting(self, queued: bool, waited: float):
+        with self._lock:
+            self._waiting -= queued
+            self.wait_seconds_total += waited
+
+    def _refund_call(self):
+        with self._lock:
+            self.requests.give_back(1, time.monotonic(), self.rate_scale)
+            self.refunded_calls += 1
+
+    def _release(self, client_id, reserved_tokens: float = 0.0, used_tokens: float = None):
+        with self._lock:
+            remaining = self._active.get(client_id, 0) - 1
+            if remaining > 0:
+                self._active[client_id] = remaining
+            else:
+                self._active.pop(client_id, None)
+            if used_tokens is not None:
+                # Settle the turn's estimate against what OpenAI reported
+                self.tokens.give_back(reserved_tokens - used_tokens, time.monotonic(), self.rate_scale)
+                self.usage_tokens += used_tokens
+
+    # --- Upstream feedback ---
+    @staticmethod
+    def _retry_after_seconds(headers):
+        try:
+            if headers.get("retry-after-ms"):
+                return float(headers["retry-after-ms"]) / 1000
+            if headers.get("retry-after"):
+                return float(headers["retry-after"])
+        except (TypeError, ValueError):
+            pass
+        return None
+
+    def observe_upstream(self, status_code: int, headers):
+        """Feeds one OpenAI HTTP response (status + headers) back into the limiter."""
+        now = time.monotonic()
+        with self._lock:
+            if status_code == 429:
+                self.upstream_rate_limited += 1
+                retry_after = self._retry_after_seconds(headers)
+                pause = retry_after if retry_after is not None else self._backoff_step
+                self._backoff_step = min(self._backoff_step * 2, 60.0)
+                self._backoff_until = max(self._backoff_until, now + pause)
+                self.rate_scale = max(self.min_rate_scale, self.rate_scale * 0.5)
+            elif status_code < 400:
+                self._backoff_step = 1.0
+                self.rate_scale = min(1.0, self.rate_scale + self.recovery_step)
+            for header, bucket in (("x-ratelimit-remaining-requests", self.requests), ("x-ratelimit-remaining-tokens", self.tokens)):
+                try:
+                    if headers.get(header) is not None:
+                        bucket.clamp(float(headers[header]), now, self.rate_scale)
+                except (TypeError, ValueError):
+                    pass
+    # --- End Upstream feedback ---
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "admitted": self.admitted,
+                "delayed": self.delayed,
+                "queue_depth": self._waiting,
+                "max_queue_depth": self.max_queue_depth,
+                "active_turns": sum(self._active.values()),
+                "active_clients": len(self._active),
+                "shed": dict(self.shed),
+                "upstream_rate_limited": self.upstream_rate_limited,
+                "refunded_calls": self.refunded_calls,
+                "usage_tokens": self.usage_tokens,
+                "charged_requests": self.charged_requests,
+                "charged_tokens": self.charged_tokens,
+                "rate_scale": round(self.rate_scale, 3),
+                "backoff_remaining_seconds": round(max(0.0, self._backoff_until - time.monotonic()), 2),
+                "avg_wait_ms": round(self.wait_seconds_total / self.admitted * 1000, 1) if self.admitted else 0.0
+            }
@@ -1,43 +1,116 @@
-# backend/app.py - Full Version with RAG, OpenAI FC (Password, Weather, Currency)
+# backend/app.py - Full Version with RAG, OpenAI FC (Password, Weather, Orders, Currency)
 import os
-import traceback 
+import logging
 import re 
 import json # For parsing function arguments
+import hashlib # For the tools schema version
 import secrets # For password generation
 import string  # For password generation
+import time # For latency measurement
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED # For concurrent tool calls
 import requests # For weather & currency API calls
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, g
 from dotenv import load_dotenv
-from openai import OpenAI # Use the OpenAI library
+from openai import OpenAI, DefaultHttpxClient # Use the OpenAI library
 from flask_cors import CORS 
+from tool_cache import TTLCache
+from http_client import UpstreamClient, deadline_scope, outcome_scope
+from session_store import SessionStore, compact_message, estimate_tokens
+from response_cache import response_cache_from_env
+from admission import AdmissionController, AdmissionRejected
+from observability import (
+    configure_logging, registry, span, PROMETHEUS_CONTENT_TYPE, REQUEST_SECONDS, PHASE_SECONDS, TOOL_SECONDS, ANSWERS_TOTAL
+)
+
+load_dotenv() # Load environment variables from .env file (before data_store reads its settings)
+configure_logging()
+log = logging.getLogger("chatbot.app")
 
 # Attempt to import from data_store, define dummies if not found
 try:
     # Define functions needed for intent detection or potential RAG (currently unused in main flow)
-    from data_store import get_faq_answer, find_product, get_order_info, retrieve_product_info
-    print("Functions from data_store imported.")
+    from data_store import (
+        get_faq_answer, find_product, get_order_info, retrieve_product_info, reload_knowledge_base, knowledge_base_version,
+        set_embedding_meter, start_reload_watcher, stop_reload_watcher
+    )
+    log.info("Functions from data_store imported.")
 except ImportError as e:
-    print(f"Warning: Could not import from data_store.py ({e}). Define dummy functions.")
+    log.warning("Could not import from data_store.py (%s). Define dummy functions.", e)
     def get_faq_answer(q): return None
     def find_product(q): return None
     # Ensure get_order_info is defined even as dummy if schema exists later
     def get_order_info(order_id): return None 
     def retrieve_product_info(q): return None
+    def reload_knowledge_base(force=False): return {}
+    def knowledge_base_version(): return ""
+    def set_embedding_meter(meter): pass
+    def start_reload_watcher(): pass
+    def stop_reload_watcher(): pass
+
+# --- Admission Control (OpenAI quota, per-client caps, load shedding) ---
+admission = AdmissionController(
+    requests_per_minute=float(os.getenv("OPENAI_RPM_LIMIT", "0")), # 0 = unlimited; set to the account's quota
+    tokens_per_minute=float(os.getenv("OPENAI_TPM_LIMIT", "0")),
+    per_client_concurrency=int(os.getenv("ADMISSION_PER_CLIENT_CONCURRENCY", "0")), # opt-in; see resolve_client_id()
+    max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "256")),
+    max_wait_seconds=float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "10"))
+)
+# Retrieval's embeddings requests (one per OpenAI-bound turn, plus knowledge base syncs) use the same quota
+set_embedding_meter(admission.charge)
+# Tokens reserved per turn on top of the query itself (system prompt, tools, history, retrieved context, completion)
+ADMISSION_TURN_TOKENS = int(os.getenv("ADMISSION_TURN_TOKENS", "1500"))
+
+def observe_openai_response(response):
+    """httpx response hook: every OpenAI response, including the SDK's own retried 429s, feeds the admission controller."""
+    admission.observe_upstream(response.status_code, response.headers)
+
+# Client identity for the per-client cap. X-Client-Id is only honoured from callers that are all
+# trusted to set it (e.g. an internal gateway); otherwise anyone could rotate ids to dodge the cap
+# or spend someone else's. Behind reverse proxies, set ADMISSION_TRUSTED_PROXIES to their count so
+# the client address is read from X-Forwarded-For instead of every user sharing the proxy's IP.
+ADMISSION_TRUST_CLIENT_ID = os.getenv("ADMISSION_TRUST_CLIENT_ID", "0").lower() in ("1", "true", "yes")
+ADMISSION_TRUSTED_PROXIES = int(os.getenv("ADMISSION_TRUSTED_PROXIES", "0"))
+
+def resolve_client_id(client_id_header, forwarded_for, peer_address) -> str:
+    """Key for per-client admission caps (shared by the Flask and ASGI apps)."""
+    if ADMISSION_TRUST_CLIENT_ID and client_id_header:
+        return client_id_header
+    if ADMISSION_TRUSTED_PROXIES and forwarded_for:
+        hops = [hop.strip() for hop in forwarded_for.split(",") if hop.strip()]
+        if len(hops) >= ADMISSION_TRUSTED_PROXIES:
+            # Entries left of the ones our own proxies appended can be forged by the client
+            return hops[-ADMISSION_TRUSTED_PROXIES]
+    return peer_address or "unknown"
+
+def admit_turn(client_id, user_query: str):
+    """Admission for one chat turn: a request for each completion it may make (two when tools can be
+    called) and an estimate of its tokens. Raises AdmissionRejected."""
+    return admission.admit(
+        client_id, estimate_tokens({"content": user_query}) + ADMISSION_TURN_TOKENS, calls=2 if available_tools else 1
+    )
 
-load_dotenv() # Load environment variables from .env file
+def admission_rejection(rejected: AdmissionRejected) -> tuple:
+    log.warning("Shed chat turn (%s), retry after %ss", rejected.reason, rejected.retry_after)
+    return {"error": str(rejected), "retry_after": rejected.retry_after}, rejected.status
+
+def retry_after_headers(response_data: dict) -> dict:
+    return {"Retry-After": str(response_data["retry_after"])} if "retry_after" in response_data else {}
+# --- End Admission Control ---
 
 # --- OpenAI API Client Initialization ---
 openai_api_key = os.getenv('OPENAI_API_KEY') 
 openai_client = None
 if openai_api_key:
     try:
-        openai_client = OpenAI(api_key=openai_api_key) 
-        print("OpenAI API Key configured and Client initialized.") 
+        openai_client = OpenAI(
+            api_key=openai_api_key, http_client=DefaultHttpxClient(event_hooks={"response": [observe_openai_response]})
+        )
+        log.info("OpenAI API Key configured and Client initialized.")
     except Exception as e:
-        print(f"Error initializing OpenAI client: {e}")
+        log.error("Error initializing OpenAI client: %s", e)
         openai_client = None
 else:
-    print("Warning: OPENAI_API_KEY not found in .env file.")
+    log.warning("OPENAI_API_KEY not found in .env file.")
 # --- End OpenAI Client Initialization ---
 
 
@@ -45,7 +118,7 @@ else:
 
 def generate_random_password(length: int, include_symbols: bool = True) -> str:
     """Generates a secure random password of a specified length."""
-    print(f"--- Function: generate_random_password(length={length}, include_symbols={include_symbols}) called ---")
+    log.debug("generate_random_password(length=%s, include_symbols=%s) called", length, include_symbols)
     characters = string.ascii_letters + string.digits 
     if include_symbols:
         characters += string.punctuation
@@ -54,77 +127,172 @@ def generate_random_password(length: int, include_symbols: bool = True) -> str:
         if length < 8: length = 8
         if length > 128: length = 128
     except (ValueError, TypeError):
-         print(f"Warning: Non-integer length requested ({length}). Setting length to 12.")
+         log.warning("Non-integer length requested (%s). Setting length to 12.", length)
          length = 12 
     try:
         password = ''.join(secrets.choice(characters) for i in range(length))
-        print(f"--- Generated password (length {len(password)}): [Hidden] ---") 
+        log.debug("Generated password (length %d): [Hidden]", len(password))
         return password
     except Exception as e:
-        print(f"!!! Error generating password: {e}")
+        log.error("Error generating password: %s", e)
         return "Error: Could not generate password due to an internal issue."
 
+# --- Tool Lookup Caches (keyed on normalized arguments, shared by all requests in this process) ---
+weather_cache = TTLCache("weather", ttl_seconds=float(os.getenv("WEATHER_CACHE_TTL_SECONDS", "300")), max_entries=1024)
+exchange_rate_cache = TTLCache("exchange_rates", ttl_seconds=float(os.getenv("EXCHANGERATE_CACHE_TTL_SECONDS", "3600")), max_entries=256)
+
+# --- Pooled HTTP clients for the tool APIs (keep-alive, retries under a budget, circuit breaker) ---
+UPSTREAM_READ_TIMEOUT_SECONDS = float(os.getenv("UPSTREAM_READ_TIMEOUT_SECONDS", "5"))
+# Base URLs can be pointed at local stand-ins (see bench/fake_upstreams.py)
+OPENWEATHERMAP_BASE_URL = os.getenv("OPENWEATHERMAP_BASE_URL", "http://api.openweathermap.org").rstrip("/")
+EXCHANGERATE_BASE_URL = os.getenv("EXCHANGERATE_BASE_URL", "https://v6.exchangerate-api.com").rstrip("/")
+# Bulkhead: calls one upstream may have in flight, so a slow API can't hold every tool worker
+UPSTREAM_MAX_CONCURRENCY = int(os.getenv("UPSTREAM_MAX_CONCURRENCY", "8"))
+weather_http = UpstreamClient("openweathermap", read_timeout=UPSTREAM_READ_TIMEOUT_SECONDS, max_concurrency=UPSTREAM_MAX_CONCURRENCY)
+exchangerate_http = UpstreamClient("exchangerate-api", read_timeout=UPSTREAM_READ_TIMEOUT_SECONDS, max_concurrency=UPSTREAM_MAX_CONCURRENCY)
+
+class ExchangeRateAPIError(Exception):
+    """ExchangeRate-API answered with result == 'error'; carries the API's error-type."""
+
+def _weather_request(location: str, units: str, api_key: str) -> tuple:
+    return f"{OPENWEATHERMAP_BASE_URL}/data/2.5/weather", { "q": location, "appid": api_key, "units": units, "lang": "en" }
+
+def _fetch_weather_data(location: str, units: str, api_key: str) -> dict:
+    """Calls OpenWeatherMap once. Raises requests exceptions on failure so errors are never cached."""
+    base_url, params = _weather_request(location, units, api_key)
+    api_response = weather_http.get(base_url, params=params)
+    api_response.raise_for_status()
+    return api_response.json()
+
+def weather_cache_key(location: str, unit: str) -> tuple:
+    units = "imperial" if unit and unit.lower() == "imperial" else "metric"
+    return (" ".join(str(location).lower().split()), units)
+
+def format_weather(data: dict, location: str, units: str) -> str:
+    """OpenWeatherMap payload -> the sentence returned to the model."""
+    if data.get("cod") != 200 and data.get("message"): 
+         return f"Error from weather API: {data['message']}" 
+
+    main_data = data.get("main")
+    weather_data = data.get("weather")[0] if data.get("weather") else {}
+    city_name = data.get("name")
+    country = data.get("sys", {}).get("country")
+
+    if not main_data or not weather_data or not city_name:
+        return f"Error: Could not parse weather data for {location}."
+
+    temp = main_data.get("temp")
+    feels_like = main_data.get("feels_like")
+    humidity = main_data.get("humidity")
+    description = weather_data.get("description")
+    temp_unit = "°F" if units == "imperial" else "°C" 
+    location_display = f"{city_name}, {country}" if country else city_name
+
+    result_str = (
+        f"The current weather in {location_display} is {description}. "
+        f"The temperature is {temp}{temp_unit} (feels like {feels_like}{temp_unit}). "
+        f"Humidity is {humidity}%."
+    )
+    log.debug("Formatted weather result: %s", result_str)
+    return result_str
+
+def weather_error_message(error: Exception, location: str) -> str:
+    """Exception from a weather lookup -> the error string returned to the model."""
+    if isinstance(error, requests.exceptions.Timeout): return f"Error: The weather service request timed out."
+    if isinstance(error, requests.exceptions.HTTPError):
+         log.warning("Weather HTTP error: %s", error)
+         status = error.response.status_code if error.response is not None else None
+         if status == 404: return f"Error: Could not find weather data for '{location}'. Check spelling."
+         elif status == 401: return "Error: Invalid Weather API key."
+         else: return f"Error fetching weather ({status})."
+    if isinstance(error, requests.exceptions.RequestException): return f"Error connecting to weather service: {error}"
+    log.error("Unexpected error in get_current_weather: %s", error, exc_info=error)
+    return "Error: Unexpected error fetching weather."
+
 def get_current_weather(location: str, unit: str = "metric") -> str:
     """Gets the current weather for a specified location using OpenWeatherMap API."""
-    print(f"--- Function: get_current_weather(location='{location}', unit='{unit}') called ---")
+    log.debug("get_current_weather(location=%r, unit=%r) called", location, unit)
     api_key = os.getenv("OPENWEATHERMAP_API_KEY") 
     if not api_key:
         return "Error: Weather API key is not configured."
 
-    units = "imperial" if unit and unit.lower() == "imperial" else "metric"
-    base_url = "http://api.openweathermap.org/data/2.5/weather"
-    params = { "q": location, "appid": api_key, "units": units, "lang": "en" }
+    cache_key = weather_cache_key(location, unit)
+    units = cache_key[1]
+    try:
+        data = weather_cache.get_or_load(cache_key, lambda: _fetch_weather_data(location, units, api_key))
+        return format_weather(data, location, units)
+    except Exception as e:
+        return weather_error_message(e, location)
 
+def order_belongs_to(order: dict, customer_id: str = None, email: str = None) -> bool:
+    """True if the caller gave the customer ID or email address on the order (order IDs alone are guessable)."""
+    if customer_id and str(order.get("customer_id") or "").strip().lower() == customer_id.strip().lower():
+        return True
+    return bool(email and order.get("email") and order["email"].strip().lower() == email.strip().lower())
+
+def lookup_order(order_id: str, customer_id: str = None, email: str = None) -> str:
+    """Looks up one order in the local order store and describes its status for the model.
+
+    Items, totals, dates and tracking are only included when customer_id or email matches the order;
+    otherwise the model gets the status alone and is told to ask for one of them.
+    """
+    log.debug("lookup_order(order_id=%r) called", order_id)
     try:
-        api_response = requests.get(base_url, params=params, timeout=10) 
-        api_response.raise_for_status() 
-        data = api_response.json() 
-
-        if data.get("cod") != 200 and data.get("message"): 
-             return f"Error from weather API: {data['message']}" 
-
-        main_data = data.get("main")
-        weather_data = data.get("weather")[0] if data.get("weather") else {}
-        city_name = data.get("name")
-        country = data.get("sys", {}).get("country")
-
-        if not main_data or not weather_data or not city_name:
-            return f"Error: Could not parse weather data for {location}."
-
-        temp = main_data.get("temp")
-        feels_like = main_data.get("feels_like")
-        humidity = main_data.get("humidity")
-        description = weather_data.get("description")
-        temp_unit = "°F" if units == "imperial" else "°C" 
-        location_display = f"{city_name}, {country}" if country else city_name
-
-        result_str = (
-            f"The current weather in {location_display} is {description}. "
-            f"The temperature is {temp}{temp_unit} (feels like {feels_like}{temp_unit}). "
-            f"Humidity is {humidity}%."
-        )
-        print(f"--- Formatted weather result: {result_str}")
-        return result_str
-
-    except requests.exceptions.Timeout: return f"Error: The weather service request timed out."
-    except requests.exceptions.HTTPError as http_err:
-         print(f"!!! HTTP error occurred: {http_err}")
-         if api_response.status_code == 404: return f"Error: Could not find weather data for '{location}'. Check spelling."
-         elif api_response.status_code == 401: return "Error: Invalid Weather API key."
-         else: return f"Error fetching weather ({api_response.status_code})."
-    except requests.exceptions.RequestException as req_err: return f"Error connecting to weather service: {req_err}"
+        order = get_order_info(order_id)
     except Exception as e:
-         print(f"!!! Unexpected error in get_current_weather: {e}")
-         traceback.print_exc() 
-         return "Error: Unexpected error fetching weather."
+        log.exception("Unexpected error in lookup_order: %s", e)
+        return "Error: The order database is unavailable right now."
+    if not order:
+        return f"Error: No order found with ID '{order_id}'. Please check the order number."
 
-def convert_currency(amount: float, from_currency: str, to_currency: str) -> str:
-    """Converts a specified amount from one currency to another using ExchangeRate-API."""
-    print(f"--- Function: convert_currency(amount={amount}, from={from_currency}, to={to_currency}) called ---")
-    api_key = os.getenv("EXCHANGERATE_API_KEY")
-    if not api_key:
-        return "Error: Currency conversion API key is not configured."
+    parts = [f"Order {order['order_id']} is {order['status']}."]
+    if not order_belongs_to(order, customer_id, email):
+        if customer_id or email:
+            log.info("Order %s lookup with non-matching customer details; returning status only.", order['order_id'])
+        parts.append(
+            "Other details (items, total, shipping, delivery) can only be shared after the customer "
+            "provides the email address or customer ID on the order."
+        )
+        return " ".join(parts)
+    if order.get("total") is not None:
+        parts.append(f"Total: {order['total']:.2f} {order.get('currency') or ''}".rstrip() + ".")
+    items = order.get("items")
+    if items:
+        if isinstance(items, list):
+            items = ", ".join(
+                f"{item.get('quantity', 1)} x {item.get('name', item.get('sku', 'item'))}" if isinstance(item, dict) else str(item)
+                for item in items
+            )
+        parts.append(f"Items: {items}.")
+    if order.get("created_at"): parts.append(f"Placed: {order['created_at']}.")
+    if order.get("carrier") or order.get("tracking_number"):
+        parts.append(f"Shipped with {order.get('carrier') or 'carrier'}, tracking number {order.get('tracking_number') or 'n/a'}.")
+    if order.get("estimated_delivery"): parts.append(f"Estimated delivery: {order['estimated_delivery']}.")
+    if order.get("updated_at"): parts.append(f"Last updated: {order['updated_at']}.")
+    return " ".join(parts)
+
+def _exchange_rates_url(base_currency: str, api_key: str) -> str:
+    log.debug("Calling ExchangeRate-API: .../v6/%s.../latest/%s", api_key[:5], base_currency)
+    return f"{EXCHANGERATE_BASE_URL}/v6/{api_key}/latest/{base_currency}"
+
+def parse_exchange_rates(data: dict) -> dict:
+    """ExchangeRate-API payload -> rate table; raises ExchangeRateAPIError so failures are never cached."""
+    if data.get("result") == "success":
+        rates = data.get("conversion_rates")
+        if not rates: raise ExchangeRateAPIError("missing-rates")
+        return rates
+    elif data.get("result") == "error":
+        raise ExchangeRateAPIError(data.get("error-type", "Unknown API error"))
+    raise ExchangeRateAPIError("unexpected-response")
 
+def _fetch_exchange_rates(base_currency: str, api_key: str) -> dict:
+    """Fetches the full rate table for one base currency, so any pair/amount can be computed locally."""
+    response = exchangerate_http.get(_exchange_rates_url(base_currency, api_key))
+    response.raise_for_status()
+    return parse_exchange_rates(response.json())
+
+def parse_conversion_args(amount, from_currency, to_currency):
+    """-> (amount, FROM, TO), or an error string for the model."""
     try: amount_float = float(amount)
     except (ValueError, TypeError): return "Error: Invalid amount provided. Please provide a number."
     
@@ -132,39 +300,51 @@ def convert_currency(amount: float, from_currency: str, to_currency: str) -> str
     to_curr = str(to_currency).upper()
     if not (len(from_curr) == 3 and from_curr.isalpha() and len(to_curr) == 3 and to_curr.isalpha()):
          return "Error: Please use valid 3-letter ISO 4217 currency codes (e.g., USD, JPY)."
+    return amount_float, from_curr, to_curr
+
+def format_conversion(rates: dict, amount_float: float, from_curr: str, to_curr: str) -> str:
+    rate = rates.get(to_curr)
+    if rate is None: return f"Error: Unsupported currency code ({from_curr} or {to_curr})."
 
-    url = f"https://v6.exchangerate-api.com/v6/{api_key}/pair/{from_curr}/{to_curr}/{amount_float}"
-    safe_url_log = f"{url[:url.find(api_key) + len(api_key[:5])]}...{url[url.find('/pair'):]}"
-    print(f"Calling ExchangeRate-API: {safe_url_log}") 
+    conversion_result = amount_float * float(rate)
+    result_str = f"{amount_float:.2f} {from_curr} is approximately {conversion_result:.2f} {to_curr}."
+    log.debug("Formatted conversion result: %s", result_str)
+    return result_str
 
+def currency_error_message(error: Exception, from_curr: str, to_curr: str) -> str:
+    """Exception from a rate lookup -> the error string returned to the model."""
+    if isinstance(error, ExchangeRateAPIError):
+        error_type = str(error)
+        log.warning("Error from ExchangeRate-API: %s", error_type)
+        if error_type == "invalid-key": return "Error: Invalid Currency API key."
+        elif error_type == "inactive-account": return "Error: Currency API account inactive."
+        elif error_type == "unsupported-code": return f"Error: Unsupported currency code ({from_curr} or {to_curr})."
+        elif error_type in ("missing-rates", "unexpected-response"): return "Error: Unexpected response from currency service."
+        else: return f"Error during currency conversion: {error_type}"
+    if isinstance(error, requests.exceptions.Timeout): return f"Error: Currency service request timed out."
+    if isinstance(error, requests.exceptions.HTTPError):
+        status = error.response.status_code if error.response is not None else None
+        return f"Error fetching exchange rates ({status})."
+    if isinstance(error, requests.exceptions.RequestException): return f"Error connecting to currency service: {error}"
+    log.error("Unexpected error in convert_currency: %s", error, exc_info=error)
+    return "Error: Unexpected error during currency conversion."
+
+def convert_currency(amount: float, from_currency: str, to_currency: str) -> str:
+    """Converts a specified amount from one currency to another using ExchangeRate-API."""
+    log.debug("convert_currency(amount=%s, from=%s, to=%s) called", amount, from_currency, to_currency)
+    api_key = os.getenv("EXCHANGERATE_API_KEY")
+    if not api_key:
+        return "Error: Currency conversion API key is not configured."
+
+    parsed = parse_conversion_args(amount, from_currency, to_currency)
+    if isinstance(parsed, str):
+        return parsed
+    amount_float, from_curr, to_curr = parsed
     try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-
-        if data.get("result") == "success":
-            conversion_result = data.get("conversion_result")
-            if conversion_result is not None:
-                result_str = f"{amount_float:.2f} {from_curr} is approximately {conversion_result:.2f} {to_curr}."
-                print(f"--- Formatted conversion result: {result_str}")
-                return result_str
-            else: return "Error: Could not get conversion result from API."
-        elif data.get("result") == "error":
-            error_type = data.get("error-type", "Unknown API error")
-            print(f"!!! Error from ExchangeRate-API: {error_type}")
-            if error_type == "invalid-key": return "Error: Invalid Currency API key."
-            elif error_type == "inactive-account": return "Error: Currency API account inactive."
-            elif error_type == "unsupported-code": return f"Error: Unsupported currency code ({from_curr} or {to_curr})."
-            else: return f"Error during currency conversion: {error_type}"
-        else: return "Error: Unexpected response from currency service."
-
-    except requests.exceptions.Timeout: return f"Error: Currency service request timed out."
-    except requests.exceptions.HTTPError as http_err: return f"Error fetching exchange rates ({response.status_code})."
-    except requests.exceptions.RequestException as req_err: return f"Error connecting to currency service: {req_err}"
+        rates = exchange_rate_cache.get_or_load(from_curr, lambda: _fetch_exchange_rates(from_curr, api_key))
+        return format_conversion(rates, amount_float, from_curr, to_curr)
     except Exception as e:
-         print(f"!!! Unexpected error in convert_currency: {e}")
-         traceback.print_exc() 
-         return "Error: Unexpected error during currency conversion."
+        return currency_error_message(e, from_curr, to_curr)
 # --- End Helper Functions ---
 
 
@@ -181,6 +361,11 @@ try:
         "description": "Get the current weather conditions for a specified location.", 
         "parameters": { "type": "object", "properties": { "location": {"type": "string", "description": "City/Location (e.g., 'Tokyo', 'Brisbane, AU')."}, "unit": {"type": "string", "description": "'metric' (C) or 'imperial' (F). Defaults metric.", "enum": ["metric", "imperial"]}}, "required": ["location"] }
     }
+    get_order_info_func_declaration = {
+        "name": "get_order_info",
+        "description": "Look up a customer's order by its order ID. Returns only the status unless the customer's email address or customer ID on the order is also given; then also items, total, shipping and delivery estimate.",
+        "parameters": { "type": "object", "properties": { "order_id": {"type": "string", "description": "Order ID/number as given by the customer (e.g., 'A10023')."}, "email": {"type": "string", "description": "Email address on the order, as given by the customer."}, "customer_id": {"type": "string", "description": "Customer ID, as given by the customer."} }, "required": ["order_id"] }
+    }
     convert_currency_func_declaration = {
         "name": "convert_currency", 
         "description": "Convert an amount from one currency to another using real-time rates.",
@@ -190,194 +375,848 @@ try:
     available_tools = [
         {"type": "function", "function": generate_password_func_declaration},
         {"type": "function", "function": get_current_weather_func_declaration},
+        {"type": "function", "function": get_order_info_func_declaration},
         {"type": "function", "function": convert_currency_func_declaration}
     ]
-    print(f"Function calling tools prepared successfully for: {[tool.get('function', {}).get('name', 'Unknown') for tool in available_tools]}") 
+    log.info("Function calling tools prepared successfully for: %s", [tool.get('function', {}).get('name', 'Unknown') for tool in available_tools])
 except Exception as e_dict_schema:
-    print(f"!!! Error defining dictionary schema or tools list: {e_dict_schema}")
+    log.error("Error defining dictionary schema or tools list: %s", e_dict_schema)
     available_tools = None
-if available_tools is None: print("Warning: `available_tools` could not be defined. Function Calling will be skipped.")
+if available_tools is None: log.warning("`available_tools` could not be defined. Function Calling will be skipped.")
 # --- End Function Calling Schema Definition ---
 
 
+# --- Tool Execution Helpers (shared by /chat and /chat/stream) ---
+CHAT_MODEL = "gpt-4o-mini"
+
+available_functions = {
+    "generate_random_password": generate_random_password,
+    "get_current_weather": get_current_weather,
+    "get_order_info": lookup_order,
+    "convert_currency": convert_currency
+}
+
+def prepare_tool_kwargs(function_name: str, function_args: dict) -> dict:
+    """Validates parsed tool arguments and converts them into kwargs for the local function."""
+    call_kwargs = {}
+    if function_name == "generate_random_password":
+        length = function_args.get("length")
+        include_symbols = function_args.get("include_symbols")
+        if length is not None: call_kwargs["length"] = int(length)
+        if include_symbols is not None and isinstance(include_symbols, bool): call_kwargs["include_symbols"] = include_symbols
+    elif function_name == "get_current_weather":
+        location = function_args.get("location")
+        unit = function_args.get("unit")
+        if location: call_kwargs["location"] = str(location)
+        else: raise ValueError("'location' argument required")
+        if unit is not None: call_kwargs["unit"] = str(unit)
+    elif function_name == "get_order_info":
+        order_id = str(function_args.get("order_id") or "").strip()
+        if order_id: call_kwargs["order_id"] = order_id
+        else: raise ValueError("'order_id' argument required")
+        for name in ("customer_id", "email"):
+            value = function_args.get(name)
+            if value is not None and str(value).strip(): call_kwargs[name] = str(value).strip()
+    elif function_name == "convert_currency":
+        amount = function_args.get("amount")
+        from_currency = function_args.get("from_currency")
+        to_currency = function_args.get("to_currency")
+        if amount is not None: call_kwargs["amount"] = float(amount)
+        else: raise ValueError("'amount' argument required")
+        if from_currency and len(str(from_currency)) == 3: call_kwargs["from_currency"] = str(from_currency).upper()
+        else: raise ValueError("'from_currency' required (3-letter code)")
+        if to_currency and len(str(to_currency)) == 3: call_kwargs["to_currency"] = str(to_currency).upper()
+        else: raise ValueError("'to_currency' required (3-letter code)")
+    return call_kwargs
+
+def tool_status(function_response, outcome: dict) -> str:
+    """Histogram label for a finished tool call: the upstream outcome if it called one (see outcome_scope), else ok/error."""
+    if outcome["status"] is not None:
+        return outcome["status"]
+    return "error" if str(function_response).startswith("Error") else "ok"
+
+def execute_tool_call(tool_call_id: str, function_name: str, function_args_str: str, deadline: float = None) -> dict:
+    """Runs one requested tool call and returns the 'tool' message to append to the conversation.
+
+    deadline (time.monotonic()) bounds the upstream HTTP calls the tool makes, retries included.
+    """
+    log.info("Function call requested: %s", function_name)
+    log.debug("Arguments (raw string): %s", function_args_str)
+
+    function_to_call = available_functions.get(function_name)
+    if not function_to_call:
+        log.warning("Function '%s' requested but not implemented.", function_name)
+        TOOL_SECONDS.observe(0.0, tool=function_name, status="error")
+        return {"tool_call_id": tool_call_id, "role": "tool", "name": function_name, "content": f"Error: Function '{function_name}' not available."}
+
+    function_response = None # Initialize for safety
+    outcome = {"status": None} # argument errors happen before any upstream call
+    started = time.perf_counter()
+    try:
+        function_args = json.loads(function_args_str)
+        call_kwargs = prepare_tool_kwargs(function_name, function_args)
+        log.debug("Calling local function: %s with args: %s", function_name, call_kwargs)
+        with deadline_scope(deadline), outcome_scope() as outcome:
+            function_response = function_to_call(**call_kwargs)
+
+    # Catch errors during arg parsing/validation or function execution
+    except (json.JSONDecodeError, ValueError, TypeError) as arg_err:
+         log.warning("Argument/Type Error for %s: %s", function_name, arg_err)
+         function_response = f"Error: Invalid arguments provided - {str(arg_err)}"
+    except Exception as e_func_call:
+         log.exception("Error executing local function %s: %s", function_name, e_func_call)
+         function_response = f"Error executing function: {str(e_func_call)}"
+
+    TOOL_SECONDS.observe(time.perf_counter() - started, tool=function_name, status=tool_status(function_response, outcome))
+    return { "tool_call_id": tool_call_id, "role": "tool", "name": function_name, "content": function_response }
+
+# --- Concurrent Tool Execution ---
+# Per-tool deadlines (seconds) and an overall budget for all tool calls of one turn
+TOOL_MAX_WORKERS = int(os.getenv("TOOL_MAX_WORKERS", "16"))
+TOOL_TURN_BUDGET_SECONDS = float(os.getenv("TOOL_TURN_BUDGET_SECONDS", "12"))
+DEFAULT_TOOL_TIMEOUT_SECONDS = 10.0
+TOOL_TIMEOUTS = {
+    "generate_random_password": 2.0,
+    "get_current_weather": 8.0,
+    "get_order_info": 2.0,
+    "convert_currency": 8.0
+}
+
+tool_executor = ThreadPoolExecutor(max_workers=TOOL_MAX_WORKERS, thread_name_prefix="tool")
+
+def tool_deadline_seconds(function_name: str) -> float:
+    """Time a single tool call may take, never more than the whole turn budget."""
+    return min(TOOL_TIMEOUTS.get(function_name, DEFAULT_TOOL_TIMEOUT_SECONDS), TOOL_TURN_BUDGET_SECONDS)
+
+def tool_timeout_message(tool_call_id: str, function_name: str) -> dict:
+    return {
+        "tool_call_id": tool_call_id, "role": "tool", "name": function_name,
+        "content": f"Error: '{function_name}' timed out before returning a result."
+    }
+
+def iter_tool_results(tool_calls: list):
+    """Runs (tool_call_id, function_name, arguments) tuples concurrently on the shared tool executor.
+
+    Yields (index, tool_message, elapsed_ms, timed_out) in completion order. A call still running
+    when its own deadline or the turn budget expires is reported with a timeout result instead.
+    """
+    started = time.perf_counter()
+    turn_deadline = started + TOOL_TURN_BUDGET_SECONDS
+    pending = {}
+    for index, (tool_call_id, function_name, function_args_str) in enumerate(tool_calls):
+        deadline = min(started + tool_deadline_seconds(function_name), turn_deadline)
+        upstream_deadline = time.monotonic() + (deadline - started)
+        future = tool_executor.submit(execute_tool_call, tool_call_id, function_name, function_args_str, upstream_deadline)
+        pending[future] = (index, tool_call_id, function_name, deadline)
+
+    while pending:
+        next_deadline = min(info[3] for info in pending.values())
+        done, _ = wait(pending, timeout=max(0.0, next_deadline - time.perf_counter()), return_when=FIRST_COMPLETED)
+        now = time.perf_counter()
+        elapsed_ms = round((now - started) * 1000, 1)
+
+        for future in done:
+            index, tool_call_id, function_name, _ = pending.pop(future)
+            try:
+                tool_message = future.result()
+            except Exception as e_tool:
+                log.error("Tool '%s' raised outside its handler: %s", function_name, e_tool)
+                tool_message = {"tool_call_id": tool_call_id, "role": "tool", "name": function_name, "content": f"Error executing function: {str(e_tool)}"}
+            yield index, tool_message, elapsed_ms, False
+
+        for future, (index, tool_call_id, function_name, deadline) in list(pending.items()):
+            if deadline <= now:
+                # The worker thread cannot be interrupted; its late result is simply discarded
+                future.cancel()
+                del pending[future]
+                log.warning("Tool '%s' timed out after %s ms", function_name, elapsed_ms)
+                TOOL_SECONDS.observe(elapsed_ms / 1000, tool=function_name, status="timeout")
+                yield index, tool_timeout_message(tool_call_id, function_name), elapsed_ms, True
+
+def run_tool_calls(tool_calls: list) -> list:
+    """Runs tool calls concurrently and returns their 'tool' messages in the original tool_call order."""
+    tool_messages = [None] * len(tool_calls)
+    for index, tool_message, _, _ in iter_tool_results(tool_calls):
+        tool_messages[index] = tool_message
+    return tool_messages
+# --- End Tool Execution Helpers ---
+
+
+# --- Terminal Tool Results ---
+# Tools whose result already is a complete answer. When every tool call of a turn is listed here and
+# none failed, the reply is rendered from these templates instead of a second model call.
+TERMINAL_TOOL_ANSWERS = os.getenv("TERMINAL_TOOL_ANSWERS", "1") == "1"
+TERMINAL_TOOL_TEMPLATES = {
+    "generate_random_password": "Here is your new password: {result}\nKeep it somewhere safe - it isn't saved in this conversation's history.",
+    "convert_currency": "{result}"
+}
+
+def terminal_response(tool_messages: list):
+    """Final answer rendered locally from the tool results, or None if the model must write it."""
+    if not TERMINAL_TOOL_ANSWERS or not tool_messages:
+        return None
+    parts = []
+    for tool_message in tool_messages:
+        template = TERMINAL_TOOL_TEMPLATES.get(tool_message["name"])
+        content = str(tool_message["content"] or "")
+        if template is None or not content or content.startswith("Error"):
+            return None
+        parts.append(template.format(result=content))
+    return "\n\n".join(parts)
+# --- End Terminal Tool Results ---
+
+
+# --- Local Fast Path (answers from data_store without calling OpenAI) ---
+def answer_locally(user_query: str, session_id: str = None):
+    """Returns a ready answer for confident FAQ/product matches, or None to go through the LLM.
+
+    Follow-ups in a conversation ("is it in stock?") refer to earlier turns, so they always go to the LLM.
+    """
+    if session_id and session_store.has_history(session_id):
+        return None
+    faq_answer = get_faq_answer(user_query)
+    if faq_answer:
+        return faq_answer
+    product = find_product(user_query)
+    if product and product.get("name"):
+        answer = f"{product['name']}: {product.get('description', '')}".strip()
+        if product.get("price") is not None:
+            answer += f" Price: ${float(product['price']):.2f}."
+        if "in_stock" in product:
+            answer += " In stock." if product["in_stock"] else " Currently out of stock."
+        return answer
+    return None
+# --- End Local Fast Path ---
+
+
+# --- Conversation Memory (per session_id, token-budgeted) ---
+session_store = SessionStore(
+    max_sessions=int(os.getenv("SESSION_MAX_SESSIONS", "10000")),
+    idle_ttl_seconds=float(os.getenv("SESSION_IDLE_TTL_SECONDS", "1800")),
+    max_total_bytes=int(os.getenv("SESSION_MAX_TOTAL_BYTES", str(64 * 1024 * 1024))),
+    token_budget=int(os.getenv("SESSION_TOKEN_BUDGET", "3000"))
+)
+
+def parse_chat_query(data) -> str:
+    """The stripped 'query' of a /chat or /chat/stream body; raises ValueError for anything else."""
+    if not isinstance(data, dict) or 'query' not in data:
+        raise ValueError("Request body must contain 'query'.")
+    if not isinstance(data['query'], str):
+        raise ValueError("'query' must be a string.")
+    return data['query'].strip()
+
+def parse_session_id(data: dict):
+    """Optional 'session_id' from the request body; requests without one are stateless as before."""
+    session_id = data.get("session_id")
+    if isinstance(session_id, str) and 0 < len(session_id) <= 128:
+        return session_id
+    return None
+
+# Tool results that are shown to the user once but never kept in session memory (and so never replayed to OpenAI)
+SECRET_TOOL_RESULTS = {"generate_random_password"}
+REDACTED_TOOL_RESULT = "[password shown to the user; not stored]"
+
+def redact_turn(turn_messages: list) -> list:
+    """Compact copies of the turn's messages with secret tool results removed everywhere they appear,
+    including the assistant's answer that quoted them."""
+    compact = [compact_message(message) for message in turn_messages]
+    secret_values = [
+        str(message["content"]) for message in compact
+        if message["role"] == "tool" and message.get("name") in SECRET_TOOL_RESULTS
+        and message.get("content") and not str(message["content"]).startswith("Error")
+    ]
+    if not secret_values:
+        return compact
+    for message in compact:
+        if message["role"] == "tool" and message.get("name") in SECRET_TOOL_RESULTS:
+            message["content"] = REDACTED_TOOL_RESULT
+        elif isinstance(message.get("content"), str):
+            for value in secret_values:
+                message["content"] = message["content"].replace(value, REDACTED_TOOL_RESULT)
+    return compact
+
+def remember_turn(session_id, turn_messages: list, response_text: str):
+    """Stores this turn (user message, tool calls/results, final answer) in the session history."""
+    if session_id:
+        session_store.record_turn(session_id, redact_turn(list(turn_messages) + [{"role": "assistant", "content": response_text}]))
+# --- End Conversation Memory ---
+
+
+# --- Response Cache (final answers of turns that used no tools) ---
+response_cache = response_cache_from_env()
+TOOLS_SCHEMA_VERSION = hashlib.sha1(json.dumps(available_tools, sort_keys=True).encode()).hexdigest()[:12]
+
+def response_cache_applies(session_id) -> bool:
+    """An answer depends only on the query when there is no earlier conversation in the prompt."""
+    return not (session_id and session_store.has_history(session_id))
+
+def answer_version() -> str:
+    """Cached answers are only valid for the tool definitions and knowledge base content (retrieved
+    snippets, prices) they were produced with; a knowledge base reload that changes anything
+    retires every earlier entry."""
+    return f"{TOOLS_SCHEMA_VERSION}:{knowledge_base_version()}"
+
+def cached_response(user_query: str, cacheable: bool):
+    return response_cache.get(user_query, CHAT_MODEL, answer_version()) if cacheable else None
+
+def store_response(user_query: str, cacheable: bool, response_text: str, latency_ms: float):
+    """Call only for turns without tool calls: tool answers (passwords, live weather/rates) must never be replayed."""
+    if cacheable and response_text:
+        response_cache.put(user_query, CHAT_MODEL, answer_version(), response_text, latency_ms)
+# --- End Response Cache ---
+
+
+# --- Retrieval-Augmented Prompt ---
+def build_initial_messages(user_query: str, session_id: str = None) -> list:
+    """Messages for the first completion: session history (if any), relevant product/FAQ snippets
+    (if any), then the user query. The user query is always the last message."""
+    user_message = {"role": "user", "content": user_query}
+    context = []
+    snippets = retrieve_product_info(user_query)
+    if snippets:
+        context.append({
+            "role": "system",
+            "content": "Relevant store information (use it only if it helps answer the user):\n- " + "\n- ".join(snippets)
+        })
+    messages = []
+    if session_id:
+        reserve_tokens = estimate_tokens(user_message) + sum(estimate_tokens(message) for message in context)
+        messages.extend(session_store.history(session_id, reserve_tokens=reserve_tokens))
+    return messages + context + [user_message]
+# --- End Retrieval-Augmented Prompt ---
+
+
 # --- Flask App Setup ---
 app = Flask(__name__)
 CORS(app) # Enable CORS
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+def request_client_id() -> str:
+    """Identity for per-client admission caps (see resolve_client_id)."""
+    return resolve_client_id(request.headers.get("X-Client-Id"), request.headers.get("X-Forwarded-For"), request.remote_addr)
+
+@app.after_request
+def add_server_timing(response):
+    # Total handler latency, so the blocking /chat path can be compared with /chat/stream's ttft_ms/total_ms.
+    # For streamed responses this only covers time until the first byte is handed to the server.
+    started = getattr(g, "request_started", None)
+    if started is not None:
+        elapsed = time.perf_counter() - started
+        response.headers["Server-Timing"] = f"total;dur={elapsed * 1000:.1f}"
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        REQUEST_SECONDS.observe(elapsed, route=route, method=request.method, status=response.status_code)
+    return response
 # --- End Flask App Setup ---
 
 
+# --- Metrics Collectors ---
+def collect_component_stats() -> list:
+    """Exposes the counters the caches, upstream clients and session store already keep."""
+    tool_caches = [(weather_cache, weather_cache.stats()), (exchange_rate_cache, exchange_rate_cache.stats())]
+    upstreams = [(client, client.stats()) for client in (weather_http, exchangerate_http)]
+    sessions = session_store.stats()
+    answers = response_cache.stats()
+    admitted = admission.stats()
+    return [
+        ("chatbot_tool_cache_hits_total", "counter", "Tool lookup cache hits.",
+         [({"cache": cache.name}, stats["hits"]) for cache, stats in tool_caches]),
+        ("chatbot_tool_cache_misses_total", "counter", "Tool lookup cache misses.",
+         [({"cache": cache.name}, stats["misses"]) for cache, stats in tool_caches]),
+        ("chatbot_tool_cache_coalesced_total", "counter", "Lookups that waited on an identical in-flight load.",
+         [({"cache": cache.name}, stats["coalesced"]) for cache, stats in tool_caches]),
+        ("chatbot_upstream_requests_total", "counter", "Requests sent to external tool APIs.",
+         [({"upstream": client.name}, stats["requests"]) for client, stats in upstreams]),
+        ("chatbot_upstream_retries_total", "counter", "Retried requests to external tool APIs.",
+         [({"upstream": client.name}, stats["retries"]) for client, stats in upstreams]),
+        ("chatbot_upstream_short_circuited_total", "counter", "Requests rejected by an open circuit breaker.",
+         [({"upstream": client.name}, stats["short_circuited"]) for client, stats in upstreams]),
+        ("chatbot_upstream_bulkhead_rejected_total", "counter", "Requests rejected because the upstream had too many calls in flight.",
+         [({"upstream": client.name}, stats["bulkhead_rejected"]) for client, stats in upstreams]),
+        ("chatbot_upstream_circuit_open", "gauge", "1 while the upstream circuit breaker is not closed.",
+         [({"upstream": client.name}, int(stats["circuit_state"] != "closed")) for client, stats in upstreams]),
+        ("chatbot_sessions", "gauge", "Conversation sessions held in memory.", [({}, sessions["sessions"])]),
+        ("chatbot_session_bytes", "gauge", "Bytes of stored conversation history.", [({}, sessions["total_bytes"])]),
+        ("chatbot_response_cache_hits_total", "counter", "Final answers served from the response cache.", [({}, answers["hits"])]),
+        ("chatbot_response_cache_misses_total", "counter", "Response cache lookups that missed.", [({}, answers["misses"])]),
+        ("chatbot_admission_admitted_total", "counter", "Chat turns admitted to call OpenAI.", [({}, admitted["admitted"])]),
+        ("chatbot_admission_shed_total", "counter", "Chat turns rejected with 429/503 by admission control.",
+         [({"reason": reason}, count) for reason, count in admitted["shed"].items()]),
+        ("chatbot_admission_queue_depth", "gauge", "Admitted turns currently waiting for OpenAI quota.", [({}, admitted["queue_depth"])]),
+        ("chatbot_admission_rate_scale", "gauge", "Fraction of the configured OpenAI rate in use after 429 backoff.", [({}, admitted["rate_scale"])]),
+        ("chatbot_openai_rate_limited_total", "counter", "429 responses received from OpenAI.", [({}, admitted["upstream_rate_limited"])])
+    ]
+
+registry.register_collector(collect_component_stats)
+# --- End Metrics Collectors ---
+
+
 # --- Routes ---
 @app.route('/')
 def hello():
     return "React+OpenAI Chatbot Backend is running!"
 
-# --- Main Chat Route (Handles Function Calling for Password, Weather, Currency) ---
-@app.route('/chat', methods=['POST'])
-def chat():
-    print("--- /chat endpoint called ---")
+@app.route('/data/reload', methods=['POST'])
+def reload_data():
+    """Re-reads the knowledge base file now and re-indexes only the entries that changed."""
+    return jsonify(reload_knowledge_base(force=True))
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus text exposition of request/phase/tool latency histograms and component counters."""
+    return Response(registry.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.route('/stats/admission')
+def admission_stats():
+    """Admitted/shed counts, wait queue depth and the adaptive rate scale of the admission controller."""
+    return jsonify(admission.stats())
+
+@app.route('/stats/response-cache')
+def response_cache_stats():
+    return jsonify(response_cache.stats())
+
+@app.route('/stats/sessions')
+def session_stats():
+    return jsonify(session_store.stats())
+
+@app.route('/stats/cache')
+def cache_stats():
+    """Hit/miss/coalesce counters for the tool lookup caches."""
+    return jsonify({cache.name: cache.stats() for cache in (weather_cache, exchange_rate_cache)})
+
+@app.route('/stats/upstreams')
+def upstream_stats():
+    """Circuit breaker state, retry and failure counters for the external tool APIs."""
+    return jsonify({client.name: client.stats() for client in (weather_http, exchangerate_http)})
+
+# --- Chat Pipeline (shared by /chat and /chat/batch) ---
+def run_chat_turn(data, client_id=None) -> tuple:
+    """Runs one chat request body through the full pipeline and returns (response_data, status_code).
+
+    Never raises and doesn't touch Flask request state, so /chat/batch can run it on worker threads.
+    Turns shed by admission control return 429/503 with a "retry_after" (seconds) in response_data.
+    """
+    started = time.perf_counter()
     status_code = 500
     response_data = {"error": "An unexpected internal error occurred."} 
 
     try:
-        data = request.get_json()
-        print(f"Received data: {data}")
-        if not data or 'query' not in data:
-            return jsonify({"error": "Request body must contain 'query'."}), 400
+        log.debug("Received data: %s", data)
+        try:
+            user_query = parse_chat_query(data)
+        except ValueError as e_query:
+            return {"error": str(e_query)}, 400
+        session_id = parse_session_id(data)
+        log.debug("User query: %r", user_query)
 
-        user_query = data['query'].strip()
-        print(f"User query: '{user_query}'")
+        with span("local_answer"):
+            local_answer = answer_locally(user_query, session_id)
+        if local_answer:
+            log.info("Answered from local knowledge base (no OpenAI call).")
+            ANSWERS_TOTAL.inc(source="local")
+            remember_turn(session_id, [{"role": "user", "content": user_query}], local_answer)
+            return {"response": local_answer}, 200
+
+        with span("response_cache"):
+            response_cacheable = response_cache_applies(session_id)
+            cached_text = cached_response(user_query, response_cacheable)
+        if cached_text:
+            log.info("Answered from response cache (no OpenAI call).")
+            ANSWERS_TOTAL.inc(source="cache")
+            remember_turn(session_id, [{"role": "user", "content": user_query}], cached_text)
+            return {"response": cached_text}, 200
 
         if not openai_client:
              response_data = {"error": "AI Client (OpenAI) not initialized."}
-             return jsonify(response_data), 500
+             return response_data, 500
 
-        # --- Prepare for API Call ---
-        messages = [{"role": "user", "content": user_query}]
-        use_tools_flag = bool(available_tools) # Check if tools were defined successfully
+        try:
+            ticket = admit_turn(client_id, user_query)
+        except AdmissionRejected as rejected:
+            return admission_rejection(rejected)
 
-        if use_tools_flag:
-            print(f"Attempting OpenAI call WITH TOOLS for query: '{user_query}'")
-            try:
-                # === First API Call: Send query and tools ===
-                response = openai_client.chat.completions.create(
-                    model="gpt-4o-mini", 
-                    messages=messages,
-                    tools=available_tools, 
-                    tool_choice="auto" 
-                )
-                response_message = response.choices[0].message 
-                messages.append(response_message) 
-                print("OpenAI initial response received.")
-
-                # === Check for Tool Calls ===
-                tool_calls = response_message.tool_calls 
+        with ticket: # waits for quota if needed; the client slot is released when the turn ends
+            # --- Prepare for API Call ---
+            with span("retrieval"):
+                messages = build_initial_messages(user_query, session_id)
+            turn_start = len(messages) - 1 # This turn's messages (from the user query on) are kept in the session
+            use_tools_flag = bool(available_tools) # Check if tools were defined successfully
+
+            if use_tools_flag:
+                log.debug("Attempting OpenAI call WITH TOOLS for query: %r", user_query)
+                try:
+                    # === First API Call: Send query and tools ===
+                    with span("llm_first"):
+                        response = openai_client.chat.completions.create(
+                            model=CHAT_MODEL, 
+                            messages=messages,
+                            tools=available_tools, 
+                            tool_choice="auto" 
+                        )
+                    ticket.record_usage(getattr(response, "usage", None))
+                    response_message = response.choices[0].message 
+                    messages.append(response_message) 
+                    log.debug("OpenAI initial response received.")
+
+                    # === Check for Tool Calls ===
+                    tool_calls = response_message.tool_calls 
+                    answer_source = "llm"
                 
-                if tool_calls:
-                    print(f"Tool calls requested: {len(tool_calls)}")
-                    available_functions = {
-                        "generate_random_password": generate_random_password,
-                        "get_current_weather": get_current_weather,
-                        "convert_currency": convert_currency
-                    }
-                    
-                    # --- Execute local functions ---
-                    for tool_call in tool_calls:
-                        function_name = tool_call.function.name
-                        function_args_str = tool_call.function.arguments
-                        tool_call_id = tool_call.id 
-                        print(f"-> Function Call Requested: {function_name}")
-                        print(f"-> Arguments (raw string): {function_args_str}")
-                        
-                        function_to_call = available_functions.get(function_name)
-                            
-                        if function_to_call:
-                            function_response = None # Initialize for safety
-                            try:
-                                function_args = json.loads(function_args_str)
-                                print(f"Parsed arguments: {function_args}") 
-
-                                # Prepare kwargs safely
-                                call_kwargs = {} 
-                                if function_name == "generate_random_password":
-                                    length = function_args.get("length")
-                                    include_symbols = function_args.get("include_symbols") 
-                                    if length is not None: call_kwargs["length"] = int(length)
-                                    if include_symbols is not None and isinstance(include_symbols, bool): call_kwargs["include_symbols"] = include_symbols
-                                elif function_name == "get_current_weather":
-                                    location = function_args.get("location")
-                                    unit = function_args.get("unit") 
-                                    if location: call_kwargs["location"] = str(location)
-                                    else: raise ValueError("'location' argument required")
-                                    if unit is not None: call_kwargs["unit"] = str(unit) 
-                                elif function_name == "convert_currency":
-                                    amount = function_args.get("amount")
-                                    from_currency = function_args.get("from_currency")
-                                    to_currency = function_args.get("to_currency")
-                                    if amount is not None: call_kwargs["amount"] = float(amount)
-                                    else: raise ValueError("'amount' argument required")
-                                    if from_currency and len(str(from_currency)) == 3: call_kwargs["from_currency"] = str(from_currency).upper()
-                                    else: raise ValueError("'from_currency' required (3-letter code)")
-                                    if to_currency and len(str(to_currency)) == 3: call_kwargs["to_currency"] = str(to_currency).upper()
-                                    else: raise ValueError("'to_currency' required (3-letter code)")
-
-                                print(f"Calling local function: {function_name} with args: {call_kwargs}")
-                                function_response = function_to_call(**call_kwargs) 
-                                print(f"Local function '{function_name}' response generated.")
-                            
-                            # Catch errors during arg parsing/validation or function execution
-                            except (json.JSONDecodeError, ValueError, TypeError) as arg_err: 
-                                 print(f"!!! Argument/Type Error for {function_name}: {arg_err}")
-                                 function_response = f"Error: Invalid arguments provided - {str(arg_err)}"
-                            except Exception as e_func_call: 
-                                 print(f"!!! Error executing local function {function_name}: {e_func_call}")
-                                 traceback.print_exc()
-                                 function_response = f"Error executing function: {str(e_func_call)}"
-                            
-                            # Append result (or error string) to messages
-                            messages.append(
-                                { "tool_call_id": tool_call_id, "role": "tool", "name": function_name, "content": function_response }
+                    if tool_calls:
+                        log.info("Tool calls requested: %d", len(tool_calls))
+
+                        # --- Execute local functions (concurrently, results in tool_call order) ---
+                        with span("tools"):
+                            tool_messages = run_tool_calls(
+                                [(tool_call.id, tool_call.function.name, tool_call.function.arguments) for tool_call in tool_calls]
                             )
+                        messages.extend(tool_messages)
+                        response_text = terminal_response(tool_messages)
+
+                        if response_text is not None:
+                            # Every tool result is already the answer; skip the second model call
+                            log.debug("Answered from terminal tool results (no second OpenAI call).")
+                            ticket.refund_call()
+                            answer_source = "terminal_tool"
+                            status_code = 200
                         else:
-                            # Function not found
-                            print(f"!!! Warning: Function '{function_name}' requested but not implemented.")
-                            messages.append({"tool_call_id": tool_call_id, "role": "tool", "name": function_name, "content": f"Error: Function '{function_name}' not available."})
-
-                    # === Second API Call ===
-                    print("Calling OpenAI again with tool results...")
-                    try:
-                        response_final = openai_client.chat.completions.create( model="gpt-4o-mini", messages=messages )
-                        message_final = response_final.choices[0].message
-                        response_text = message_final.content if message_final.content else "(AI had no further response)"
-                        status_code = 200
-                        print("OpenAI final response received.")
-                    except Exception as e_openai_2:
-                         print(f"!!! OpenAI API call error (2nd call): {e_openai_2}")
-                         response_text = f"Error communicating with AI after tool use: {str(e_openai_2)}"
-                         status_code = 500 
+                            # === Second API Call ===
+                            log.debug("Calling OpenAI again with tool results...")
+                            try:
+                                with span("llm_second"):
+                                    response_final = openai_client.chat.completions.create( model=CHAT_MODEL, messages=messages )
+                                ticket.record_usage(getattr(response_final, "usage", None))
+                                message_final = response_final.choices[0].message
+                                response_text = message_final.content if message_final.content else "(AI had no further response)"
+                                status_code = 200
+                                log.debug("OpenAI final response received.")
+                            except Exception as e_openai_2:
+                                 log.error("OpenAI API call error (2nd call): %s", e_openai_2)
+                                 response_text = f"Error communicating with AI after tool use: {str(e_openai_2)}"
+                                 status_code = 500 
                          
-                else:
-                    # --- No tool call requested ---
-                    print("No tool call requested by AI. Using initial response.")
-                    response_text = response_message.content if response_message.content else "(AI returned an empty response)"
-                    status_code = 200 # Still a successful interaction
-
-                # Prepare final response data
-                if status_code == 200: response_data = {"response": response_text}
-                else: response_data = {"error": response_text} 
+                    else:
+                        # --- No tool call requested ---
+                        log.debug("No tool call requested by AI. Using initial response.")
+                        ticket.refund_call()
+                        response_text = response_message.content if response_message.content else "(AI returned an empty response)"
+                        status_code = 200 # Still a successful interaction
+                        store_response(user_query, response_cacheable, response_message.content, (time.perf_counter() - started) * 1000)
+
+                    # Prepare final response data
+                    if status_code == 200:
+                        response_data = {"response": response_text}
+                        ANSWERS_TOTAL.inc(source=answer_source)
+                        # Without tool calls the first reply is the answer itself, which remember_turn adds
+                        remember_turn(session_id, messages[turn_start:] if tool_calls else messages[turn_start:turn_start + 1], response_text)
+                    else: response_data = {"error": response_text} 
                 
-                print(f"Final response text determined: {response_text}")
-                return jsonify(response_data), status_code
-
-            except Exception as e_fc_outer:
-                # Catch errors during the main FC try block
-                print(f"!!! Error during Function Calling process: {e_fc_outer}")
-                traceback.print_exc()
-                response_data = {"error": f"An error occurred during AI processing with tools: {str(e_fc_outer)}"}
-                return jsonify(response_data), 500
-
-        # --- Fallback to General Chat IF available_tools was None ---
-        else: 
-             print("--- Handling as General Chat (Function Calling Tools Unavailable) ---")
-             # ... (Existing simple chat completion logic) ...
-             try:
-                 # ... (Call OpenAI, get response_text) ...
-                 status_code = 200
-                 response_data = {"response": response_text}
-             except Exception as e_gen_chat:
-                 # ... (Handle error) ...
-                 status_code = 500
-                 response_data = {"error": ...}
-             return jsonify(response_data), status_code
+                    log.debug("Final response text determined: %s", response_text)
+                    return response_data, status_code
+
+                except Exception as e_fc_outer:
+                    # Catch errors during the main FC try block
+                    log.exception("Error during Function Calling process: %s", e_fc_outer)
+                    response_data = {"error": f"An error occurred during AI processing with tools: {str(e_fc_outer)}"}
+                    return response_data, 500
+
+            # --- Fallback to General Chat IF available_tools was None ---
+            else: 
+                 log.warning("Handling as General Chat (Function Calling Tools Unavailable)")
+                 # ... (Existing simple chat completion logic) ...
+                 try:
+                     # ... (Call OpenAI, get response_text) ...
+                     status_code = 200
+                     response_data = {"response": response_text}
+                 except Exception as e_gen_chat:
+                     # ... (Handle error) ...
+                     status_code = 500
+                     response_data = {"error": ...}
+                 return response_data, status_code
 
     except Exception as e_very_outer:
-         # Catch-all for unexpected errors (e.g., request.get_json() fails)
-         print(f"!!! Unexpected error in chat function top level: {e_very_outer}")
-         traceback.print_exc()
+         # Catch-all for unexpected errors
+         log.exception("Unexpected error in chat function top level: %s", e_very_outer)
+         return {"error": "An unexpected internal error occurred."}, 500
+# --- End Chat Pipeline ---
+
+
+# --- Main Chat Route (Handles Function Calling for Password, Weather, Currency) ---
+@app.route('/chat', methods=['POST'])
+def chat():
+    log.info("/chat endpoint called")
+    try:
+        with span("parse"):
+            data = request.get_json(silent=True) # malformed JSON is a 400 from run_chat_turn, not a 500
+    except Exception as e_parse:
+         log.exception("Unexpected error in chat function top level: %s", e_parse)
          return jsonify({"error": "An unexpected internal error occurred."}), 500
+
+    response_data, status_code = run_chat_turn(data, request_client_id())
+    with span("serialize"):
+        return jsonify(response_data), status_code, retry_after_headers(response_data)
 # --- End Chat Route ---
 
+
+# --- Batch Chat Route (NDJSON) ---
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "100"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+# Separate from tool_executor: batch items wait on their own tool calls, so sharing one pool could deadlock
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_MAX_CONCURRENCY, thread_name_prefix="batch")
+
+def parse_batch_request(data) -> tuple:
+    """Validates {"queries": ["...", {"query": "...", "session_id": "..."}, ...], "concurrency": n}.
+
+    Returns (one /chat body per item, concurrency capped at BATCH_MAX_CONCURRENCY); raises ValueError.
+    """
+    queries = data.get("queries") if isinstance(data, dict) else None
+    if not isinstance(queries, list) or not queries:
+        raise ValueError("Request body must contain a non-empty 'queries' array.")
+    if len(queries) > BATCH_MAX_ITEMS:
+        raise ValueError(f"At most {BATCH_MAX_ITEMS} queries per batch.")
+    try:
+        concurrency = max(1, min(int(data.get("concurrency") or BATCH_MAX_CONCURRENCY), BATCH_MAX_CONCURRENCY))
+    except (ValueError, TypeError):
+        raise ValueError("'concurrency' must be an integer.")
+    return [item if isinstance(item, dict) else {"query": item} for item in queries], concurrency
+
+def iter_batch_results(items: list, concurrency: int, client_id=None):
+    """Runs run_chat_turn for every item with at most `concurrency` in flight.
+
+    Yields (index, response_data, status_code) in completion order. An item that fails only fails itself.
+    """
+    pending = {}
+    next_index = 0
+    try:
+        while next_index < len(items) or pending:
+            while next_index < len(items) and len(pending) < concurrency:
+                pending[batch_executor.submit(run_chat_turn, items[next_index], client_id)] = next_index
+                next_index += 1
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                try:
+                    response_data, status_code = future.result()
+                except Exception as e_item:
+                    log.error("Batch item %d raised outside the chat pipeline: %s", index, e_item)
+                    response_data, status_code = {"error": "An unexpected internal error occurred."}, 500
+                yield index, response_data, status_code
+    finally:
+        # Client went away: don't start the items that haven't been picked up yet
+        for future in pending:
+            future.cancel()
+
+@app.route('/chat/batch', methods=['POST'])
+def chat_batch():
+    """Runs many /chat requests concurrently and streams one NDJSON line per item as it finishes.
+
+    Body: see parse_batch_request.
+    Lines: {"index", "status", "response" | "error"}, then a final {"done": true, "items", "errors", "total_ms"}.
+    """
+    log.info("/chat/batch endpoint called")
+    data = request.get_json(silent=True)
+    try:
+        items, concurrency = parse_batch_request(data)
+    except ValueError as e_batch:
+        return jsonify({"error": str(e_batch)}), 400
+    # Items share the caller's per-client admission cap; stay within it rather than shedding our own items
+    concurrency = min(concurrency, admission.per_client_concurrency or concurrency)
+    client_id = request_client_id()
+
+    def generate():
+        started = time.perf_counter()
+        errors = 0
+        for index, response_data, status_code in iter_batch_results(items, concurrency, client_id):
+            errors += status_code != 200
+            yield json.dumps({"index": index, "status": status_code, **response_data}) + "\n"
+        yield json.dumps({
+            "done": True, "items": len(items), "errors": errors, "total_ms": round((time.perf_counter() - started) * 1000, 1)
+        }) + "\n"
+
+    return Response(generate(), mimetype="application/x-ndjson", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+# --- End Batch Chat Route ---
+
+
+# --- Streaming Chat Route (Server-Sent Events) ---
+def sse_event(event: str, payload: dict) -> str:
+    """Formats one Server-Sent Event frame."""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+def stream_completion(messages: list, tools: list = None, ticket=None):
+    """Streams a chat completion.
+
+    Yields ("token", text) for every content delta as it arrives, then a single
+    ("message", assistant_message) with the assembled message, including any tool calls.
+    The usage reported in the final chunk is recorded on the admission ticket.
+    """
+    create_kwargs = {"model": CHAT_MODEL, "messages": messages, "stream": True, "stream_options": {"include_usage": True}}
+    if tools:
+        create_kwargs["tools"] = tools
+        create_kwargs["tool_choice"] = "auto"
+
+    content_parts = []
+    tool_calls_by_index = {} # Tool call id/name/arguments arrive in fragments keyed by index
+    for chunk in openai_client.chat.completions.create(**create_kwargs):
+        if ticket is not None and getattr(chunk, "usage", None):
+            ticket.record_usage(chunk.usage)
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+        if delta.content:
+            content_parts.append(delta.content)
+            yield "token", delta.content
+        for tool_call_delta in delta.tool_calls or []:
+            entry = tool_calls_by_index.setdefault(
+                tool_call_delta.index, {"id": None, "type": "function", "function": {"name": "", "arguments": ""}}
+            )
+            if tool_call_delta.id: entry["id"] = tool_call_delta.id
+            if tool_call_delta.function:
+                if tool_call_delta.function.name: entry["function"]["name"] += tool_call_delta.function.name
+                if tool_call_delta.function.arguments: entry["function"]["arguments"] += tool_call_delta.function.arguments
+
+    assistant_message = {"role": "assistant", "content": "".join(content_parts) or None}
+    if tool_calls_by_index:
+        assistant_message["tool_calls"] = [tool_calls_by_index[i] for i in sorted(tool_calls_by_index)]
+    yield "message", assistant_message
+
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """Same pipeline as /chat, but streams tokens, tool progress and a final summary as SSE.
+
+    Events: 'token' {"delta"}, 'tool_call' {"id", "name", "status", "elapsed_ms"?},
+    'done' {"response", "tool_calls", "ttft_ms", "total_ms"} and 'error' {"error"}.
+    """
+    log.info("/chat/stream endpoint called")
+    with span("parse"):
+        data = request.get_json(silent=True)
+    try:
+        user_query = parse_chat_query(data)
+    except ValueError as e_query:
+        return jsonify({"error": str(e_query)}), 400
+    session_id = parse_session_id(data)
+    with span("local_answer"):
+        local_answer = answer_locally(user_query, session_id)
+    if local_answer:
+        ANSWERS_TOTAL.inc(source="local")
+    else:
+        with span("response_cache"):
+            response_cacheable = response_cache_applies(session_id)
+            local_answer = cached_response(user_query, response_cacheable)
+        if local_answer:
+            ANSWERS_TOTAL.inc(source="cache")
+    if local_answer:
+        # Knowledge base or response cache hit: the whole answer is one token event
+        remember_turn(session_id, [{"role": "user", "content": user_query}], local_answer)
+        local_ms = round((time.perf_counter() - g.request_started) * 1000, 1)
+        body = sse_event("token", {"delta": local_answer}) + sse_event("done", {
+            "response": local_answer, "tool_calls": 0, "ttft_ms": local_ms, "total_ms": local_ms
+        })
+        return Response(body, mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+    if not openai_client:
+        return jsonify({"error": "AI Client (OpenAI) not initialized."}), 500
+
+    try:
+        ticket = admit_turn(request_client_id(), user_query)
+    except AdmissionRejected as rejected:
+        response_data, status_code = admission_rejection(rejected)
+        return jsonify(response_data), status_code, retry_after_headers(response_data)
+
+    # ttft_ms/total_ms count from the start of the request, admission wait included, like /chat's Server-Timing total
+    started = g.request_started
+
+    def generate():
+        ticket.wait()
+        timings = {"first_token": None}
+        response_parts = []
+        with span("retrieval"):
+            messages = build_initial_messages(user_query, session_id)
+        turn_start = len(messages) - 1
+
+        def relay(completion):
+            # Forwards token deltas to the client and captures the assembled assistant message
+            for kind, value in completion:
+                if kind == "token":
+                    if timings["first_token"] is None: timings["first_token"] = time.perf_counter()
+                    response_parts.append(value)
+                    yield sse_event("token", {"delta": value})
+                else:
+                    timings["message"] = value
+
+        try:
+            # === First API Call (streamed) ===
+            llm_started = time.perf_counter()
+            yield from relay(stream_completion(messages, tools=available_tools, ticket=ticket))
+            PHASE_SECONDS.observe(time.perf_counter() - llm_started, phase="llm_first")
+            assistant_message = timings.pop("message")
+            tool_calls = assistant_message.get("tool_calls") or []
+            answer_source = "llm"
+            if not tool_calls:
+                ticket.refund_call()
+
+            if tool_calls:
+                messages.append(assistant_message)
+                log.info("Tool calls requested (stream): %d", len(tool_calls))
+                requested = [(tc["id"], tc["function"]["name"], tc["function"]["arguments"]) for tc in tool_calls]
+                for tool_call_id, function_name, _ in requested:
+                    yield sse_event("tool_call", {"id": tool_call_id, "name": function_name, "status": "started"})
+
+                # Tools run concurrently; progress is reported in completion order, results are appended in request order
+                tool_messages = [None] * len(requested)
+                tools_started = time.perf_counter()
+                for index, tool_message, elapsed_ms, timed_out in iter_tool_results(requested):
+                    tool_messages[index] = tool_message
+                    yield sse_event("tool_call", {
+                        "id": tool_message["tool_call_id"], "name": tool_message["name"],
+                        "status": "timeout" if timed_out else "finished", "elapsed_ms": elapsed_ms
+                    })
+                PHASE_SECONDS.observe(time.perf_counter() - tools_started, phase="tools")
+                messages.extend(tool_messages)
+
+                terminal_text = terminal_response(tool_messages)
+                if terminal_text is not None:
+                    # Every tool result is already the answer; send it as one token instead of a second model call
+                    answer_source = "terminal_tool"
+                    ticket.refund_call()
+                    yield from relay(iter([("token", terminal_text)]))
+                else:
+                    # === Second API Call (streamed) ===
+                    llm_started = time.perf_counter()
+                    yield from relay(stream_completion(messages, ticket=ticket))
+                    PHASE_SECONDS.observe(time.perf_counter() - llm_started, phase="llm_second")
+                    timings.pop("message", None)
+
+            finished = time.perf_counter()
+            response_text = "".join(response_parts) or "(AI returned an empty response)"
+            ANSWERS_TOTAL.inc(source=answer_source)
+            remember_turn(session_id, messages[turn_start:], response_text)
+            if not tool_calls:
+                store_response(user_query, response_cacheable, "".join(response_parts), (finished - started) * 1000)
+            ttft_ms = round((timings["first_token"] - started) * 1000, 1) if timings["first_token"] else None
+            yield sse_event("done", {
+                "response": response_text,
+                "tool_calls": len(tool_calls),
+                "ttft_ms": ttft_ms,
+                "total_ms": round((finished - started) * 1000, 1)
+            })
+            log.info("Stream finished: ttft_ms=%s, total_ms=%s", ttft_ms, round((finished - started) * 1000, 1))
+        except Exception as e_stream:
+            log.exception("Error during streamed chat: %s", e_stream)
+            yield sse_event("error", {"error": f"An error occurred during AI processing: {str(e_stream)}"})
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+    response.call_on_close(ticket.release) # also runs if the client disconnects mid-stream
+    return response
+# --- End Streaming Chat Route ---
+
 # --- Server Start ---
 if __name__ == '__main__':
-    print(">>> Starting Flask server via app.run()...")
+    log.info("Starting Flask server via app.run()...")
     app.run(debug=True, host='0.0.0.0', port=5000) 
 # --- End Server Start ---
\ No newline at end of file
@@ -0,0 +1,458 @@
+# backend/asgi_app.py - Async (ASGI) serving path for /chat using AsyncOpenAI
+#
+# Same request/response contract as the Flask /chat route in app.py, but each conversation is a
+# coroutine instead of a worker thread, so LLM round-trips and tool API calls don't pin threads while waiting.
+# Knowledge base work stays off the event loop: local answers and /data/reload run on a small pool,
+# retrieval (whose query embedding is a blocking OpenAI call) on its own sized pool, and the knowledge
+# base file is watched by a background thread instead of being checked per request.
+# Run with:  uvicorn asgi_app:app --host 0.0.0.0 --port 5000 --workers 2
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+# Reuse the tool definitions, tool execution and caches/HTTP clients from the Flask app
+from app import (
+    CHAT_MODEL, available_tools, answer_locally, build_initial_messages, execute_tool_call, prepare_tool_kwargs,
+    tool_deadline_seconds, tool_timeout_message, tool_status, TOOL_TURN_BUDGET_SECONDS,
+    _weather_request, weather_cache_key, format_weather, weather_error_message,
+    _exchange_rates_url, parse_exchange_rates, parse_conversion_args, format_conversion, currency_error_message, terminal_response, parse_chat_query, parse_session_id, remember_turn, session_store,
+    response_cache, response_cache_applies, cached_response, store_response,
+    weather_cache, exchange_rate_cache, weather_http, exchangerate_http, parse_batch_request,
+    admission, admit_turn, admission_rejection, resolve_client_id, retry_after_headers,
+    reload_knowledge_base, start_reload_watcher, stop_reload_watcher
+)
+from admission import AdmissionRejected
+from http_client import deadline_scope, outcome_scope, raise_for_status
+from response_cache import SQLiteBackend
+from observability import registry, span, PROMETHEUS_CONTENT_TYPE, REQUEST_SECONDS, TOOL_SECONDS, ANSWERS_TOTAL
+
+log = logging.getLogger("chatbot.asgi")
+
+# --- Async OpenAI Client Initialization ---
+async_openai_client = None
+if os.getenv('OPENAI_API_KEY'):
+    try:
+        async def observe_openai_response(response):
+            admission.observe_upstream(response.status_code, response.headers)
+
+        async_openai_client = AsyncOpenAI(
+            api_key=os.getenv('OPENAI_API_KEY'),
+            http_client=DefaultAsyncHttpxClient(event_hooks={"response": [observe_openai_response]})
+        )
+        log.info("AsyncOpenAI client initialized.")
+    except Exception as e:
+        log.error("Error initializing AsyncOpenAI client: %s", e)
+        async_openai_client = None
+# --- End Async OpenAI Client Initialization ---
+
+
+# --- Async Tool Execution ---
+# Tools that call external APIs run natively on the event loop (httpx via UpstreamClient.get_async,
+# async single-flight on the shared caches), so thousands of concurrent conversations don't queue
+# behind a thread pool. The remaining tools are local and quick; they run on a small pool of their
+# own rather than app.py's tool_executor, and their deadline starts when they start running.
+ASYNC_BLOCKING_TOOL_WORKERS = int(os.getenv("ASYNC_BLOCKING_TOOL_WORKERS", "8"))
+blocking_tool_executor = ThreadPoolExecutor(max_workers=ASYNC_BLOCKING_TOOL_WORKERS, thread_name_prefix="async-tool")
+
+async def _fetch_weather_data_async(location: str, units: str, api_key: str) -> dict:
+    base_url, params = _weather_request(location, units, api_key)
+    api_response = await weather_http.get_async(base_url, params=params)
+    raise_for_status(api_response)
+    return api_response.json()
+
+async def get_current_weather_async(location: str, unit: str = "metric") -> str:
+    """get_current_weather() in app.py, without blocking a thread."""
+    api_key = os.getenv("OPENWEATHERMAP_API_KEY")
+    if not api_key:
+        return "Error: Weather API key is not configured."
+    cache_key = weather_cache_key(location, unit)
+    units = cache_key[1]
+    try:
+        data = await weather_cache.get_or_load_async(cache_key, lambda: _fetch_weather_data_async(location, units, api_key))
+        return format_weather(data, location, units)
+    except Exception as e:
+        return weather_error_message(e, location)
+
+async def _fetch_exchange_rates_async(base_currency: str, api_key: str) -> dict:
+    response = await exchangerate_http.get_async(_exchange_rates_url(base_currency, api_key))
+    raise_for_status(response)
+    return parse_exchange_rates(response.json())
+
+async def convert_currency_async(amount: float, from_currency: str, to_currency: str) -> str:
+    """convert_currency() in app.py, without blocking a thread."""
+    api_key = os.getenv("EXCHANGERATE_API_KEY")
+    if not api_key:
+        return "Error: Currency conversion API key is not configured."
+    parsed = parse_conversion_args(amount, from_currency, to_currency)
+    if isinstance(parsed, str):
+        return parsed
+    amount_float, from_curr, to_curr = parsed
+    try:
+        rates = await exchange_rate_cache.get_or_load_async(from_curr, lambda: _fetch_exchange_rates_async(from_curr, api_key))
+        return format_conversion(rates, amount_float, from_curr, to_curr)
+    except Exception as e:
+        return currency_error_message(e, from_curr, to_curr)
+
+async_functions = {
+    "get_current_weather": get_current_weather_async,
+    "convert_currency": convert_currency_async
+}
+
+async def execute_tool_call_async(tool_call_id: str, function_name: str, function_args_str: str) -> dict:
+    """execute_tool_call() in app.py for tools with an async implementation; the others go to the blocking pool."""
+    deadline_seconds = tool_deadline_seconds(function_name)
+    function_to_call = async_functions.get(function_name)
+    if function_to_call is None:
+        return await _run_blocking_tool(tool_call_id, function_name, function_args_str, deadline_seconds)
+
+    log.info("Function call requested (async): %s", function_name)
+    outcome = {"status": None} # argument errors happen before any upstream call
+    started = time.perf_counter()
+    try:
+        call_kwargs = prepare_tool_kwargs(function_name, json.loads(function_args_str))
+        with deadline_scope(time.monotonic() + deadline_seconds), outcome_scope() as outcome:
+            function_response = await asyncio.wait_for(function_to_call(**call_kwargs), timeout=deadline_seconds)
+    except asyncio.TimeoutError:
+        log.warning("Tool '%s' timed out (async path)", function_name)
+        TOOL_SECONDS.observe(time.perf_counter() - started, tool=function_name, status="timeout")
+        return tool_timeout_message(tool_call_id, function_name)
+    except (json.JSONDecodeError, ValueError, TypeError) as arg_err:
+        log.warning("Argument/Type Error for %s: %s", function_name, arg_err)
+        function_response = f"Error: Invalid arguments provided - {str(arg_err)}"
+    except Exception as e_func_call:
+        log.exception("Error executing local function %s: %s", function_name, e_func_call)
+        function_response = f"Error executing function: {str(e_func_call)}"
+
+    TOOL_SECONDS.observe(time.perf_counter() - started, tool=function_name, status=tool_status(function_response, outcome))
+    return {"tool_call_id": tool_call_id, "role": "tool", "name": function_name, "content": function_response}
+
+async def _run_blocking_tool(tool_call_id: str, function_name: str, function_args_str: str, deadline_seconds: float) -> dict:
+    """Runs a blocking tool on blocking_tool_executor; its deadline counts from when it starts, not from queueing."""
+    loop = asyncio.get_running_loop()
+    started = loop.create_future()
+
+    def run():
+        loop.call_soon_threadsafe(lambda: started.done() or started.set_result(None))
+        return execute_tool_call(tool_call_id, function_name, function_args_str, time.monotonic() + deadline_seconds)
+
+    future = loop.run_in_executor(blocking_tool_executor, run)
+    try:
+        # Waiting for a free worker is bounded by the whole turn's tool budget
+        await asyncio.wait_for(asyncio.wait({started, future}, return_when=asyncio.FIRST_COMPLETED), timeout=TOOL_TURN_BUDGET_SECONDS)
+        if not future.done():
+            return await asyncio.wait_for(asyncio.shield(future), timeout=deadline_seconds)
+        return future.result()
+    except asyncio.TimeoutError:
+        future.cancel() # drops it if still queued; a running call finishes in the background and is discarded
+        log.warning("Tool '%s' timed out (async path)", function_name)
+        TOOL_SECONDS.observe(deadline_seconds, tool=function_name, status="timeout")
+        return tool_timeout_message(tool_call_id, function_name)
+
+async def run_tool_calls_async(tool_calls: list) -> list:
+    """Runs (tool_call_id, function_name, arguments) tuples concurrently, each under its own deadline.
+    Results keep the original tool_call order."""
+    return await asyncio.gather(*(execute_tool_call_async(*tool_call) for tool_call in tool_calls))
+
+# --- Response cache off the event loop (the sqlite backend does blocking file I/O) ---
+# The memory backend stays on the loop: its answer_version() check only reads the knowledge base
+# version, which the reload watcher (started in the lifespan handler) keeps current.
+RESPONSE_CACHE_BLOCKS = isinstance(response_cache.backend, SQLiteBackend)
+
+async def cached_response_async(user_query: str, cacheable: bool):
+    if cacheable and RESPONSE_CACHE_BLOCKS:
+        return await asyncio.to_thread(cached_response, user_query, cacheable)
+    return cached_response(user_query, cacheable)
+
+async def store_response_async(user_query: str, cacheable: bool, response_text: str, latency_ms: float):
+    if cacheable and RESPONSE_CACHE_BLOCKS:
+        return await asyncio.to_thread(store_response, user_query, cacheable, response_text, latency_ms)
+    return store_response(user_query, cacheable, response_text, latency_ms)
+# --- End Async Tool Execution ---
+
+
+# --- Knowledge Base Work off the Event Loop ---
+# Local answers search in-memory indexes and /data/reload re-reads and re-indexes the file; both run
+# on a small pool. Retrieval gets a pool of its own, sized separately from asyncio's default executor:
+# its query embedding is a blocking call of up to EMBEDDING_QUERY_TIMEOUT_SECONDS (see data_store.py),
+# so with a slow embeddings API this pool bounds how many OpenAI-bound turns can be retrieving at once,
+# and the rest wait for a worker without holding up local answers, tools or the loop.
+ASYNC_LOCAL_ANSWER_WORKERS = int(os.getenv("ASYNC_LOCAL_ANSWER_WORKERS", "4"))
+ASYNC_RETRIEVAL_WORKERS = int(os.getenv("ASYNC_RETRIEVAL_WORKERS", "32"))
+local_answer_executor = ThreadPoolExecutor(max_workers=ASYNC_LOCAL_ANSWER_WORKERS, thread_name_prefix="async-local")
+retrieval_executor = ThreadPoolExecutor(max_workers=ASYNC_RETRIEVAL_WORKERS, thread_name_prefix="async-retrieval")
+
+async def answer_locally_async(user_query: str, session_id: str = None):
+    return await asyncio.get_running_loop().run_in_executor(local_answer_executor, answer_locally, user_query, session_id)
+
+async def build_initial_messages_async(user_query: str, session_id: str = None) -> list:
+    return await asyncio.get_running_loop().run_in_executor(retrieval_executor, build_initial_messages, user_query, session_id)
+
+async def reload_knowledge_base_async() -> dict:
+    return await asyncio.get_running_loop().run_in_executor(local_answer_executor, reload_knowledge_base, True)
+# --- End Knowledge Base Work off the Event Loop ---
+
+
+# --- Async Chat Pipeline (mirrors chat() in app.py) ---
+async def chat_turn(data, client_id=None) -> tuple:
+    """Returns (response_data, status_code) exactly like the Flask /chat route."""
+    try:
+        user_query = parse_chat_query(data)
+    except ValueError as e_query:
+        return {"error": str(e_query)}, 400
+    session_id = parse_session_id(data)
+    with span("local_answer"):
+        local_answer = await answer_locally_async(user_query, session_id)
+    if local_answer:
+        ANSWERS_TOTAL.inc(source="local")
+        remember_turn(session_id, [{"role": "user", "content": user_query}], local_answer)
+        return {"response": local_answer}, 200
+
+    with span("response_cache"):
+        response_cacheable = response_cache_applies(session_id)
+        cached_text = await cached_response_async(user_query, response_cacheable)
+    if cached_text:
+        ANSWERS_TOTAL.inc(source="cache")
+        remember_turn(session_id, [{"role": "user", "content": user_query}], cached_text)
+        return {"response": cached_text}, 200
+
+    if not async_openai_client:
+        return {"error": "AI Client (OpenAI) not initialized."}, 500
+
+    try:
+        ticket = admit_turn(client_id, user_query)
+    except AdmissionRejected as rejected:
+        return admission_rejection(rejected)
+
+    started = time.perf_counter()
+    try:
+        await ticket.wait_async()
+        with span("retrieval"):
+            messages = await build_initial_messages_async(user_query, session_id)
+        turn_start = len(messages) - 1
+
+        # === First API Call: Send query and tools ===
+        create_kwargs = {"model": CHAT_MODEL, "messages": messages}
+        if available_tools:
+            create_kwargs["tools"] = available_tools
+            create_kwargs["tool_choice"] = "auto"
+        with span("llm_first"):
+            response = await async_openai_client.chat.completions.create(**create_kwargs)
+        ticket.record_usage(getattr(response, "usage", None))
+        response_message = response.choices[0].message
+        messages.append(response_message)
+
+        tool_calls = response_message.tool_calls
+        if not tool_calls:
+            ticket.refund_call()
+            response_text = response_message.content if response_message.content else "(AI returned an empty response)"
+            ANSWERS_TOTAL.inc(source="llm")
+            remember_turn(session_id, messages[turn_start:turn_start + 1], response_text)
+            await store_response_async(user_query, response_cacheable, response_message.content, (time.perf_counter() - started) * 1000)
+            return {"response": response_text}, 200
+
+        # --- Execute local functions (concurrently, results in tool_call order) ---
+        with span("tools"):
+            tool_messages = await run_tool_calls_async(
+                [(tool_call.id, tool_call.function.name, tool_call.function.arguments) for tool_call in tool_calls]
+            )
+        messages.extend(tool_messages)
+
+        response_text = terminal_response(tool_messages)
+        if response_text is not None:
+            # Every tool result is already the answer; skip the second model call
+            ticket.refund_call()
+            ANSWERS_TOTAL.inc(source="terminal_tool")
+            remember_turn(session_id, messages[turn_start:], response_text)
+            return {"response": response_text}, 200
+
+        # === Second API Call ===
+        try:
+            with span("llm_second"):
+                response_final = await async_openai_client.chat.completions.create(model=CHAT_MODEL, messages=messages)
+            ticket.record_usage(getattr(response_final, "usage", None))
+            message_final = response_final.choices[0].message
+            response_text = message_final.content if message_final.content else "(AI had no further response)"
+            ANSWERS_TOTAL.inc(source="llm")
+            remember_turn(session_id, messages[turn_start:], response_text)
+            return {"response": response_text}, 200
+        except Exception as e_openai_2:
+            log.error("OpenAI API call error (2nd call): %s", e_openai_2)
+            return {"error": f"Error communicating with AI after tool use: {str(e_openai_2)}"}, 500
+
+    except Exception as e_fc_outer:
+        log.exception("Error during Function Calling process: %s", e_fc_outer)
+        return {"error": f"An error occurred during AI processing with tools: {str(e_fc_outer)}"}, 500
+    finally:
+        ticket.release()
+# --- End Async Chat Pipeline ---
+
+
+# --- Async Batch Chat ---
+async def iter_batch_results_async(items: list, concurrency: int, client_id=None):
+    """Async counterpart of iter_batch_results in app.py: (index, response_data, status_code) in completion order."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_one(index, item):
+        async with semaphore:
+            try:
+                response_data, status_code = await chat_turn(item, client_id)
+            except Exception as e_item:
+                log.exception("Batch item %d failed: %s", index, e_item)
+                response_data, status_code = {"error": "An unexpected internal error occurred."}, 500
+        return index, response_data, status_code
+
+    tasks = [asyncio.ensure_future(run_one(index, item)) for index, item in enumerate(items)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def send_batch(send, data, client_id):
+    try:
+        items, concurrency = parse_batch_request(data)
+    except ValueError as e_batch:
+        return await send_json(send, {"error": str(e_batch)}, 400)
+    concurrency = min(concurrency, admission.per_client_concurrency or concurrency)
+
+    started = time.perf_counter()
+    errors = 0
+    await send({"type": "http.response.start", "status": 200, "headers": [
+        (b"content-type", b"application/x-ndjson"), (b"cache-control", b"no-cache")
+    ] + CORS_HEADERS})
+    async for index, response_data, status_code in iter_batch_results_async(items, concurrency, client_id):
+        errors += status_code != 200
+        line = json.dumps({"index": index, "status": status_code, **response_data}) + "\n"
+        await send({"type": "http.response.body", "body": line.encode(), "more_body": True})
+    summary = {"done": True, "items": len(items), "errors": errors, "total_ms": round((time.perf_counter() - started) * 1000, 1)}
+    await send({"type": "http.response.body", "body": (json.dumps(summary) + "\n").encode()})
+# --- End Async Batch Chat ---
+
+
+# --- Minimal ASGI Application ---
+CORS_HEADERS = [(b"access-control-allow-origin", b"*")]
+
+class _StatusRecorder:
+    """Wraps the ASGI send callable to remember the response status for the latency histogram."""
+
+    def __init__(self, send):
+        self._send = send
+        self.status = 500
+        self.started = False
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            self.status = message["status"]
+            self.started = True
+        await self._send(message)
+
+async def read_body(receive) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+async def read_json(receive):
+    """The request body parsed as JSON, or None when it is empty or malformed (like Flask's
+    get_json(silent=True)), so the route's own validation answers with a 400."""
+    try:
+        return json.loads(await read_body(receive) or b"null")
+    except ValueError: # includes bodies that aren't valid UTF-8
+        return None
+
+async def send_response(send, status: int, body: bytes, content_type: bytes = b"application/json", extra_headers=()):
+    headers = [(b"content-type", content_type), (b"content-length", str(len(body)).encode())]
+    await send({"type": "http.response.start", "status": status, "headers": headers + CORS_HEADERS + list(extra_headers)})
+    await send({"type": "http.response.body", "body": body})
+
+async def send_json(send, payload: dict, status: int = 200):
+    extra_headers = [(name.lower().encode(), value.encode()) for name, value in retry_after_headers(payload).items()]
+    await send_response(send, status, json.dumps(payload).encode(), extra_headers=extra_headers)
+
+def scope_client_id(scope) -> str:
+    """Same identity as request_client_id() in app.py (see resolve_client_id)."""
+    headers = dict(scope.get("headers") or [])
+    client_id, forwarded_for = headers.get(b"x-client-id"), headers.get(b"x-forwarded-for")
+    return resolve_client_id(
+        client_id.decode("latin-1") if client_id else None,
+        forwarded_for.decode("latin-1") if forwarded_for else None,
+        scope["client"][0] if scope.get("client") else None
+    )
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                start_reload_watcher()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                stop_reload_watcher()
+                if async_openai_client: await async_openai_client.close()
+                for client in (weather_http, exchangerate_http):
+                    await client.aclose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] != "http":
+        return
+
+    method, path = scope["method"], scope["path"]
+    started = time.perf_counter()
+    route = path
+    send = _StatusRecorder(send)
+    try:
+        if method == "OPTIONS":
+            # CORS preflight (flask_cors equivalent: any origin, echo requested headers)
+            request_headers = dict(scope.get("headers") or [])
+            await send_response(send, 200, b"", content_type=b"text/plain", extra_headers=[
+                (b"access-control-allow-methods", b"GET, POST, OPTIONS"),
+                (b"access-control-allow-headers", request_headers.get(b"access-control-request-headers", b"content-type"))
+            ])
+        elif path == "/" and method == "GET":
+            await send_response(send, 200, b"React+OpenAI Chatbot Backend is running!", content_type=b"text/html; charset=utf-8")
+        elif path == "/chat" and method == "POST":
+            with span("parse"):
+                data = await read_json(receive)
+            response_data, status_code = await chat_turn(data, scope_client_id(scope))
+            await send_json(send, response_data, status_code)
+        elif path == "/chat/batch" and method == "POST":
+            await send_batch(send, await read_json(receive), scope_client_id(scope))
+        elif path == "/data/reload" and method == "POST":
+            await send_json(send, await reload_knowledge_base_async())
+        elif path == "/metrics" and method == "GET":
+            await send_response(send, 200, registry.render().encode(), content_type=PROMETHEUS_CONTENT_TYPE.encode())
+        elif path == "/stats/admission" and method == "GET":
+            await send_json(send, admission.stats())
+        elif path == "/stats/response-cache" and method == "GET":
+            await send_json(send, response_cache.stats())
+        elif path == "/stats/sessions" and method == "GET":
+            await send_json(send, session_store.stats())
+        elif path == "/stats/cache" and method == "GET":
+            await send_json(send, {cache.name: cache.stats() for cache in (weather_cache, exchange_rate_cache)})
+        elif path == "/stats/upstreams" and method == "GET":
+            await send_json(send, {client.name: client.stats() for client in (weather_http, exchangerate_http)})
+        else:
+            route = "unmatched"
+            await send_json(send, {"error": "Not found."}, 404)
+    except Exception as e_very_outer:
+        log.exception("Unexpected error in ASGI app: %s", e_very_outer)
+        if not send.started: # a streamed batch can't switch to an error response halfway
+            await send_json(send, {"error": "An unexpected internal error occurred."}, 500)
+    finally:
+        REQUEST_SECONDS.observe(time.perf_counter() - started, route=route, method=method, status=send.status)
+# --- End Minimal ASGI Application ---
+
+# --- Server Start ---
+if __name__ == '__main__':
+    import uvicorn
+    log.info("Starting ASGI server via uvicorn...")
+    uvicorn.run("asgi_app:app", host='0.0.0.0', port=5000)
+# --- End Server Start ---
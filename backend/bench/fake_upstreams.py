@@ -0,0 +1,190 @@
+# backend/bench/fake_upstreams.py - Local stand-ins for OpenAI, OpenWeatherMap and ExchangeRate-API
+#
+# One threaded HTTP server answers all three APIs, so app.py can be benchmarked without spending quota:
+#   POST /v1/chat/completions     OpenAI-compatible; tool calls follow the SCENARIOS script tagged in the query
+#   GET  /data/2.5/weather        OpenWeatherMap current weather
+#   GET  /v6/<key>/latest/<base>  ExchangeRate-API rate table
+# Standalone:  python -m bench.fake_upstreams --port 8900   (prints the env vars to point app.py at it, then "# ready")
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+CITIES = ["London", "Paris", "Tokyo", "New York", "Berlin", "Sydney", "Toronto", "Madrid", "Seoul", "Cairo"]
+RATES_PER_USD = {"USD": 1.0, "EUR": 0.92, "GBP": 0.79, "JPY": 151.3, "CAD": 1.37, "AUD": 1.52, "KRW": 1370.0}
+
+# Workload queries carry a "(bench <scenario> #<n>)" tag; the fake model answers with that scenario's tool calls.
+# The running number keeps every query unique, so the response cache and local fast path never short-circuit it.
+SCENARIOS = {
+    "plain": [],
+    "single_tool": [("get_current_weather", lambda n: {"location": CITIES[n % len(CITIES)]})],
+    "multi_tool": [
+        ("get_current_weather", lambda n: {"location": CITIES[n % len(CITIES)]}),
+        ("convert_currency", lambda n: {"amount": 100 + n % 50, "from_currency": "USD", "to_currency": "EUR"}),
+        ("generate_random_password", lambda n: {"length": 16})
+    ]
+}
+_SCENARIO_TAG = re.compile(r"\(bench (\w+) #(\d+)\)")
+
+def scenario_query(scenario: str, n: int) -> str:
+    prompts = {
+        "plain": "Write a two-line poem about the sea",
+        "single_tool": "What's the weather like right now?",
+        "multi_tool": "Check the weather, convert some dollars to euros and make me a password"
+    }
+    return f"{prompts[scenario]} (bench {scenario} #{n})"
+
+
+class FakeUpstreamConfig:
+    """Latency (mean +/- jitter, milliseconds), injected 5xx error rate and OpenAI 429 rate for the fake APIs."""
+
+    def __init__(self, openai_latency_ms: float = 300, openai_jitter_ms: float = 100,
+                 tool_latency_ms: float = 80, tool_jitter_ms: float = 30, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0):
+        self.openai_latency_ms = openai_latency_ms
+        self.openai_jitter_ms = openai_jitter_ms
+        self.tool_latency_ms = tool_latency_ms
+        self.tool_jitter_ms = tool_jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+
+def _sleep(mean_ms: float, jitter_ms: float):
+    delay_ms = mean_ms + random.uniform(-jitter_ms, jitter_ms)
+    if delay_ms > 0:
+        time.sleep(delay_ms / 1000)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # keep-alive, like the real APIs
+    config = FakeUpstreamConfig()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload: dict, status: int = 200, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _inject_error(self) -> bool:
+        if self.config.error_rate and random.random() < self.config.error_rate:
+            self._send_json({"error": {"message": "injected failure"}}, 503)
+            return True
+        return False
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if urlparse(self.path).path.rstrip("/") != "/v1/chat/completions":
+            return self._send_json({"error": {"message": "Not found."}}, 404)
+        if self.config.rate_limit_rate and random.random() < self.config.rate_limit_rate:
+            error = {"error": {"message": "Rate limit reached", "type": "requests"}}
+            return self._send_json(error, 429, {"retry-after-ms": "200"})
+        _sleep(self.config.openai_latency_ms, self.config.openai_jitter_ms)
+        if self._inject_error():
+            return
+        self._send_json(self._chat_completion(json.loads(body or b"{}")))
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        _sleep(self.config.tool_latency_ms, self.config.tool_jitter_ms)
+        if self._inject_error():
+            return
+        if url.path == "/data/2.5/weather":
+            city = parse_qs(url.query).get("q", ["Nowhere"])[0]
+            return self._send_json({
+                "cod": 200, "name": city.title(), "sys": {"country": "XX"},
+                "weather": [{"description": "scattered clouds"}],
+                "main": {"temp": 18.5, "feels_like": 17.9, "humidity": 64}
+            })
+        match = re.fullmatch(r"/v6/[^/]+/latest/([A-Za-z]{3})", url.path)
+        if match:
+            base = match.group(1).upper()
+            if base not in RATES_PER_USD:
+                return self._send_json({"result": "error", "error-type": "unsupported-code"})
+            rates = {code: rate / RATES_PER_USD[base] for code, rate in RATES_PER_USD.items()}
+            return self._send_json({"result": "success", "base_code": base, "conversion_rates": rates})
+        self._send_json({"error": "Not found."}, 404)
+
+    def _chat_completion(self, request_body: dict) -> dict:
+        messages = request_body.get("messages") or [{}]
+        last = messages[-1]
+        message = {"role": "assistant", "content": None}
+        if last.get("role") == "tool":
+            # Second call: summarize the tool results of this turn
+            results = [m.get("content") or "" for m in messages if m.get("role") == "tool"]
+            message["content"] = "Here is what I found: " + " ".join(results)
+        else:
+            match = _SCENARIO_TAG.search(last.get("content") or "")
+            scenario, n = (match.group(1), int(match.group(2))) if match else ("plain", 0)
+            script = SCENARIOS.get(scenario, []) if request_body.get("tools") else []
+            if script:
+                message["tool_calls"] = [
+                    {"id": f"call_{n}_{i}", "type": "function", "function": {"name": name, "arguments": json.dumps(args(n))}}
+                    for i, (name, args) in enumerate(script)
+                ]
+            else:
+                message["content"] = "The sea breathes slow and silver,\nholding every light it's given."
+        return {
+            "id": f"chatcmpl-bench-{random.getrandbits(48):x}", "object": "chat.completion", "created": int(time.time()),
+            "model": request_body.get("model", "fake"),
+            "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if message.get("tool_calls") else "stop"}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        }
+
+
+class _FakeUpstreamServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024 # listen() backlog; read when the socket starts listening, in the constructor
+
+
+def start_fake_upstreams(config: FakeUpstreamConfig = None, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Starts the fake APIs on a daemon thread; port 0 picks a free port (see server.server_port)."""
+    handler = type("FakeUpstreamHandler", (_Handler,), {"config": config or FakeUpstreamConfig()})
+    server = _FakeUpstreamServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, name="fake-upstreams", daemon=True).start()
+    return server
+
+def upstream_env(server: ThreadingHTTPServer) -> dict:
+    """Environment variables that point app.py (and the OpenAI SDK) at the fake server."""
+    base_url = f"http://{server.server_address[0]}:{server.server_port}"
+    return {
+        "OPENAI_API_KEY": "bench-key",
+        "OPENAI_BASE_URL": f"{base_url}/v1",
+        "OPENWEATHERMAP_API_KEY": "bench-key",
+        "OPENWEATHERMAP_BASE_URL": base_url,
+        "EXCHANGERATE_API_KEY": "bench-key",
+        "EXCHANGERATE_BASE_URL": base_url
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the fake OpenAI/weather/currency APIs for benchmarking.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900, help="0 picks a free port")
+    parser.add_argument("--openai-latency-ms", type=float, default=300)
+    parser.add_argument("--openai-jitter-ms", type=float, default=100)
+    parser.add_argument("--tool-latency-ms", type=float, default=80)
+    parser.add_argument("--tool-jitter-ms", type=float, default=30)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of upstream calls answered with 503")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of OpenAI calls answered with 429")
+    args = parser.parse_args()
+    server = start_fake_upstreams(FakeUpstreamConfig(
+        args.openai_latency_ms, args.openai_jitter_ms, args.tool_latency_ms, args.tool_jitter_ms, args.error_rate,
+        args.rate_limit_rate
+    ), host=args.host, port=args.port)
+    for name, value in upstream_env(server).items():
+        print(f"export {name}={value}")
+    print("# ready", flush=True) # run_benchmark.py reads the lines above from the pipe up to here
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
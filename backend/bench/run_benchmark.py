@@ -0,0 +1,261 @@
+# backend/bench/run_benchmark.py - Load test for POST /chat against local fake upstreams
+#
+# From backend/:  python -m bench.run_benchmark --concurrency 32 --requests 2000 --mix plain=6,single_tool=3,multi_tool=1
+# Starts bench/fake_upstreams.py and app.py (bench/target_server.py, a threaded Werkzeug server) as
+# subprocesses pointed at each other, drives them over sockets from this process, and reports
+# requests/s, p50/p95/p99 latency and error rate per scenario. Separate processes keep the load
+# generator, the fakes and the app under test from competing for one GIL.
+# Results are saved under bench/results/ and compared with the previous run (or --baseline).
+import argparse
+import glob
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import requests
+
+from bench.fake_upstreams import SCENARIOS, scenario_query
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_mix(text: str) -> dict:
+    """'plain=6,single_tool=3,multi_tool=1' -> {'plain': 0.6, ...}"""
+    weights = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario '{name}' (choose from {', '.join(SCENARIOS)}).")
+        weights[name] = float(weight or 1)
+    total = sum(weights.values())
+    return {name: weight / total for name, weight in weights.items()}
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+def summarize(samples: list, wall_seconds: float) -> dict:
+    """samples: [(latency_ms, ok), ...]"""
+    latencies = sorted(latency for latency, _ in samples)
+    errors = sum(1 for _, ok in samples if not ok)
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+        "rps": round(len(samples) / wall_seconds, 2) if wall_seconds else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies), 1) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+        "max_ms": round(latencies[-1], 1) if latencies else 0.0
+    }
+
+
+# --- Target Server ---
+def start_process(module: str, args: list, env: dict = None) -> tuple:
+    """Runs `python -m module args` from backend/ and waits for its "# ready" line.
+    Returns (process, {name: value} from the "export NAME=value" lines it printed first)."""
+    process = subprocess.Popen(
+        [sys.executable, "-m", module, *args], cwd=BACKEND_DIR, env={**os.environ, **(env or {})},
+        stdout=subprocess.PIPE, text=True
+    )
+    exported = {}
+    for line in process.stdout:
+        line = line.strip()
+        if line == "# ready":
+            return process, exported
+        name, _, value = line.removeprefix("export ").partition("=")
+        exported[name] = value
+    process.wait()
+    raise RuntimeError(f"{module} exited with status {process.returncode} before it was ready")
+
+def stop_processes(processes: list):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+def start_target(args) -> tuple:
+    """Starts the fake upstreams, then app.py pointed at them. Returns (processes, app url)."""
+    processes = []
+    try:
+        fakes, upstream_env = start_process("bench.fake_upstreams", [
+            "--port", "0", "--openai-latency-ms", str(args.openai_latency_ms), "--openai-jitter-ms", str(args.openai_jitter_ms),
+            "--tool-latency-ms", str(args.tool_latency_ms), "--tool-jitter-ms", str(args.tool_jitter_ms),
+            "--error-rate", str(args.error_rate), "--rate-limit-rate", str(args.rate_limit_rate)
+        ])
+        processes.append(fakes)
+        target, target_env = start_process("bench.target_server", [], upstream_env)
+        processes.append(target)
+    except BaseException:
+        stop_processes(processes)
+        raise
+    return processes, target_env["CHAT_URL"]
+# --- End Target Server ---
+
+
+# --- Load Generator ---
+def run_load(url: str, mix: dict, concurrency: int, total_requests: int, duration_seconds: float, timeout: float,
+             first_number: int = 0) -> tuple:
+    """Closed-loop load: `concurrency` workers each send their next request as soon as the last one returns.
+
+    Queries are numbered from first_number + 1 so no two requests of a benchmark share a query.
+    Returns ({scenario: [(latency_ms, ok), ...]}, wall_seconds).
+    """
+    names, weights = list(mix), list(mix.values())
+    samples = {name: [] for name in names}
+    counter = {"next": 0}
+    lock = threading.Lock()
+    local = threading.local()
+    deadline = time.perf_counter() + duration_seconds if duration_seconds else None
+
+    def next_request():
+        with lock:
+            if total_requests and counter["next"] >= total_requests:
+                return None
+            counter["next"] += 1
+            return first_number + counter["next"]
+
+    def worker():
+        local.session = requests.Session()
+        # One simulated client per worker, so per-client admission caps apply per connection as in production
+        local.session.headers["X-Client-Id"] = f"bench-{threading.get_ident()}"
+        while deadline is None or time.perf_counter() < deadline:
+            n = next_request()
+            if n is None:
+                return
+            scenario = random.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                response = local.session.post(f"{url}/chat", json={"query": scenario_query(scenario, n)}, timeout=timeout)
+                ok = response.status_code == 200 and "response" in response.json()
+            except (requests.exceptions.RequestException, ValueError):
+                ok = False
+            latency_ms = (time.perf_counter() - started) * 1000
+            with lock:
+                samples[scenario].append((latency_ms, ok))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bench-client") as pool:
+        for future in [pool.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    return samples, time.perf_counter() - started
+# --- End Load Generator ---
+
+
+# --- Results ---
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def latest_result_path():
+    paths = sorted(glob.glob(os.path.join(RESULTS_DIR, "*.json")))
+    return paths[-1] if paths else None
+
+def save_result(result: dict) -> str:
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{result['started_at'].replace(':', '')}_{result['git_revision']}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    return path
+
+def print_report(result: dict, baseline: dict = None):
+    columns = ("requests", "rps", "error_rate", "p50_ms", "p95_ms", "p99_ms")
+    print(f"{'scenario':<12}" + "".join(f"{column:>12}" for column in columns))
+    rows = list(result["scenarios"].items()) + [("overall", result["overall"])]
+    for name, stats in rows:
+        print(f"{name:<12}" + "".join(f"{stats[column]:>12}" for column in columns))
+        previous = (baseline or {}).get("overall") if name == "overall" else (baseline or {}).get("scenarios", {}).get(name)
+        if previous:
+            deltas = []
+            for column in columns[1:]:
+                if previous.get(column):
+                    deltas.append(f"{(stats[column] - previous[column]) / previous[column] * 100:+.1f}%")
+                else:
+                    deltas.append("-")
+            print(f"{'  vs base':<12}{'':>12}" + "".join(f"{delta:>12}" for delta in deltas))
+# --- End Results ---
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark POST /chat against local fake upstreams.")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=500, help="total requests (0 = run for --duration)")
+    parser.add_argument("--duration", type=float, default=0, help="seconds to run (0 = until --requests are sent)")
+    parser.add_argument("--warmup", type=int, default=20, help="unrecorded requests sent first")
+    parser.add_argument("--mix", default="plain=6,single_tool=3,multi_tool=1", help="scenario weights")
+    parser.add_argument("--timeout", type=float, default=60, help="client timeout per request (seconds)")
+    parser.add_argument("--openai-latency-ms", type=float, default=300)
+    parser.add_argument("--openai-jitter-ms", type=float, default=100)
+    parser.add_argument("--tool-latency-ms", type=float, default=80)
+    parser.add_argument("--tool-jitter-ms", type=float, default=30)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of upstream calls answered with 503")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of OpenAI calls answered with 429")
+    parser.add_argument("--url", help="benchmark an already running server (started with bench.fake_upstreams env) instead")
+    parser.add_argument("--label", default="", help="free-form note stored with the results")
+    parser.add_argument("--baseline", help="results file to compare with (default: the latest saved run)")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args(argv)
+    if not args.requests and not args.duration:
+        parser.error("set --requests or --duration")
+
+    mix = parse_mix(args.mix)
+    processes = []
+    if args.url:
+        url = args.url.rstrip("/")
+    else:
+        processes, url = start_target(args)
+    try:
+        if args.warmup:
+            run_load(url, mix, min(args.concurrency, args.warmup), args.warmup, 0, args.timeout)
+        started_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        samples, wall_seconds = run_load(url, mix, args.concurrency, args.requests, args.duration, args.timeout, first_number=args.warmup)
+    finally:
+        stop_processes(processes)
+
+    result = {
+        "started_at": started_at,
+        "git_revision": git_revision(),
+        "label": args.label,
+        "config": {
+            "concurrency": args.concurrency, "requests": args.requests, "duration": args.duration, "mix": mix,
+            "openai_latency_ms": args.openai_latency_ms, "openai_jitter_ms": args.openai_jitter_ms,
+            "tool_latency_ms": args.tool_latency_ms, "tool_jitter_ms": args.tool_jitter_ms,
+            "error_rate": args.error_rate, "rate_limit_rate": args.rate_limit_rate, "external_url": args.url
+        },
+        "wall_seconds": round(wall_seconds, 3),
+        "scenarios": {name: summarize(scenario_samples, wall_seconds) for name, scenario_samples in samples.items() if scenario_samples},
+        "overall": summarize([sample for scenario_samples in samples.values() for sample in scenario_samples], wall_seconds)
+    }
+
+    baseline_path = args.baseline or latest_result_path()
+    baseline = None
+    if baseline_path:
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"Baseline: {os.path.basename(baseline_path)} ({baseline.get('git_revision')} {baseline.get('label', '')})".rstrip())
+    print_report(result, baseline)
+    if not args.no_save:
+        print(f"Saved: {save_result(result)}")
+    return 0 if result["overall"]["requests"] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,48 @@
+# backend/bench/target_server.py - app.py on a threaded Werkzeug server, in its own process, for run_benchmark.py
+#
+# run_benchmark.py starts this with the fake upstreams' env vars set, so the app under test doesn't share
+# a GIL with the load generator or the fakes. Prints "export CHAT_URL=..." and "# ready" once listening.
+# Standalone (from backend/, after exporting bench.fake_upstreams' env vars):  python -m bench.target_server --port 5000
+import argparse
+import logging
+import os
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def configure_env():
+    """Keeps the run offline and free of side effects in the repo's data directory."""
+    os.environ.setdefault("KNOWLEDGE_BASE_PATH", os.path.join(BACKEND_DIR, "data", "knowledge_base.example.json"))
+    os.environ.setdefault("EMBEDDING_PROVIDER", "hashing")
+    os.environ.setdefault("RETRIEVAL_INDEX_DIR", tempfile.mkdtemp(prefix="bench-retrieval-"))
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("ADMISSION_TRUST_CLIENT_ID", "1") # the load generator's X-Client-Id stands in for real clients
+
+
+def make_server(host: str = "127.0.0.1", port: int = 0):
+    """Imports app.py (after configure_env) and binds it; port 0 picks a free port."""
+    from werkzeug.serving import ThreadedWSGIServer
+    import app as chat_app
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING) # no access log line per request
+
+    class BenchServer(ThreadedWSGIServer):
+        request_queue_size = 1024 # listen() backlog; read when the socket starts listening, in the constructor
+
+    return BenchServer(host, port, chat_app.app)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve app.py for benchmarking.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0)
+    args = parser.parse_args()
+    configure_env()
+    server = make_server(args.host, args.port)
+    print(f"export CHAT_URL=http://{args.host}:{server.server_port}")
+    print("# ready", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -1,18 +1,307 @@
-# backend/data_store.py (Minimal Structure)
+# backend/data_store.py - FAQ / product knowledge base behind an in-memory BM25 index (hot-reloadable)
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from text_index import TOKEN_PATTERN, InvertedIndex
+
+log = logging.getLogger("chatbot.data_store")
+
+KNOWLEDGE_BASE_PATH = os.getenv(
+    "KNOWLEDGE_BASE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "knowledge_base.json")
+)
+FAQ_CONFIDENCE_THRESHOLD = float(os.getenv("FAQ_CONFIDENCE_THRESHOLD", "0.75"))
+PRODUCT_CONFIDENCE_THRESHOLD = float(os.getenv("PRODUCT_CONFIDENCE_THRESHOLD", "0.75"))
+RELOAD_CHECK_INTERVAL_SECONDS = float(os.getenv("KNOWLEDGE_BASE_RELOAD_CHECK_SECONDS", "5"))
+RETRIEVAL_INDEX_DIR = os.getenv("RETRIEVAL_INDEX_DIR", os.path.dirname(KNOWLEDGE_BASE_PATH))
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "3"))
+RETRIEVAL_MIN_SCORE = os.getenv("RETRIEVAL_MIN_SCORE") # Defaults to the embedding provider's own threshold
+# OpenAI embeddings: document batches (index sync, off the request path) vs. one query per chat turn
+EMBEDDING_TIMEOUT_SECONDS = float(os.getenv("EMBEDDING_TIMEOUT_SECONDS", "30"))
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "2"))
+EMBEDDING_QUERY_TIMEOUT_SECONDS = float(os.getenv("EMBEDDING_QUERY_TIMEOUT_SECONDS", "2"))
+EMBEDDING_QUERY_MAX_RETRIES = int(os.getenv("EMBEDDING_QUERY_MAX_RETRIES", "0"))
+RETRIEVAL_SYNC_RETRY_SECONDS = 30.0
+
+# Words that can be asked of any entry ("is it in stock?", "what is the price?", "where is my order?"):
+# they help rank results but never make a local answer confident on their own
+GENERIC_QUERY_TERMS = "price cost stock available availability buy purchase sell item product cheap expensive order"
+
+faq_index = InvertedIndex(generic_terms=[GENERIC_QUERY_TERMS])
+product_index = InvertedIndex(generic_terms=[GENERIC_QUERY_TERMS])
+_faqs = {}     # id -> FAQ entry
+_faq_questions = {} # normalized question text -> FAQ id, for questions made only of stopwords ("What can you do?")
+_products = {} # id -> product entry
+_doc_hashes = {} # (kind, id) -> content hash, so a reload only re-indexes what changed
+_kb_mtime = None
+_kb_version = "" # changes whenever an entry is added, updated or removed (see knowledge_base_version())
+_last_reload_check = 0.0
+_reload_lock = threading.Lock()
+_reload_watcher = None # see start_reload_watcher()
+_retrieval_index = None  # Built lazily on first retrieval (the embedding provider may need the API key from .env)
+_retrieval_dirty = True  # Knowledge base changed since the retrieval index was last synced
+_retrieval_lock = threading.Lock() # guards creating the index and starting a sync, never held while embedding
+_retrieval_syncing = False
+_retrieval_sync_failed_at = None
+_embedding_meter = None # see set_embedding_meter()
+_order_store = None # Opened on first order lookup (ORDER_DB_PATH)
+_order_store_lock = threading.Lock()
+
+
+def _faq_text(entry: dict) -> str:
+    return f"{entry.get('question', '')} {entry.get('keywords', '')}"
+
+def _product_text(entry: dict) -> str:
+    return f"{entry.get('name', '')} {entry.get('keywords', '')} {entry.get('description', '')}"
+
+def _normalize_question(text: str) -> str:
+    return " ".join(TOKEN_PATTERN.findall(str(text).lower()))
+
+def _sync_collection(kind: str, entries: list, store: dict, index: InvertedIndex, text_fn, counts: dict):
+    """Applies the difference between the file's entries and the indexed ones."""
+    seen = set()
+    for entry in entries:
+        doc_id = entry.get("id")
+        if not doc_id:
+            continue
+        seen.add(doc_id)
+        digest = hashlib.sha1(json.dumps(entry, sort_keys=True).encode()).hexdigest()
+        previous = _doc_hashes.get((kind, doc_id))
+        if previous == digest:
+            counts["unchanged"] += 1
+            continue
+        index.add(doc_id, text_fn(entry))
+        store[doc_id] = entry
+        _doc_hashes[(kind, doc_id)] = digest
+        counts["updated" if previous else "added"] += 1
+    for doc_id in [doc_id for doc_id in store if doc_id not in seen]:
+        index.remove(doc_id)
+        store.pop(doc_id, None)
+        _doc_hashes.pop((kind, doc_id), None)
+        counts["removed"] += 1
+
+def reload_knowledge_base(force: bool = False) -> dict:
+    """(Re)loads KNOWLEDGE_BASE_PATH if it changed on disk, re-indexing only added/changed/removed entries."""
+    global _kb_mtime, _kb_version, _retrieval_dirty, _faq_questions
+    with _reload_lock:
+        counts = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+        try:
+            mtime = os.path.getmtime(KNOWLEDGE_BASE_PATH)
+        except OSError as e:
+            # No example fallback: its made-up policies and contacts must never reach real users
+            log.warning("Knowledge base not found (%s); local answers and retrieval have nothing to serve. "
+                        "See data/knowledge_base.example.json for the format.", e)
+            return counts
+        if not force and mtime == _kb_mtime:
+            return counts
+        try:
+            with open(KNOWLEDGE_BASE_PATH, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            # Keep serving the previous index if the file is mid-write or invalid
+            log.error("Error reading knowledge base, keeping previous version: %s", e)
+            return counts
+        _sync_collection("faq", data.get("faqs", []), _faqs, faq_index, _faq_text, counts)
+        _sync_collection("product", data.get("products", []), _products, product_index, _product_text, counts)
+        _faq_questions = {_normalize_question(entry.get("question", "")): doc_id for doc_id, entry in _faqs.items()}
+        _kb_mtime = mtime
+        if counts["added"] or counts["updated"] or counts["removed"]:
+            _retrieval_dirty = True
+            _kb_version = hashlib.sha1(json.dumps(sorted(_doc_hashes.items())).encode()).hexdigest()[:12]
+        log.info("Knowledge base loaded: %d FAQs, %d products (%s)", len(_faqs), len(_products), counts)
+        return counts
+
+def _maybe_reload():
+    """Cheap throttled mtime check so edits to the data file are picked up without a restart."""
+    global _last_reload_check
+    if _reload_watcher is not None:
+        return # the watcher thread checks instead
+    now = time.monotonic()
+    if now - _last_reload_check < RELOAD_CHECK_INTERVAL_SECONDS:
+        return
+    _last_reload_check = now
+    reload_knowledge_base()
+
+def start_reload_watcher():
+    """Moves the mtime check (and any re-indexing it triggers) from request handling to a daemon thread.
+    For servers that must not do file I/O on the request path, such as the ASGI event loop."""
+    global _reload_watcher
+    with _reload_lock:
+        if _reload_watcher is not None:
+            return
+        stop = threading.Event()
+        _reload_watcher = stop
+
+    def watch():
+        while not stop.wait(RELOAD_CHECK_INTERVAL_SECONDS):
+            try:
+                reload_knowledge_base()
+            except Exception as e:
+                log.error("Knowledge base reload check failed: %s", e)
+
+    threading.Thread(target=watch, name="kb-reload-watcher", daemon=True).start()
+
+def stop_reload_watcher():
+    """Stops the watcher thread; requests go back to checking the file themselves."""
+    global _reload_watcher
+    with _reload_lock:
+        stop, _reload_watcher = _reload_watcher, None
+    if stop is not None:
+        stop.set()
+
+def knowledge_base_version() -> str:
+    """Content hash of the loaded entries, for caches of answers derived from them."""
+    _maybe_reload()
+    return _kb_version
+
 
-# Define functions imported by app.py (implement logic later or copy from old project)
 def get_faq_answer(query):
-    print(f"[data_store] get_faq_answer called with: {query}")
-    return None 
+    """Returns the answer of the best-matching FAQ, or None if no match is confident enough."""
+    _maybe_reload()
+    exact = _faq_questions.get(_normalize_question(query))
+    if exact in _faqs:
+        return _faqs[exact].get("answer")
+    results = faq_index.search(query, k=1)
+    if results and results[0][2] >= FAQ_CONFIDENCE_THRESHOLD:
+        entry = _faqs.get(results[0][0])
+        return entry.get("answer") if entry else None
+    return None
 
 def find_product(query):
-    print(f"[data_store] find_product called with: {query}")
-    return None 
+    """Returns the best-matching product entry, or None if no match is confident enough."""
+    _maybe_reload()
+    results = product_index.search(query, k=1)
+    if results and results[0][2] >= PRODUCT_CONFIDENCE_THRESHOLD:
+        entry = _products.get(results[0][0])
+        return dict(entry) if entry else None
+    return None
+
+def _get_order_store():
+    global _order_store
+    if _order_store is None:
+        with _order_store_lock:
+            if _order_store is None:
+                from order_store import order_store_from_env
+                _order_store = order_store_from_env()
+                log.info("Order store opened at %s", _order_store.path)
+    return _order_store
 
 def get_order_info(order_id):
-    print(f"[data_store] get_order_info called with: {order_id}")
-    return None
+    """Returns the order with this id as a dict (see order_store.ORDER_FIELDS), or None if there is none."""
+    log.debug("get_order_info called with: %s", order_id)
+    return _get_order_store().get(order_id)
+
+# --- Retrieval (RAG) over product and FAQ embeddings ---
+def set_embedding_meter(meter):
+    """meter(requests, tokens) is called after every embeddings API request (app.py charges admission control)."""
+    global _embedding_meter
+    _embedding_meter = meter
+
+def _meter_embedding(requests: int, tokens: float):
+    if _embedding_meter is not None:
+        _embedding_meter(requests, tokens)
+
+def _default_embedding_provider():
+    """OpenAI embeddings when an API key is available, otherwise the deterministic local embedder.
+    Set EMBEDDING_PROVIDER=hashing to force the local one (e.g. tests, offline development)."""
+    from vector_index import HashingEmbeddingProvider, OpenAIEmbeddingProvider
+    if os.getenv("EMBEDDING_PROVIDER", "openai") == "openai" and os.getenv("OPENAI_API_KEY"):
+        from openai import OpenAI
+        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=EMBEDDING_TIMEOUT_SECONDS, max_retries=EMBEDDING_MAX_RETRIES)
+        return OpenAIEmbeddingProvider(
+            client, query_timeout=EMBEDDING_QUERY_TIMEOUT_SECONDS, query_max_retries=EMBEDDING_QUERY_MAX_RETRIES,
+            meter=_meter_embedding
+        )
+    return HashingEmbeddingProvider()
+
+def _retrieval_documents() -> dict:
+    """id -> (text to embed, payload) for everything retrieval should be able to surface."""
+    documents = {}
+    for doc_id, entry in list(_products.items()):
+        snippet = f"{entry.get('name', '')}: {entry.get('description', '')}"
+        if entry.get("price") is not None: snippet += f" Price: ${float(entry['price']):.2f}."
+        if "in_stock" in entry: snippet += " In stock." if entry["in_stock"] else " Currently out of stock."
+        documents[doc_id] = (snippet, {"snippet": snippet})
+    for doc_id, entry in list(_faqs.items()):
+        snippet = f"{entry.get('question', '')} {entry.get('answer', '')}"
+        documents[doc_id] = (snippet, {"snippet": snippet})
+    return documents
+
+def _sync_retrieval_index(index):
+    """Embeds only documents whose text changed since they were indexed; drops removed ones."""
+    documents = _retrieval_documents()
+    changed = [doc_id for doc_id, (text, _) in documents.items()
+               if (index.payload(doc_id) or {}).get("snippet") != text]
+    if changed:
+        index.add(changed, [documents[doc_id][0] for doc_id in changed], [documents[doc_id][1] for doc_id in changed])
+    stale = [doc_id for doc_id in index.ids() if doc_id not in documents]
+    if stale:
+        index.delete(stale)
+    if changed or stale:
+        log.info("Retrieval index synced: %d embedded, %d removed, %d total", len(changed), len(stale), len(index))
+
+def sync_retrieval_index():
+    """Brings the retrieval index up to date with the knowledge base now, in the calling thread."""
+    global _retrieval_dirty, _retrieval_syncing, _retrieval_sync_failed_at
+    index = get_retrieval_index(sync=False)
+    with _retrieval_lock:
+        _retrieval_syncing = True
+        _retrieval_dirty = False # a reload during the sync sets it again
+    try:
+        _sync_retrieval_index(index)
+        _retrieval_sync_failed_at = None
+    except Exception as e:
+        log.warning("Retrieval index sync failed, serving the previous index: %s", e)
+        with _retrieval_lock:
+            _retrieval_dirty = True
+            _retrieval_sync_failed_at = time.monotonic()
+    finally:
+        with _retrieval_lock:
+            _retrieval_syncing = False
+
+def get_retrieval_index(provider=None, sync: bool = True):
+    """Returns the shared retrieval index, opening it on first use.
+
+    After a knowledge base change the index is re-synced on a background thread; until that
+    finishes, searches are served from the previous (or, on a fresh deploy, empty) index, so no
+    request waits for the whole knowledge base to be embedded.
+    """
+    global _retrieval_index, _retrieval_syncing
+    with _retrieval_lock:
+        if _retrieval_index is None:
+            from vector_index import VectorIndex
+            provider = provider or _default_embedding_provider()
+            path = os.path.join(RETRIEVAL_INDEX_DIR, f"retrieval_index_{provider.name}")
+            _retrieval_index = VectorIndex(path, provider)
+        retry_wait = _retrieval_sync_failed_at is not None and time.monotonic() - _retrieval_sync_failed_at < RETRIEVAL_SYNC_RETRY_SECONDS
+        start_sync = sync and _retrieval_dirty and not _retrieval_syncing and not retry_wait
+        if start_sync:
+            _retrieval_syncing = True
+        index = _retrieval_index
+    if start_sync:
+        threading.Thread(target=sync_retrieval_index, name="retrieval-sync", daemon=True).start()
+    return index
 
 def retrieve_product_info(query):
-    print(f"[data_store] retrieve_product_info called with: {query}")
-    return None 
\ No newline at end of file
+    """Returns up to RETRIEVAL_TOP_K relevant product/FAQ snippets for the query (or None)."""
+    results = retrieve_product_info_batch([query])[0]
+    return results or None
+
+def retrieve_product_info_batch(queries: list) -> list:
+    """Batched variant: one embedding call and one matrix product for all queries."""
+    _maybe_reload()
+    try:
+        index = get_retrieval_index()
+        results = index.search(queries, k=RETRIEVAL_TOP_K)
+    except Exception as e:
+        log.warning("Retrieval unavailable: %s", e)
+        return [[] for _ in queries]
+    min_score = float(RETRIEVAL_MIN_SCORE) if RETRIEVAL_MIN_SCORE else index.provider.default_min_score
+    return [[payload["snippet"] for _, score, payload in hits if score >= min_score] for hits in results]
+# --- End Retrieval ---
+
+
+reload_knowledge_base(force=True)
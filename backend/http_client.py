@@ -0,0 +1,410 @@
+# backend/http_client.py - Pooled keep-alive HTTP clients for external tool APIs (retries + circuit breaker)
+import asyncio
+import contextlib
+import contextvars
+import math
+import random
+import threading
+import time
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised without touching the network while an upstream's circuit breaker is open."""
+
+
+class BulkheadFullError(requests.exceptions.ConnectionError):
+    """Raised without touching the network when an upstream already has its maximum calls in flight."""
+
+
+class DeadlineExceededError(requests.exceptions.Timeout):
+    """Raised when the caller's deadline leaves no time for a (further) attempt."""
+
+
+# Absolute time.monotonic() deadline of the current tool call; UpstreamClient.get() uses it when no
+# explicit deadline is passed, so tool functions don't need a deadline parameter of their own.
+_current_deadline = contextvars.ContextVar("upstream_deadline", default=None)
+
+@contextlib.contextmanager
+def deadline_scope(deadline):
+    """Makes `deadline` (a time.monotonic() value, or None) the default for UpstreamClient calls in this context."""
+    token = _current_deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _current_deadline.reset(token)
+
+
+# Outcome of the most recent UpstreamClient call in the current tool call, for the tool latency
+# histogram. A dict rather than the value itself, so calls made by a single-flight loader running
+# in a copied context (e.g. another asyncio task) still report back to the scope that opened it.
+_current_outcome = contextvars.ContextVar("upstream_outcome", default=None)
+
+@contextlib.contextmanager
+def outcome_scope():
+    """Yields {"status": ...} describing the last UpstreamClient call made in this context: the
+    upstream's HTTP status code as a string ("200", "404", "503"), "timeout", "transport_error"
+    (connection refused/reset, malformed response) or "rejected" (circuit open or bulkhead full, no
+    request sent). status stays None when no upstream call was made, e.g. on a cache hit."""
+    outcome = {"status": None}
+    token = _current_outcome.set(outcome)
+    try:
+        yield outcome
+    finally:
+        _current_outcome.reset(token)
+
+def _record_outcome(status: str):
+    outcome = _current_outcome.get()
+    if outcome is not None:
+        outcome["status"] = status
+
+def _attempt_outcome(error, response) -> str:
+    if error is None:
+        return str(response.status_code)
+    return "timeout" if isinstance(error, requests.exceptions.Timeout) else "transport_error"
+
+
+class RetryBudget:
+    """Caps retries to a fraction of recent traffic so a degraded upstream doesn't receive a retry storm.
+
+    Every request deposits `ratio` tokens and every retry spends one; `min_tokens` keeps a small
+    reserve so low-traffic periods can still retry.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_tokens: float = 10.0, max_tokens: float = 100.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = min_tokens
+        self._lock = threading.Lock()
+
+    def record_request(self):
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+    @property
+    def tokens(self) -> float:
+        return self._tokens
+
+
+class CircuitBreaker:
+    """Closed -> open after `failure_threshold` consecutive failures; after `reset_timeout` seconds
+    one half-open probe is let through, and its outcome closes or re-opens the circuit.
+
+    A probe that is never settled (its caller died without recording an outcome) is given up after
+    another `reset_timeout`, so a lost probe can't hold the circuit half-open forever.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+    PASS, PROBE = "pass", "probe"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """PASS or PROBE (the caller holds the half-open probe and must settle it), or None while open."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return self.PASS
+            now = time.monotonic()
+            if self.state == self.OPEN and now - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.HALF_OPEN and (not self._probe_in_flight or now - self._probe_started >= self.reset_timeout):
+                self._probe_in_flight = True
+                self._probe_started = now
+                return self.PROBE
+            return None
+
+    def allow_request(self) -> bool:
+        return self.acquire() is not None
+
+    def release_probe(self):
+        """Gives back a half-open probe slot that was granted but never used."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+
+class UpstreamClient:
+    """One shared requests.Session per upstream: bounded keep-alive pool, (connect, read) timeouts,
+    jittered retries under a RetryBudget and a CircuitBreaker that fails fast while the upstream is down.
+
+    Calls never outlive the caller's deadline: each attempt's timeouts are cut to the time left and
+    no retry starts unless at least `min_attempt_seconds` remain after the backoff. Read timeouts are
+    not retried unless retry_read_timeouts is set (a slow upstream is usually still slow a moment
+    later). max_concurrency is a bulkhead: calls beyond it wait at most `bulkhead_wait_seconds` for
+    a slot and then fail fast, so one slow upstream can't occupy every shared tool worker (async
+    callers hold no thread, so they wait up to their deadline instead).
+
+    get_async() is the same call for the ASGI app on a pooled httpx.AsyncClient. Both share the
+    breaker, retry budget and counters, and raise the same requests exception types.
+    """
+
+    RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+    def __init__(self, name: str, pool_maxsize: int = 20, connect_timeout: float = 3.05,
+                 read_timeout: float = 5.0, max_retries: int = 2, backoff_base: float = 0.1,
+                 backoff_cap: float = 1.0, retry_budget: RetryBudget = None, breaker: CircuitBreaker = None,
+                 retry_read_timeouts: bool = False, min_attempt_seconds: float = 0.5, max_concurrency: int = 0,
+                 bulkhead_wait_seconds: float = 0.5):
+        self.name = name
+        self.pool_maxsize = pool_maxsize
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.retry_budget = retry_budget or RetryBudget()
+        self.breaker = breaker or CircuitBreaker()
+        self.retry_read_timeouts = retry_read_timeouts
+        self.min_attempt_seconds = min_attempt_seconds
+        self.max_concurrency = max_concurrency
+        self.bulkhead_wait_seconds = bulkhead_wait_seconds
+        self._slots = threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+        self._async_slots = None   # asyncio.Semaphore, created on first get_async()
+        self._async_session = None # httpx.AsyncClient, created on first get_async() (inside the event loop)
+        self.session = requests.Session()
+        # Retries are handled below (with budget and breaker), so the adapter itself never retries
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.requests_total = 0
+        self.retries_total = 0
+        self.failures_total = 0
+        self.short_circuited_total = 0
+        self.bulkhead_rejected_total = 0
+        self.deadline_exceeded_total = 0
+
+    # --- Shared call policy (sync and async) ---
+    def _admit_call(self, deadline):
+        """Fails fast while the circuit is open; returns (effective deadline, whether this call is the half-open probe).
+
+        From here on every path must settle the breaker: record an outcome or, for a probe that
+        never reached the upstream, release it (see _abandon).
+        """
+        if deadline is None:
+            deadline = _current_deadline.get()
+        grant = self.breaker.acquire()
+        if grant is None:
+            self.short_circuited_total += 1
+            _record_outcome("rejected")
+            raise CircuitOpenError(f"{self.name} is unavailable (circuit open); failing fast.")
+        return deadline, grant == CircuitBreaker.PROBE
+
+    def _abandon(self, probe: bool):
+        """The call ends without an upstream outcome (rejected, cancelled): hand back the probe if it held it."""
+        if probe:
+            self.breaker.release_probe()
+
+    def _settle_unexpected(self, error: BaseException, probe: bool):
+        """An attempt raised something other than a connection error or timeout (bad chunking or
+        encoding, invalid URL, ...): an upstream failure; cancellation and interrupts only abandon the call."""
+        if isinstance(error, Exception):
+            self.breaker.record_failure()
+            self.failures_total += 1
+            _record_outcome("transport_error")
+        else:
+            self._abandon(probe)
+
+    def _bulkhead_wait(self, deadline, limit: float) -> float:
+        if deadline is None:
+            return limit
+        return min(limit, max(0.0, deadline - time.monotonic()))
+
+    def _bulkhead_rejected(self, probe: bool):
+        self.bulkhead_rejected_total += 1
+        self._abandon(probe)
+        _record_outcome("rejected")
+        return BulkheadFullError(f"{self.name} is overloaded ({self.max_concurrency} calls in flight); failing fast.")
+
+    def _check_deadline(self, deadline, probe: bool):
+        if deadline is not None and deadline - time.monotonic() <= 0:
+            self.deadline_exceeded_total += 1
+            self._abandon(probe)
+            _record_outcome("timeout")
+            raise DeadlineExceededError(f"{self.name}: the caller's deadline passed before the request was sent.")
+        self.requests_total += 1
+        self.retry_budget.record_request()
+
+    def _attempt_timeout(self, deadline):
+        """(connect, read) timeouts for one attempt, cut to the time left before the deadline."""
+        if deadline is None:
+            return self.timeout
+        remaining = deadline - time.monotonic()
+        return (min(self.timeout[0], remaining), min(self.timeout[1], remaining))
+
+    def _succeeded(self, error, response) -> bool:
+        if error is None and response.status_code not in self.RETRYABLE_STATUS:
+            self.breaker.record_success()
+            return True
+        return False
+
+    def _retry_backoff(self, attempt: int, error, response, deadline):
+        """Seconds to sleep before the next attempt, or None when this failure is final."""
+        backoff = random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** (attempt + 1)))) # full jitter
+        retryable = self.retry_read_timeouts or not isinstance(error, requests.exceptions.ReadTimeout)
+        no_time_left = deadline is not None and deadline - time.monotonic() < backoff + self.min_attempt_seconds
+        if not retryable or no_time_left or attempt >= self.max_retries or not self.retry_budget.try_spend():
+            # 429 means "slow down", not "down", so it doesn't count against the breaker
+            if error is not None or response.status_code != 429:
+                self.breaker.record_failure()
+                self.failures_total += 1
+            else:
+                self.breaker.record_success()
+            return None
+        self.retries_total += 1
+        return backoff
+    # --- End Shared call policy ---
+
+    def get(self, url: str, params: dict = None, deadline: float = None) -> requests.Response:
+        """GETs url. Returns the final response (including 4xx); raises requests exceptions,
+        CircuitOpenError or BulkheadFullError.
+
+        deadline is an absolute time.monotonic() value; it defaults to the enclosing deadline_scope().
+        The outcome is reported to the enclosing outcome_scope(), if any.
+        """
+        deadline, probe = self._admit_call(deadline)
+        if self._slots is not None and not self._slots.acquire(timeout=self._bulkhead_wait(deadline, self.bulkhead_wait_seconds)):
+            raise self._bulkhead_rejected(probe)
+        try:
+            self._check_deadline(deadline, probe)
+            attempt = 0
+            while True:
+                error, response = None, None
+                try:
+                    response = self.session.get(url, params=params, timeout=self._attempt_timeout(deadline))
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                    error = e
+                except BaseException as e:
+                    self._settle_unexpected(e, probe)
+                    raise
+                _record_outcome(_attempt_outcome(error, response))
+                if self._succeeded(error, response):
+                    return response
+                backoff = self._retry_backoff(attempt, error, response, deadline)
+                if backoff is None:
+                    if error is not None:
+                        raise error
+                    return response
+                attempt += 1
+                try:
+                    time.sleep(backoff)
+                except BaseException:
+                    self._abandon(probe)
+                    raise
+        finally:
+            if self._slots is not None:
+                self._slots.release()
+
+    async def get_async(self, url: str, params: dict = None, deadline: float = None) -> httpx.Response:
+        """Async get(): same retries, deadline, breaker and bulkhead, without holding a thread."""
+        deadline, probe = self._admit_call(deadline)
+        if self._async_session is None:
+            limits = httpx.Limits(max_connections=self.pool_maxsize, max_keepalive_connections=self.pool_maxsize)
+            self._async_session = httpx.AsyncClient(limits=limits)
+            if self.max_concurrency:
+                self._async_slots = asyncio.Semaphore(self.max_concurrency)
+        if self._async_slots is not None:
+            try:
+                # A waiting coroutine holds no thread, so it may wait for a slot until its deadline
+                await asyncio.wait_for(self._async_slots.acquire(), timeout=self._bulkhead_wait(deadline, math.inf))
+            except asyncio.TimeoutError:
+                raise self._bulkhead_rejected(probe) from None
+            except BaseException: # cancelled while waiting for a slot
+                self._abandon(probe)
+                raise
+        try:
+            self._check_deadline(deadline, probe)
+            attempt = 0
+            while True:
+                error, response = None, None
+                connect_timeout, read_timeout = self._attempt_timeout(deadline)
+                try:
+                    response = await self._async_session.get(
+                        url, params=params, timeout=httpx.Timeout(read_timeout, connect=connect_timeout, pool=connect_timeout)
+                    )
+                except httpx.TransportError as e:
+                    error = _as_requests_error(e)
+                except BaseException as e:
+                    self._settle_unexpected(e, probe)
+                    raise
+                _record_outcome(_attempt_outcome(error, response))
+                if self._succeeded(error, response):
+                    return response
+                backoff = self._retry_backoff(attempt, error, response, deadline)
+                if backoff is None:
+                    if error is not None:
+                        raise error
+                    return response
+                attempt += 1
+                try:
+                    await asyncio.sleep(backoff)
+                except BaseException:
+                    self._abandon(probe)
+                    raise
+        finally:
+            if self._async_slots is not None:
+                self._async_slots.release()
+
+    async def aclose(self):
+        if self._async_session is not None:
+            await self._async_session.aclose()
+            self._async_session = None
+
+    def stats(self) -> dict:
+        return {
+            "circuit_state": self.breaker.state,
+            "requests": self.requests_total,
+            "retries": self.retries_total,
+            "failures": self.failures_total,
+            "short_circuited": self.short_circuited_total,
+            "bulkhead_rejected": self.bulkhead_rejected_total,
+            "deadline_exceeded": self.deadline_exceeded_total,
+            "retry_budget_tokens": round(self.retry_budget.tokens, 2)
+        }
+
+
+def _as_requests_error(error: httpx.TransportError) -> requests.exceptions.RequestException:
+    """httpx transport errors as the requests exceptions the tool helpers already handle."""
+    if isinstance(error, httpx.ConnectTimeout):
+        converted = requests.exceptions.ConnectTimeout(str(error))
+    elif isinstance(error, httpx.TimeoutException):
+        converted = requests.exceptions.ReadTimeout(str(error))
+    else:
+        converted = requests.exceptions.ConnectionError(str(error))
+    converted.__cause__ = error
+    return converted
+
+def raise_for_status(response):
+    """response.raise_for_status() for requests or httpx responses, always raising requests.HTTPError."""
+    if response.status_code >= 400:
+        raise requests.exceptions.HTTPError(f"{response.status_code} error for {response.url}", response=response)
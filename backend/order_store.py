@@ -0,0 +1,246 @@
+# backend/order_store.py - Indexed SQLite order store behind get_order_info (pooled reads, streaming bulk load)
+#
+# Bulk load (from backend/):  python order_store.py load orders.csv --batch-size 20000
+#                             python order_store.py load orders.jsonl.gz --format jsonl
+# Point lookup:               python order_store.py get A10023
+import argparse
+import csv
+import gzip
+import io
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "orders.sqlite3")
+
+ORDER_FIELDS = (
+    "order_id", "customer_id", "status", "total", "currency", "items", "created_at", "updated_at",
+    "carrier", "tracking_number", "estimated_delivery", "email"
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    order_id TEXT PRIMARY KEY COLLATE NOCASE,
+    customer_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    total REAL,
+    currency TEXT,
+    items TEXT,
+    created_at TEXT,
+    updated_at TEXT,
+    carrier TEXT,
+    tracking_number TEXT,
+    estimated_delivery TEXT,
+    email TEXT
+) WITHOUT ROWID;
+"""
+_CUSTOMER_INDEX = "CREATE INDEX IF NOT EXISTS orders_customer ON orders (customer_id, created_at DESC)"
+
+# Fixed SQL text, so each connection's statement cache keeps these prepared
+_SELECT_COLUMNS = ", ".join(ORDER_FIELDS)
+_GET_ORDER = f"SELECT {_SELECT_COLUMNS} FROM orders WHERE order_id = ?"
+_CUSTOMER_ORDERS = f"SELECT {_SELECT_COLUMNS} FROM orders WHERE customer_id = ? ORDER BY created_at DESC LIMIT ?"
+_UPSERT_ORDER = (
+    f"INSERT OR REPLACE INTO orders ({_SELECT_COLUMNS}) VALUES ({', '.join('?' for _ in ORDER_FIELDS)})"
+)
+
+
+def _row_to_order(row) -> dict:
+    order = dict(zip(ORDER_FIELDS, row))
+    if order["items"]:
+        try:
+            order["items"] = json.loads(order["items"])
+        except ValueError:
+            pass # plain-text item lists from CSV dumps stay as they are
+    return order
+
+def _record_to_row(record: dict):
+    """Bulk-load record (CSV row or JSON object) -> tuple in ORDER_FIELDS order, or None if unusable."""
+    order_id = str(record.get("order_id") or "").strip()
+    customer_id = str(record.get("customer_id") or "").strip()
+    status = str(record.get("status") or "").strip()
+    if not order_id or not customer_id or not status:
+        return None
+    items = record.get("items")
+    if items is not None and not isinstance(items, str):
+        items = json.dumps(items)
+    try:
+        total = float(record["total"]) if record.get("total") not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+    row = [order_id, customer_id, status, total, record.get("currency") or None, items or None]
+    row += [str(record[field]) if record.get(field) not in (None, "") else None for field in ORDER_FIELDS[6:]]
+    return tuple(row)
+
+
+class OrderStore:
+    """Orders keyed by order id (case-insensitive) with a secondary index on customer id.
+
+    Each thread keeps its own connection (SQLite connections aren't shareable across threads), and
+    each connection caches its prepared statements. WAL mode lets lookups keep running while a bulk
+    load is writing.
+    """
+
+    def __init__(self, path: str = DEFAULT_DB_PATH, cache_size_kib: int = 65536, mmap_size: int = 256 * 1024 * 1024):
+        self.path = path
+        self.cache_size_kib = cache_size_kib
+        self.mmap_size = mmap_size
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        conn = self._conn()
+        conn.execute(_SCHEMA)
+        if "email" not in {row[1] for row in conn.execute("PRAGMA table_info(orders)")}:
+            conn.execute("ALTER TABLE orders ADD COLUMN email TEXT") # stores created before the column existed
+        conn.execute(_CUSTOMER_INDEX)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, cached_statements=64, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA cache_size=-{int(self.cache_size_kib)}")
+            conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def get(self, order_id):
+        """Returns the order as a dict (items decoded from JSON when possible), or None."""
+        if order_id is None:
+            return None
+        row = self._conn().execute(_GET_ORDER, (str(order_id).strip(),)).fetchone()
+        return _row_to_order(row) if row else None
+
+    def for_customer(self, customer_id, limit: int = 10) -> list:
+        """Most recent orders of one customer, newest first."""
+        rows = self._conn().execute(_CUSTOMER_ORDERS, (str(customer_id).strip(), limit)).fetchall()
+        return [_row_to_order(row) for row in rows]
+
+    def bulk_load(self, records, batch_size: int = 10000, defer_index: bool = False, progress=None) -> dict:
+        """Streams records (any iterable of dicts) into the table in batched transactions.
+
+        Memory stays at one batch regardless of input size. defer_index drops the customer index
+        for the load and rebuilds it once at the end, which is much faster for initial imports of
+        millions of rows; lookups by customer are unavailable until then.
+        """
+        conn = self._conn()
+        counts = {"loaded": 0, "skipped": 0, "batches": 0}
+        started = time.perf_counter()
+        if defer_index:
+            conn.execute("DROP INDEX IF EXISTS orders_customer")
+        try:
+            batch = []
+            for record in records:
+                row = _record_to_row(record)
+                if row is None:
+                    counts["skipped"] += 1
+                    continue
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    self._write_batch(conn, batch, counts, progress)
+                    batch = []
+            if batch:
+                self._write_batch(conn, batch, counts, progress)
+        finally:
+            if defer_index:
+                conn.execute(_CUSTOMER_INDEX)
+        conn.execute("PRAGMA optimize")
+        counts["seconds"] = round(time.perf_counter() - started, 2)
+        return counts
+
+    @staticmethod
+    def _write_batch(conn, batch: list, counts: dict, progress):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(_UPSERT_ORDER, batch)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        counts["loaded"] += len(batch)
+        counts["batches"] += 1
+        if progress:
+            progress(counts)
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+
+    def close(self):
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+
+# --- Bulk Load Input ---
+def _open_text(path: str):
+    if path == "-":
+        return io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8", newline="")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, encoding="utf-8", newline="")
+
+def iter_order_records(path: str, fmt: str = None):
+    """Yields one dict per order from a CSV (header row) or JSON Lines file, optionally gzipped; '-' is stdin."""
+    fmt = fmt or ("jsonl" if ".jsonl" in path or ".ndjson" in path else "csv")
+    with _open_text(path) as f:
+        if fmt == "csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        yield {} # counted as skipped
+# --- End Bulk Load Input ---
+
+
+def order_store_from_env() -> OrderStore:
+    """ORDER_DB_PATH (default data/orders.sqlite3)."""
+    return OrderStore(os.getenv("ORDER_DB_PATH", DEFAULT_DB_PATH))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Order store: bulk-load order dumps and look up orders.")
+    parser.add_argument("--db", default=os.getenv("ORDER_DB_PATH", DEFAULT_DB_PATH))
+    commands = parser.add_subparsers(dest="command", required=True)
+    load = commands.add_parser("load", help="stream a CSV/JSONL dump (optionally .gz, '-' for stdin) into the store")
+    load.add_argument("path")
+    load.add_argument("--format", choices=("csv", "jsonl"))
+    load.add_argument("--batch-size", type=int, default=10000)
+    load.add_argument("--defer-index", action="store_true", help="rebuild the customer index after loading (fast initial import)")
+    get = commands.add_parser("get", help="print one order as JSON")
+    get.add_argument("order_id")
+    customer = commands.add_parser("customer", help="print a customer's most recent orders as JSON")
+    customer.add_argument("customer_id")
+    customer.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    store = OrderStore(args.db)
+    if args.command == "load":
+        def report(counts):
+            print(f"\r{counts['loaded']:,} rows loaded ({counts['batches']} batches)", end="", file=sys.stderr, flush=True)
+        counts = store.bulk_load(iter_order_records(args.path, args.format), args.batch_size, args.defer_index, report)
+        print(file=sys.stderr)
+        print(json.dumps(counts))
+    elif args.command == "get":
+        order = store.get(args.order_id)
+        print(json.dumps(order, indent=2) if order else f"Order '{args.order_id}' not found.")
+        return 0 if order else 1
+    else:
+        print(json.dumps(store.for_customer(args.customer_id, args.limit), indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
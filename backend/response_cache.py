@@ -0,0 +1,206 @@
+# backend/response_cache.py - Cache of final answers for repeated non-tool queries
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+_NON_WORD = re.compile(r"[^\w\s]")
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace, so 'Hi!' and 'hi' share an entry."""
+    return " ".join(_NON_WORD.sub(" ", str(query).lower()).split())
+
+
+# --- Storage Backends ---
+class MemoryBackend:
+    """In-process LRU (default). Entries: key -> (expires_at, value)."""
+
+    def __init__(self, max_entries: int = 5000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value: dict, ttl_seconds: float):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """File-backed store that several worker processes can share (SQLite in WAL mode)."""
+
+    def __init__(self, path: str, max_entries: int = 50000):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        conn = self._conn()
+        row = conn.execute("SELECT value, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if row[1] <= now:
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            return None
+        conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def set(self, key, value: dict, ttl_seconds: float):
+        conn = self._conn()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO responses (key, value, expires_at, last_used) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value), now + ttl_seconds, now)
+        )
+        self._writes += 1
+        if self._writes % 100 == 0:
+            # Periodic size bound: drop expired rows, then the least recently used overflow
+            conn.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+            conn.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+# --- End Storage Backends ---
+
+
+class ResponseCache:
+    """Maps (normalized query, model, version of the tools and knowledge base) to a final answer.
+
+    With near_duplicate_threshold set (e.g. 0.85), an exact miss falls back to the most similar
+    recently cached query in this process by word-set Jaccard similarity.
+    """
+
+    def __init__(self, backend, ttl_seconds: float = 3600, near_duplicate_threshold: float = 0.0,
+                 near_duplicate_candidates: int = 2000):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.near_duplicate_threshold = near_duplicate_threshold
+        self.near_duplicate_candidates = near_duplicate_candidates
+        self._recent = OrderedDict() # (model, tools_version, normalized query) -> word set
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.saved_ms_total = 0.0
+
+    @staticmethod
+    def _key(normalized: str, model: str, tools_version: str) -> str:
+        return hashlib.sha256(f"{model}\x00{tools_version}\x00{normalized}".encode()).hexdigest()
+
+    def _nearest(self, normalized: str, model: str, tools_version: str):
+        words = set(normalized.split())
+        best, best_score = None, 0.0
+        with self._lock:
+            candidates = list(self._recent.items())
+        for (cand_model, cand_tools, cand_query), cand_words in candidates:
+            if cand_model != model or cand_tools != tools_version or not words:
+                continue
+            score = len(words & cand_words) / len(words | cand_words)
+            if score > best_score:
+                best, best_score = cand_query, score
+        return best if best_score >= self.near_duplicate_threshold else None
+
+    def get(self, query: str, model: str, tools_version: str):
+        """Returns the cached answer text, or None."""
+        normalized = normalize_query(query)
+        entry = self.backend.get(self._key(normalized, model, tools_version))
+        near = False
+        if entry is None and self.near_duplicate_threshold > 0:
+            nearest = self._nearest(normalized, model, tools_version)
+            if nearest is not None:
+                entry = self.backend.get(self._key(nearest, model, tools_version))
+                near = entry is not None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.near_hits += near
+            self.saved_ms_total += entry.get("latency_ms", 0.0)
+        return entry["response"]
+
+    def put(self, query: str, model: str, tools_version: str, response_text: str, latency_ms: float):
+        normalized = normalize_query(query)
+        if not normalized:
+            return
+        self.backend.set(self._key(normalized, model, tools_version),
+                         {"response": response_text, "latency_ms": latency_ms}, self.ttl_seconds)
+        with self._lock:
+            self.stores += 1
+            if self.near_duplicate_threshold > 0:
+                self._recent[(model, tools_version, normalized)] = set(normalized.split())
+                self._recent.move_to_end((model, tools_version, normalized))
+                while len(self._recent) > self.near_duplicate_candidates:
+                    self._recent.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": type(self.backend).__name__,
+                "entries": len(self.backend),
+                "hits": self.hits,
+                "near_duplicate_hits": self.near_hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "saved_latency_ms_total": round(self.saved_ms_total, 1),
+                "saved_latency_ms_avg": round(self.saved_ms_total / self.hits, 1) if self.hits else 0.0
+            }
+
+
+def response_cache_from_env() -> ResponseCache:
+    """RESPONSE_CACHE_BACKEND=memory (default) or sqlite (RESPONSE_CACHE_PATH, shared across workers)."""
+    max_entries = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "5000"))
+    if os.getenv("RESPONSE_CACHE_BACKEND", "memory") == "sqlite":
+        default_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "response_cache.sqlite3")
+        backend = SQLiteBackend(os.getenv("RESPONSE_CACHE_PATH", default_path), max_entries=max_entries)
+    else:
+        backend = MemoryBackend(max_entries=max_entries)
+    return ResponseCache(
+        backend,
+        ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600")),
+        near_duplicate_threshold=float(os.getenv("RESPONSE_CACHE_NEAR_DUPLICATE_THRESHOLD", "0"))
+    )
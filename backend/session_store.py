@@ -0,0 +1,168 @@
+# backend/session_store.py - Server-side conversation memory with token-budgeted history compaction
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+def estimate_tokens(message: dict) -> int:
+    """Rough token count (~4 characters per token plus per-message overhead); cheap enough for every request."""
+    size = len(message.get("content") or "")
+    for tool_call in message.get("tool_calls") or []:
+        size += len(tool_call["function"]["name"]) + len(tool_call["function"]["arguments"] or "")
+    return size // 4 + 4
+
+def compact_message(message) -> dict:
+    """Plain-dict copy of a chat message with only the fields needed to replay it to the API."""
+    if not isinstance(message, dict):
+        message = message.model_dump(exclude_none=True) # openai ChatCompletionMessage
+    compact = {"role": message["role"], "content": message.get("content")}
+    if message.get("tool_calls"):
+        compact["tool_calls"] = [
+            {"id": tc["id"], "type": "function", "function": {"name": tc["function"]["name"], "arguments": tc["function"]["arguments"]}}
+            for tc in message["tool_calls"]
+        ]
+    if message["role"] == "tool":
+        compact["tool_call_id"] = message["tool_call_id"]
+        compact["name"] = message.get("name")
+    return compact
+
+def extractive_summary(previous_summary: str, turn: list, max_chars: int = 2000) -> str:
+    """Default summarizer: folds one trimmed turn into the rolling summary as short lines.
+
+    Only the new turn is processed, never the whole history; the oldest lines fall off once
+    the summary exceeds max_chars.
+    """
+    lines = previous_summary.splitlines() if previous_summary else []
+    for message in turn:
+        content = " ".join((message.get("content") or "").split())
+        if message["role"] == "user":
+            lines.append(f"User: {content[:200]}")
+        elif message["role"] == "tool":
+            lines.append(f"Tool {message.get('name')}: {content[:120]}")
+        elif content:
+            lines.append(f"Assistant: {content[:200]}")
+    while lines and sum(len(line) + 1 for line in lines) > max_chars:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+class _Session:
+    __slots__ = ("summary", "turns", "turn_tokens", "size_bytes", "last_access")
+
+    def __init__(self):
+        self.summary = ""
+        self.turns = []       # each turn: [user, assistant(tool_calls), tool..., assistant] - trimmed as a unit
+        self.turn_tokens = []
+        self.size_bytes = 0
+        self.last_access = time.monotonic()
+
+
+class SessionStore:
+    """Conversation history keyed by session id.
+
+    Sessions are evicted after `idle_ttl_seconds` without use, and least-recently-used sessions are
+    evicted when there are more than `max_sessions` or the stored messages exceed `max_total_bytes`.
+    history() trims the oldest whole turns until the prompt fits `token_budget`, folding each trimmed
+    turn into the session's rolling summary, so assistant tool_calls always stay with their tool results.
+    The summary is capped at about a third of the budget so it can't crowd out recent turns.
+    """
+
+    def __init__(self, max_sessions: int = 10000, idle_ttl_seconds: float = 1800, max_total_bytes: int = 64 * 1024 * 1024,
+                 token_budget: int = 3000, summarizer=extractive_summary):
+        self.max_sessions = max_sessions
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.max_total_bytes = max_total_bytes
+        self.token_budget = token_budget
+        self.summarizer = summarizer
+        self.summary_max_chars = token_budget * 4 // 3
+        self._sessions = OrderedDict() # least recently used first
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.turns_compacted = 0
+
+    def _evict_locked(self):
+        now = time.monotonic()
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            over_limits = len(self._sessions) > self.max_sessions or self._total_bytes > self.max_total_bytes
+            if not over_limits and now - session.last_access < self.idle_ttl_seconds:
+                break
+            del self._sessions[session_id]
+            self._total_bytes -= session.size_bytes
+            self.evictions += 1
+
+    def _touch_locked(self, session_id, create: bool):
+        session = self._sessions.get(session_id)
+        if session is None:
+            if not create:
+                return None
+            session = self._sessions[session_id] = _Session()
+        session.last_access = time.monotonic()
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def history(self, session_id, reserve_tokens: int = 0) -> list:
+        """Messages to prepend to a new turn: a summary system message (if any) plus the retained turns.
+
+        reserve_tokens is what the caller still adds (the new query, retrieved context).
+        """
+        with self._lock:
+            self._evict_locked()
+            session = self._touch_locked(session_id, create=False)
+            if session is None:
+                return []
+            summary_tokens = len(session.summary) // 4 + 4 if session.summary else 0
+            while session.turns and summary_tokens + sum(session.turn_tokens) + reserve_tokens > self.token_budget:
+                turn = session.turns.pop(0)
+                session.turn_tokens.pop(0)
+                turn_bytes = len(json.dumps(turn))
+                session.size_bytes -= turn_bytes
+                self._total_bytes -= turn_bytes
+                old_summary_bytes = len(session.summary)
+                session.summary = self.summarizer(session.summary, turn, self.summary_max_chars)
+                session.size_bytes += len(session.summary) - old_summary_bytes
+                self._total_bytes += len(session.summary) - old_summary_bytes
+                summary_tokens = len(session.summary) // 4 + 4
+                self.turns_compacted += 1
+
+            messages = []
+            if session.summary:
+                messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{session.summary}"})
+            for turn in session.turns:
+                messages.extend(dict(message) for message in turn)
+            return messages
+
+    def has_history(self, session_id) -> bool:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            return bool(session and (session.turns or session.summary))
+
+    def record_turn(self, session_id, turn_messages: list):
+        """Stores one completed turn (user message through final assistant message)."""
+        turn = [compact_message(message) for message in turn_messages]
+        turn_bytes = len(json.dumps(turn))
+        with self._lock:
+            session = self._touch_locked(session_id, create=True)
+            session.turns.append(turn)
+            session.turn_tokens.append(sum(estimate_tokens(message) for message in turn))
+            session.size_bytes += turn_bytes
+            self._total_bytes += turn_bytes
+            self._evict_locked()
+
+    def clear(self, session_id):
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is not None:
+                self._total_bytes -= session.size_bytes
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "total_bytes": self._total_bytes,
+                "max_total_bytes": self.max_total_bytes,
+                "evictions": self.evictions,
+                "turns_compacted": self.turns_compacted
+            }
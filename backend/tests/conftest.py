@@ -0,0 +1,45 @@
+# backend/tests/conftest.py - Shared fixtures; run with `python -m pytest backend/tests` from the repo root
+import os
+import sys
+import tempfile
+import time
+
+import pytest
+
+# The backend modules import each other by flat name (they are run from backend/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Set before any test imports app.py: the example knowledge base, offline embeddings, throwaway stores,
+# and an OpenAI endpoint that refuses connections (tests swap in fake clients; nothing may reach the real API)
+_TEST_DATA_DIR = tempfile.mkdtemp(prefix="chatbot-tests-")
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ.update({
+    "KNOWLEDGE_BASE_PATH": os.path.join(_BACKEND_DIR, "data", "knowledge_base.example.json"),
+    "EMBEDDING_PROVIDER": "hashing",
+    "RETRIEVAL_INDEX_DIR": _TEST_DATA_DIR,
+    "ORDER_DB_PATH": os.path.join(_TEST_DATA_DIR, "orders.sqlite3"),
+    "RESPONSE_CACHE_BACKEND": "memory",
+    "OPENAI_API_KEY": "test-key",
+    "OPENAI_BASE_URL": "http://127.0.0.1:9/v1",
+    "LOG_LEVEL": "CRITICAL",
+})
+
+
+class FakeClock:
+    """Stands in for time.monotonic so time-based state changes happen without sleeping."""
+
+    def __init__(self, start: float = 1000.0):
+        self.now = start
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(time, "monotonic", fake)
+    return fake
@@ -0,0 +1,68 @@
+# backend/tests/fake_openai.py - Scripted stand-in for the OpenAI chat completions client (sync and async)
+import json
+from types import SimpleNamespace
+
+
+def _step_for(script, kwargs, index):
+    """A script is a list of steps, or a function of the create() kwargs returning one.
+    A step is {"content": str} or {"tool_calls": [(id, name, arguments_dict), ...]}; an Exception is raised."""
+    step = script(kwargs) if callable(script) else script[index]
+    if isinstance(step, Exception):
+        raise step
+    return step
+
+
+def _message(step):
+    tool_calls = [
+        SimpleNamespace(id=call_id, type="function", function=SimpleNamespace(name=name, arguments=json.dumps(args)))
+        for call_id, name, args in step.get("tool_calls", ())
+    ] or None
+    message = SimpleNamespace(role="assistant", content=step.get("content"), tool_calls=tool_calls)
+    message.model_dump = lambda **_: {
+        "role": "assistant", "content": message.content,
+        "tool_calls": [
+            {"id": call.id, "type": "function", "function": {"name": call.function.name, "arguments": call.function.arguments}}
+            for call in tool_calls
+        ] if tool_calls else None
+    }
+    return message
+
+
+def _chunks(step):
+    def delta(**fields):
+        values = {"content": None, "tool_calls": None, **fields}
+        return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(**values))], usage=None)
+
+    for index, (call_id, name, args) in enumerate(step.get("tool_calls", ())):
+        function = SimpleNamespace(name=name, arguments=None)
+        yield delta(tool_calls=[SimpleNamespace(index=index, id=call_id, function=function)])
+        function = SimpleNamespace(name=None, arguments=json.dumps(args))
+        yield delta(tool_calls=[SimpleNamespace(index=index, id=None, function=function)])
+    if step.get("content"):
+        for word in step["content"].split(" "):
+            yield delta(content=word + " ")
+    yield SimpleNamespace(choices=[], usage=SimpleNamespace(total_tokens=step.get("total_tokens", 10)))
+
+
+class FakeCompletions:
+    def __init__(self, script):
+        self.script = script
+        self.calls = [] # kwargs of every create() call
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        step = _step_for(self.script, kwargs, len(self.calls) - 1)
+        if kwargs.get("stream"):
+            return _chunks(step)
+        return SimpleNamespace(choices=[SimpleNamespace(message=_message(step))],
+                               usage=SimpleNamespace(total_tokens=step.get("total_tokens", 10)))
+
+
+class AsyncFakeCompletions(FakeCompletions):
+    async def create(self, **kwargs):
+        return FakeCompletions.create(self, **kwargs)
+
+
+def fake_client(script, is_async: bool = False):
+    completions = (AsyncFakeCompletions if is_async else FakeCompletions)(script)
+    return SimpleNamespace(chat=SimpleNamespace(completions=completions))
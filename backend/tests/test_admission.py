@@ -0,0 +1,140 @@
+# backend/tests/test_admission.py - AdmissionController: quota reservations, settlement, shedding, upstream feedback
+import pytest
+
+from admission import AdmissionController, AdmissionRejected
+
+
+def test_unlimited_controller_admits_without_delay():
+    controller = AdmissionController()
+    with controller.admit("a", estimated_tokens=500, calls=2) as ticket:
+        assert ticket.delay == 0
+        assert controller.stats()["active_turns"] == 1
+    stats = controller.stats()
+    assert stats["active_turns"] == 0
+    assert stats["admitted"] == 1
+
+
+def test_tool_turn_reserves_two_requests_and_refunds_unused_one(clock):
+    controller = AdmissionController(requests_per_minute=60)
+    tickets = [controller.admit("a", 0, calls=2) for _ in range(30)]
+    assert controller.requests.level == 0
+    # The bucket is empty: the next two-call turn waits for two requests' worth of refill
+    assert controller.admit("b", 0, calls=2).delay == pytest.approx(2.0)
+
+    assert controller.requests.level == -2
+    tickets[0].refund_call()
+    tickets[0].refund_call()
+    tickets[0].refund_call() # nothing left to refund: it reserved two
+    assert tickets[0].reserved_calls == 0
+    assert controller.requests.level == 0
+    assert controller.stats()["refunded_calls"] == 2
+
+
+def test_refund_after_release_is_ignored(clock):
+    controller = AdmissionController(requests_per_minute=60)
+    ticket = controller.admit("a", 0, calls=2)
+    ticket.release()
+    ticket.refund_call()
+    assert controller.requests.level == 58
+    assert controller.stats()["refunded_calls"] == 0
+
+
+def test_release_settles_token_estimate_against_reported_usage(clock):
+    controller = AdmissionController(tokens_per_minute=1000)
+    ticket = controller.admit("a", estimated_tokens=500)
+    assert controller.tokens.level == 500
+    ticket.record_usage({"total_tokens": 60})
+    ticket.record_usage(type("Usage", (), {"total_tokens": 40})())
+    ticket.record_usage(None)
+    ticket.release()
+    assert controller.tokens.level == 900
+    assert controller.stats()["usage_tokens"] == 100
+
+
+def test_usage_beyond_the_estimate_is_charged(clock):
+    controller = AdmissionController(tokens_per_minute=1000)
+    ticket = controller.admit("a", estimated_tokens=100)
+    ticket.record_usage({"total_tokens": 400})
+    ticket.release()
+    assert controller.tokens.level == 600
+
+
+def test_release_without_usage_keeps_the_estimate(clock):
+    controller = AdmissionController(tokens_per_minute=1000)
+    controller.admit("a", estimated_tokens=300).release()
+    assert controller.tokens.level == 700
+
+
+def test_per_client_cap_rejects_with_429_until_a_turn_is_released():
+    controller = AdmissionController(per_client_concurrency=1)
+    first = controller.admit("a", 0)
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.admit("a", 0)
+    assert rejected.value.status == 429
+    assert rejected.value.reason == "client_limit"
+    controller.admit("b", 0).release() # other clients are unaffected
+    first.release()
+    controller.admit("a", 0).release()
+    assert controller.stats()["shed"]["client_limit"] == 1
+
+
+def test_turn_that_would_wait_too_long_is_shed_with_retry_after(clock):
+    controller = AdmissionController(requests_per_minute=60, max_wait_seconds=1.0)
+    controller.requests.level = 0
+    assert controller.admit("a", 0).delay == pytest.approx(1.0)
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.admit("a", 0)
+    assert rejected.value.status == 503
+    assert rejected.value.reason == "deadline"
+    assert rejected.value.retry_after == 2
+
+
+def test_full_queue_sheds_turns_that_would_wait(clock):
+    controller = AdmissionController(requests_per_minute=60, max_queue=1)
+    controller.requests.level = 0
+    waiting = controller.admit("a", 0)
+    assert controller.stats()["queue_depth"] == 1
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.admit("b", 0)
+    assert rejected.value.reason == "queue_full"
+    waiting.release() # released without waiting still leaves the queue
+    assert controller.stats()["queue_depth"] == 0
+
+
+def test_upstream_429_pauses_admissions_and_halves_the_rate(clock):
+    controller = AdmissionController(requests_per_minute=60, max_wait_seconds=10, recovery_step=0.25)
+    controller.observe_upstream(429, {"retry-after": "3"})
+    assert controller.rate_scale == 0.5
+    assert controller.admit("a", 0).delay == pytest.approx(3.0)
+    clock.advance(3)
+    controller.observe_upstream(200, {})
+    controller.observe_upstream(200, {})
+    assert controller.rate_scale == 1.0
+    assert controller.stats()["upstream_rate_limited"] == 1
+
+
+def test_upstream_429_without_retry_after_backs_off_exponentially(clock):
+    controller = AdmissionController()
+    controller.observe_upstream(429, {})
+    assert controller._backoff_until == clock.now + 1
+    controller.observe_upstream(429, {"retry-after-ms": "not a number"})
+    assert controller._backoff_until == clock.now + 2
+    controller.observe_upstream(200, {})
+    controller.observe_upstream(429, {})
+    assert controller._backoff_until == clock.now + 2 # the longer earlier pause still applies
+
+
+def test_rate_limit_headers_clamp_the_buckets(clock):
+    controller = AdmissionController(requests_per_minute=60, tokens_per_minute=1000)
+    controller.observe_upstream(200, {"x-ratelimit-remaining-requests": "5", "x-ratelimit-remaining-tokens": "bad"})
+    assert controller.requests.level == 5
+    assert controller.tokens.level == 1000
+
+
+def test_charge_takes_usage_outside_turns_from_both_buckets(clock):
+    controller = AdmissionController(requests_per_minute=60, tokens_per_minute=1000)
+    controller.charge(2, 300)
+    assert (controller.requests.level, controller.tokens.level) == (58, 700)
+    controller.charge(60, 0) # never sheds; the deficit delays the next turn instead
+    assert controller.admit("a", 0).delay == pytest.approx(3.0)
+    assert controller.stats()["charged_requests"] == 62
@@ -0,0 +1,85 @@
+# backend/tests/test_asgi_offload.py - The ASGI app keeps knowledge base work (local answers, retrieval, reloads) off the event loop
+import asyncio
+import json
+import shutil
+import threading
+import time
+
+import pytest
+
+import asgi_app
+import data_store
+from fake_openai import fake_client
+
+
+def record_thread(calls, name, result):
+    def run(*args):
+        calls[name] = threading.current_thread().name
+        return result(*args) if callable(result) else result
+    return run
+
+
+def test_local_answers_and_retrieval_run_on_their_own_pools(monkeypatch):
+    calls = {}
+    monkeypatch.setattr(asgi_app, "answer_locally", record_thread(calls, "local", None))
+    monkeypatch.setattr(asgi_app, "build_initial_messages", record_thread(
+        calls, "retrieval", lambda query, session_id: [{"role": "user", "content": query}]
+    ))
+    monkeypatch.setattr(asgi_app, "async_openai_client", fake_client([{"content": "Hello!"}], is_async=True))
+    asgi_app.response_cache.backend._entries.clear()
+
+    assert asyncio.run(asgi_app.chat_turn({"query": "say hello to the offload test"})) == ({"response": "Hello!"}, 200)
+    assert calls["local"].startswith("async-local")
+    assert calls["retrieval"].startswith("async-retrieval")
+
+
+def test_local_answer_does_not_block_the_event_loop(monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(asgi_app, "answer_locally", lambda query, session_id: release.wait(5) and "Slow local answer.")
+
+    async def scenario():
+        turn = asyncio.ensure_future(asgi_app.chat_turn({"query": "anything"}))
+        await asyncio.sleep(0.05) # the loop keeps running while the local answer is computed
+        assert not turn.done()
+        release.set()
+        return await turn
+
+    assert asyncio.run(scenario()) == ({"response": "Slow local answer."}, 200)
+
+
+def test_asgi_data_reload_runs_off_the_loop(monkeypatch):
+    calls = {}
+    counts = {"added": 0, "updated": 1, "removed": 0, "unchanged": 5}
+    monkeypatch.setattr(asgi_app, "reload_knowledge_base", record_thread(calls, "reload", lambda force: dict(counts, force=force)))
+
+    from test_chat_routes import call_asgi
+    status, _, payload = call_asgi("/data/reload", b"")
+    assert (status, json.loads(payload)) == (200, dict(counts, force=True))
+    assert calls["reload"].startswith("async-local")
+
+
+@pytest.fixture
+def kb_copy(tmp_path, monkeypatch):
+    path = tmp_path / "knowledge_base.json"
+    shutil.copy(data_store.KNOWLEDGE_BASE_PATH, path)
+    monkeypatch.setattr(data_store, "KNOWLEDGE_BASE_PATH", str(path))
+    monkeypatch.setattr(data_store, "RELOAD_CHECK_INTERVAL_SECONDS", 0.01)
+    yield path
+    data_store.stop_reload_watcher()
+    monkeypatch.undo()
+    data_store.reload_knowledge_base(force=True)
+
+
+def test_reload_watcher_picks_up_edits_so_requests_never_touch_the_file(kb_copy, monkeypatch):
+    monkeypatch.setattr(data_store, "_last_reload_check", 0.0)
+    data_store.start_reload_watcher()
+    data_store._maybe_reload()
+    assert data_store._last_reload_check == 0.0 # the request path no longer checks the file
+
+    data = json.loads(kb_copy.read_text())
+    data["faqs"].append({"id": "faq-watcher", "question": "Do you sell gift wrapping?", "answer": "Yes, for $3."})
+    kb_copy.write_text(json.dumps(data))
+    deadline = time.time() + 5
+    while data_store.get_faq_answer("Do you sell gift wrapping?") != "Yes, for $3.":
+        assert time.time() < deadline
+        time.sleep(0.01)
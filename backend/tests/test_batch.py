@@ -0,0 +1,115 @@
+# backend/tests/test_batch.py - /chat/batch items are isolated from each other and bounded in concurrency
+import asyncio
+import threading
+import time
+
+import pytest
+
+import app
+import asgi_app
+from fake_openai import fake_client
+
+
+def answer_or_fail(kwargs):
+    query = kwargs["messages"][-1]["content"]
+    if "explode" in query:
+        return RuntimeError("upstream exploded")
+    return {"content": f"ok: {query}"}
+
+
+def test_parse_batch_request_validates_and_caps(monkeypatch):
+    assert app.parse_batch_request({"queries": ["a", {"query": "b", "session_id": "s"}], "concurrency": 99}) == (
+        [{"query": "a"}, {"query": "b", "session_id": "s"}], app.BATCH_MAX_CONCURRENCY
+    )
+    assert app.parse_batch_request({"queries": ["a"], "concurrency": 0})[1] == app.BATCH_MAX_CONCURRENCY
+    with pytest.raises(ValueError, match="integer"):
+        app.parse_batch_request({"queries": ["a"], "concurrency": "many"})
+    monkeypatch.setattr(app, "BATCH_MAX_ITEMS", 2)
+    with pytest.raises(ValueError, match="At most 2"):
+        app.parse_batch_request({"queries": ["a", "b", "c"]})
+
+
+def test_a_failing_item_only_fails_itself(monkeypatch):
+    monkeypatch.setattr(app, "openai_client", fake_client(answer_or_fail))
+    items = [{"query": "batch isolation one"}, {"query": "batch isolation explode"}, {"query": 7}, {"query": "batch isolation two"}]
+    results = {index: (data, status) for index, data, status in app.iter_batch_results(items, 2)}
+    assert results[0] == ({"response": "ok: batch isolation one"}, 200)
+    assert results[1][1] == 500 and "upstream exploded" in results[1][0]["error"]
+    assert results[2] == ({"error": "'query' must be a string."}, 400)
+    assert results[3] == ({"response": "ok: batch isolation two"}, 200)
+
+
+def test_an_item_raising_outside_the_pipeline_is_contained(monkeypatch):
+    run_chat_turn = app.run_chat_turn
+    monkeypatch.setattr(app, "run_chat_turn", lambda item, client_id=None: 1 / 0 if item["query"] == "boom" else run_chat_turn(item, client_id))
+    results = sorted(app.iter_batch_results([{"query": "boom"}, {"query": "How long does shipping take?"}], 2))
+    assert results[0] == (0, {"error": "An unexpected internal error occurred."}, 500)
+    assert results[1][2] == 200
+
+
+def test_items_run_concurrently_up_to_the_limit_and_report_as_they_finish(monkeypatch):
+    in_flight, peak, lock = [0], [0], threading.Lock()
+
+    def slow_turn(item, client_id=None):
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(item["delay"])
+        with lock:
+            in_flight[0] -= 1
+        return {"response": item["query"]}, 200
+
+    monkeypatch.setattr(app, "run_chat_turn", slow_turn)
+    items = [{"query": "slow", "delay": 0.3}] + [{"query": f"fast {n}", "delay": 0.02} for n in range(5)]
+    order = [index for index, _, _ in app.iter_batch_results(items, 2)]
+    assert peak[0] == 2
+    assert order[-1] == 0 # the slow item doesn't hold back the lines of the others
+
+
+def test_closing_the_stream_cancels_items_not_yet_started(monkeypatch):
+    started = []
+
+    def turn(item, client_id=None):
+        started.append(item["query"])
+        time.sleep(0.05)
+        return {"response": "ok"}, 200
+
+    monkeypatch.setattr(app, "run_chat_turn", turn)
+    results = app.iter_batch_results([{"query": str(n)} for n in range(20)], 2)
+    next(results)
+    results.close() # e.g. the client disconnected
+    time.sleep(0.2)
+    assert len(started) <= 4
+
+
+def test_items_keep_their_own_sessions(monkeypatch):
+    # Counts the conversation messages sent to the model (retrieved context is a system message)
+    fake = fake_client(lambda kwargs: {"content": f"{sum(m['role'] != 'system' for m in kwargs['messages'])} messages"})
+    monkeypatch.setattr(app, "openai_client", fake)
+    items = [{"query": "batch session hello", "session_id": "batch-a"}, {"query": "batch session hello", "session_id": "batch-b"}]
+    list(app.iter_batch_results(items, 2))
+    results = dict((index, data) for index, data, _ in app.iter_batch_results(
+        [{"query": "batch session again", "session_id": "batch-a"}, {"query": "batch session fresh", "session_id": "batch-c"}], 2
+    ))
+    assert results == {0: {"response": "3 messages"}, 1: {"response": "1 messages"}} # a has one earlier turn, c has none
+
+
+def test_async_batch_isolates_failures_too(monkeypatch):
+    monkeypatch.setattr(asgi_app, "async_openai_client", fake_client(answer_or_fail, is_async=True))
+    chat_turn = asgi_app.chat_turn
+
+    async def turn(item, client_id=None):
+        if item.get("query") == "boom":
+            raise RuntimeError("outside the pipeline")
+        return await chat_turn(item, client_id)
+
+    monkeypatch.setattr(asgi_app, "chat_turn", turn)
+
+    async def collect():
+        items = [{"query": "async isolation one"}, {"query": "async isolation explode"}, {"query": "boom"}]
+        return {index: (data, status) for index, data, status in [result async for result in asgi_app.iter_batch_results_async(items, 2)]}
+
+    results = asyncio.run(collect())
+    assert results[0] == ({"response": "ok: async isolation one"}, 200)
+    assert results[1][1] == 500
+    assert results[2] == ({"error": "An unexpected internal error occurred."}, 500)
@@ -0,0 +1,156 @@
+# backend/tests/test_chat_routes.py - /chat, /chat/stream and /chat/batch request validation and response framing
+import asyncio
+import json
+import time
+
+import pytest
+
+import app
+import asgi_app
+from fake_openai import fake_client
+
+INVALID_BODIES = [
+    (b"{bad", "Request body must contain 'query'."),
+    (b"\xff\xfe", "Request body must contain 'query'."),
+    (b"[1, 2]", "Request body must contain 'query'."),
+    (b'{"q": "hi"}', "Request body must contain 'query'."),
+    (b'{"query": 5}', "'query' must be a string."),
+    (b'{"query": null}', "'query' must be a string."),
+]
+
+
+def call_asgi(path: str, body: bytes, method: str = "POST") -> tuple:
+    """Runs one request through the ASGI app; returns (status, headers dict, body bytes)."""
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "headers": [], "client": ("127.0.0.1", 50000)}
+    asyncio.run(asgi_app.app(scope, receive, send))
+    start = sent[0]
+    return start["status"], dict(start["headers"]), b"".join(message.get("body", b"") for message in sent[1:])
+
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+
+@pytest.mark.parametrize("route", ["/chat", "/chat/stream"])
+@pytest.mark.parametrize("body, error", INVALID_BODIES)
+def test_flask_chat_routes_reject_invalid_bodies_with_400(client, route, body, error):
+    response = client.post(route, data=body, content_type="application/json")
+    assert response.status_code == 400
+    assert response.get_json() == {"error": error}
+
+
+@pytest.mark.parametrize("body, error", INVALID_BODIES)
+def test_asgi_chat_rejects_invalid_bodies_with_400(body, error):
+    status, headers, payload = call_asgi("/chat", body)
+    assert status == 400
+    assert headers[b"content-type"] == b"application/json"
+    assert json.loads(payload) == {"error": error}
+
+
+@pytest.mark.parametrize("body", [b"{bad", b"{}", b'{"queries": []}'])
+def test_batch_routes_reject_invalid_bodies_with_400(client, body):
+    error = {"error": "Request body must contain a non-empty 'queries' array."}
+    response = client.post("/chat/batch", data=body, content_type="application/json")
+    assert (response.status_code, response.get_json()) == (400, error)
+    status, _, payload = call_asgi("/chat/batch", body)
+    assert (status, json.loads(payload)) == (400, error)
+
+
+def parse_sse(body: str) -> list:
+    """[(event, payload), ...] from a text/event-stream body; every frame ends with a blank line."""
+    assert body.endswith("\n\n")
+    events = []
+    for frame in body[:-2].split("\n\n"):
+        event_line, data_line = frame.split("\n")
+        assert event_line.startswith("event: ") and data_line.startswith("data: ")
+        events.append((event_line[len("event: "):], json.loads(data_line[len("data: "):])))
+    return events
+
+
+@pytest.fixture
+def fresh_cache():
+    app.response_cache.backend._entries.clear()
+
+
+def test_stream_frames_tokens_tool_progress_and_done(client, monkeypatch, fresh_cache):
+    fake = fake_client([
+        {"tool_calls": [("call_1", "get_current_weather", {"location": "Paris"})]},
+        {"content": "Weather is unavailable right now."},
+    ])
+    monkeypatch.setattr(app, "openai_client", fake)
+    response = client.post("/chat/stream", json={"query": "stream framing: weather in Paris?"})
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+
+    events = parse_sse(response.get_data(as_text=True))
+    assert [event for event, _ in events] == ["tool_call", "tool_call"] + ["token"] * 5 + ["done"]
+    assert events[0][1] == {"id": "call_1", "name": "get_current_weather", "status": "started"}
+    assert events[1][1]["status"] == "finished" and events[1][1]["elapsed_ms"] >= 0
+    done = events[-1][1]
+    assert done["response"] == "".join(payload["delta"] for event, payload in events if event == "token")
+    assert done["tool_calls"] == 1
+    assert 0 <= done["ttft_ms"] <= done["total_ms"]
+    assert fake.chat.completions.calls[0]["stream"] and "tools" not in fake.chat.completions.calls[1]
+
+
+def test_stream_local_answer_is_one_token_then_done(client):
+    events = parse_sse(client.post("/chat/stream", json={"query": "How long does shipping take?"}).get_data(as_text=True))
+    assert [event for event, _ in events] == ["token", "done"]
+    assert events[1][1]["response"] == events[0][1]["delta"]
+
+
+def test_stream_timings_include_the_admission_wait(client, monkeypatch, fresh_cache):
+    monkeypatch.setattr(app, "openai_client", fake_client([{"content": "Hi there."}]))
+    admit_turn = app.admit_turn
+
+    def slow_admission(*args):
+        ticket = admit_turn(*args)
+        wait = ticket.wait
+        ticket.wait = lambda: (time.sleep(0.2), wait())
+        return ticket
+
+    monkeypatch.setattr(app, "admit_turn", slow_admission)
+    events = parse_sse(client.post("/chat/stream", json={"query": "stream timing: say hi"}).get_data(as_text=True))
+    done = events[-1][1]
+    assert done["ttft_ms"] >= 200 and done["total_ms"] >= 200
+
+
+def parse_ndjson(body: bytes) -> list:
+    assert body.endswith(b"\n")
+    return [json.loads(line) for line in body.decode().split("\n")[:-1]]
+
+
+def test_batch_streams_one_line_per_item_then_a_summary(client, monkeypatch, fresh_cache):
+    monkeypatch.setattr(app, "openai_client", fake_client(lambda kwargs: {"content": "echo " + kwargs["messages"][-1]["content"]}))
+    body = {"queries": ["batch framing one", {"query": "batch framing two"}, {"q": "missing"}], "concurrency": 2}
+
+    response = client.post("/chat/batch", json=body)
+    assert response.mimetype == "application/x-ndjson"
+    lines = parse_ndjson(response.get_data())
+    assert lines[-1]["done"] is True
+    assert (lines[-1]["items"], lines[-1]["errors"]) == (3, 1)
+    assert sorted(line["index"] for line in lines[:-1]) == [0, 1, 2]
+    by_index = {line["index"]: line for line in lines[:-1]}
+    assert by_index[0] == {"index": 0, "status": 200, "response": "echo batch framing one"}
+    assert by_index[2] == {"index": 2, "status": 400, "error": "Request body must contain 'query'."}
+
+
+def test_asgi_batch_uses_the_same_framing(monkeypatch, fresh_cache):
+    fake = fake_client(lambda kwargs: {"content": "echo " + kwargs["messages"][-1]["content"]}, is_async=True)
+    monkeypatch.setattr(asgi_app, "async_openai_client", fake)
+    status, headers, payload = call_asgi("/chat/batch", json.dumps({"queries": ["asgi batch framing one", "asgi batch framing two"]}).encode())
+    assert (status, headers[b"content-type"]) == (200, b"application/x-ndjson")
+    lines = parse_ndjson(payload)
+    assert lines[-1]["done"] is True and lines[-1]["errors"] == 0
+    assert {line["index"]: line["response"] for line in lines[:-1]} == {
+        0: "echo asgi batch framing one", 1: "echo asgi batch framing two"
+    }
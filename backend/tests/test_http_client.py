@@ -0,0 +1,235 @@
+# backend/tests/test_http_client.py - CircuitBreaker state transitions and how UpstreamClient settles them
+import asyncio
+
+import httpx
+import pytest
+import requests
+
+from http_client import CircuitBreaker, UpstreamClient, outcome_scope
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    for _ in range(2):
+        assert breaker.allow_request()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+
+def test_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_lets_one_probe_through_after_reset_timeout(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.advance(29.9)
+    assert not breaker.allow_request()
+    clock.advance(0.1)
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow_request() # only one probe at a time
+
+
+def test_successful_probe_closes_the_circuit(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.advance(30)
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+    assert breaker.allow_request()
+
+
+def test_failed_probe_reopens_for_another_reset_timeout(clock):
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=30)
+    for _ in range(5):
+        breaker.record_failure()
+    clock.advance(30)
+    assert breaker.allow_request()
+    breaker.record_failure() # a single half-open failure re-opens, whatever the threshold
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.advance(29)
+    assert not breaker.allow_request()
+    clock.advance(1)
+    assert breaker.allow_request()
+
+
+def test_released_probe_can_be_granted_again(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.advance(30)
+    assert breaker.allow_request()
+    breaker.release_probe() # e.g. the caller gave up before sending it
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+
+def test_lost_probe_is_given_up_after_another_reset_timeout(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.advance(30)
+    assert breaker.acquire() == CircuitBreaker.PROBE
+    clock.advance(29)
+    assert breaker.acquire() is None
+    clock.advance(1)
+    assert breaker.acquire() == CircuitBreaker.PROBE
+
+
+# --- UpstreamClient settles the breaker on every exit path ---
+class Interrupted(BaseException):
+    """Stands in for KeyboardInterrupt/SystemExit without affecting the test runner."""
+
+
+def _half_open_client(failure_threshold: int = 1) -> UpstreamClient:
+    client = UpstreamClient("test", max_retries=0, breaker=CircuitBreaker(failure_threshold=failure_threshold, reset_timeout=30))
+    client.breaker.state = CircuitBreaker.HALF_OPEN
+    return client
+
+
+@pytest.mark.parametrize("error", [
+    requests.exceptions.ChunkedEncodingError("truncated body"),
+    requests.exceptions.ContentDecodingError("bad gzip"),
+    requests.exceptions.InvalidURL("no host"),
+])
+def test_probe_failing_with_unexpected_error_reopens_the_circuit(monkeypatch, error):
+    client = _half_open_client()
+    monkeypatch.setattr(client.session, "get", lambda *args, **kwargs: (_ for _ in ()).throw(error))
+    with pytest.raises(type(error)):
+        client.get("http://upstream.invalid/")
+    assert client.breaker.state == CircuitBreaker.OPEN
+    assert client.stats()["failures"] == 1
+
+
+def test_interrupted_probe_is_released(monkeypatch):
+    client = _half_open_client()
+    monkeypatch.setattr(client.session, "get", lambda *args, **kwargs: (_ for _ in ()).throw(Interrupted()))
+    with pytest.raises(Interrupted):
+        client.get("http://upstream.invalid/")
+    assert client.breaker.state == CircuitBreaker.HALF_OPEN
+    assert client.breaker.allow_request() # the next caller gets the probe
+
+
+def test_non_probe_call_does_not_release_another_callers_probe(monkeypatch):
+    client = _half_open_client()
+    assert client.breaker.acquire() == CircuitBreaker.PROBE # held by some other caller
+    client.breaker.state = CircuitBreaker.CLOSED
+    monkeypatch.setattr(client.session, "get", lambda *args, **kwargs: (_ for _ in ()).throw(Interrupted()))
+    with pytest.raises(Interrupted):
+        client.get("http://upstream.invalid/")
+    assert client.breaker._probe_in_flight
+
+
+def test_async_probe_failing_with_decoding_error_reopens_the_circuit():
+    client = _half_open_client()
+
+    def handler(request):
+        raise httpx.DecodingError("bad gzip", request=request)
+
+    async def main():
+        client._async_session = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        try:
+            with pytest.raises(httpx.DecodingError):
+                await client.get_async("http://upstream.invalid/")
+        finally:
+            await client.aclose()
+
+    asyncio.run(main())
+    assert client.breaker.state == CircuitBreaker.OPEN
+
+
+def test_cancelled_async_probe_is_released():
+    client = _half_open_client()
+
+    async def handler(request):
+        await asyncio.sleep(60)
+
+    async def main():
+        client._async_session = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        try:
+            call = asyncio.ensure_future(client.get_async("http://upstream.invalid/"))
+            await asyncio.sleep(0.01)
+            call.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await call
+        finally:
+            await client.aclose()
+
+    asyncio.run(main())
+    assert client.breaker.state == CircuitBreaker.HALF_OPEN
+    assert client.breaker.allow_request()
+# --- End UpstreamClient breaker settlement ---
+
+
+# --- outcome_scope reports what the last upstream call did ---
+def _respond(status_code):
+    return lambda *args, **kwargs: type("Response", (), {"status_code": status_code})()
+
+def _raise(error):
+    return lambda *args, **kwargs: (_ for _ in ()).throw(error)
+
+
+@pytest.mark.parametrize("session_get, status", [
+    (_respond(200), "200"),
+    (_respond(404), "404"),
+    (_respond(503), "503"),
+    (_raise(requests.exceptions.ReadTimeout("slow")), "timeout"),
+    (_raise(requests.exceptions.ConnectionError("refused")), "transport_error"),
+    (_raise(requests.exceptions.ChunkedEncodingError("truncated body")), "transport_error"),
+])
+def test_outcome_scope_records_the_upstream_status(monkeypatch, session_get, status):
+    client = UpstreamClient("test", max_retries=0)
+    monkeypatch.setattr(client.session, "get", session_get)
+    with outcome_scope() as outcome:
+        try:
+            client.get("http://upstream.invalid/")
+        except requests.exceptions.RequestException:
+            pass
+    assert outcome == {"status": status}
+
+
+def test_outcome_is_the_last_attempt_after_retries(monkeypatch):
+    client = UpstreamClient("test", max_retries=1, backoff_base=0.0, min_attempt_seconds=0.0)
+    responses = iter([_respond(503), _respond(200)])
+    monkeypatch.setattr(client.session, "get", lambda *args, **kwargs: next(responses)())
+    with outcome_scope() as outcome:
+        client.get("http://upstream.invalid/")
+    assert outcome["status"] == "200"
+
+
+def test_outcome_scope_marks_calls_that_were_never_sent(clock):
+    client = UpstreamClient("test", max_retries=0, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=30))
+    client.breaker.record_failure()
+    with outcome_scope() as outcome:
+        with pytest.raises(requests.exceptions.ConnectionError):
+            client.get("http://upstream.invalid/")
+    assert outcome["status"] == "rejected"
+    with outcome_scope() as outcome:
+        pass # no upstream call, e.g. a cache hit
+    assert outcome["status"] is None
+
+
+def test_async_outcome_reaches_the_scope_through_other_tasks():
+    client = UpstreamClient("test", max_retries=0)
+
+    async def main():
+        client._async_session = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(401)))
+        try:
+            with outcome_scope() as outcome:
+                # wait_for runs the call in a task of its own, with a copy of this context
+                await asyncio.wait_for(client.get_async("http://upstream.invalid/"), timeout=5)
+            return outcome
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(main()) == {"status": "401"}
+# --- End outcome_scope ---
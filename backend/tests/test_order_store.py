@@ -0,0 +1,134 @@
+# backend/tests/test_order_store.py - Order store bulk load and lookups, and the customer check before sharing order details
+import gzip
+import json
+
+import pytest
+
+import app
+import order_store
+from order_store import OrderStore, iter_order_records
+
+ORDERS = [
+    {"order_id": "A10023", "customer_id": "C-1", "email": "Ana@Example.com", "status": "shipped", "total": "59.90",
+     "currency": "USD", "items": [{"name": "Pulse Smartwatch", "quantity": 1}], "created_at": "2026-03-01",
+     "carrier": "UPS", "tracking_number": "1Z999", "estimated_delivery": "2026-03-05"},
+    {"order_id": "A10024", "customer_id": "C-1", "status": "processing", "total": 12.5, "created_at": "2026-03-02"},
+    {"order_id": "B20001", "customer_id": "C-2", "status": "delivered", "items": "2 x Volt Charger", "created_at": "2026-02-10"},
+]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = OrderStore(str(tmp_path / "orders.sqlite3"))
+    yield store
+    store.close()
+
+
+def test_bulk_load_batches_records_and_skips_unusable_ones(store):
+    batches = []
+    records = ORDERS + [{"order_id": "X1", "status": "new"}, {"order_id": "X2", "customer_id": "C-3", "status": "new", "total": "n/a"}, {}]
+    counts = store.bulk_load(iter(records), batch_size=2, progress=lambda counts: batches.append(counts["loaded"]))
+    assert {key: counts[key] for key in ("loaded", "skipped", "batches")} == {"loaded": 3, "skipped": 3, "batches": 2}
+    assert batches == [2, 3]
+    assert store.count() == 3
+
+
+def test_orders_are_looked_up_case_insensitively_with_decoded_items(store):
+    store.bulk_load(ORDERS)
+    order = store.get(" a10023 ")
+    assert order["order_id"] == "A10023" and order["total"] == 59.9
+    assert order["items"] == [{"name": "Pulse Smartwatch", "quantity": 1}]
+    assert store.get("B20001")["items"] == "2 x Volt Charger" # plain text stays as is
+    assert store.get("Z99999") is None and store.get(None) is None
+
+
+def test_reloading_an_order_replaces_it(store):
+    store.bulk_load(ORDERS)
+    store.bulk_load([dict(ORDERS[1], status="shipped")])
+    assert store.count() == 3
+    assert store.get("A10024")["status"] == "shipped"
+
+
+@pytest.mark.parametrize("defer_index", [False, True])
+def test_customer_orders_newest_first(store, defer_index):
+    store.bulk_load(ORDERS, defer_index=defer_index)
+    assert [order["order_id"] for order in store.for_customer("C-1")] == ["A10024", "A10023"]
+    assert [order["order_id"] for order in store.for_customer("C-1", limit=1)] == ["A10024"]
+    assert store._conn().execute("SELECT name FROM sqlite_master WHERE name = 'orders_customer'").fetchone()
+
+
+def test_lookups_run_from_many_threads(store):
+    from concurrent.futures import ThreadPoolExecutor
+    store.bulk_load(ORDERS)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda n: store.get(ORDERS[n % 3]["order_id"])["status"], range(64)))
+    assert results == [ORDERS[n % 3]["status"] for n in range(64)]
+
+
+def test_dumps_are_read_as_csv_or_gzipped_json_lines(tmp_path):
+    csv_path = tmp_path / "orders.csv"
+    csv_path.write_text("order_id,customer_id,status,total\nA1,C-1,shipped,10\nA2,C-2,new,\n")
+    assert [record["order_id"] for record in iter_order_records(str(csv_path))] == ["A1", "A2"]
+
+    jsonl_path = tmp_path / "orders.jsonl.gz"
+    with gzip.open(jsonl_path, "wt", encoding="utf-8") as f:
+        f.write(json.dumps(ORDERS[0]) + "\n\nnot json\n" + json.dumps(ORDERS[2]) + "\n")
+    assert list(iter_order_records(str(jsonl_path))) == [ORDERS[0], {}, ORDERS[2]] # bad lines become skipped records
+
+
+def test_command_line_load_and_get(tmp_path, capsys):
+    dump = tmp_path / "orders.jsonl"
+    dump.write_text("\n".join(json.dumps(order) for order in ORDERS))
+    db = str(tmp_path / "cli.sqlite3")
+    assert order_store.main(["--db", db, "load", str(dump), "--batch-size", "2"]) == 0
+    assert json.loads(capsys.readouterr().out)["loaded"] == 3
+    assert order_store.main(["--db", db, "get", "b20001"]) == 0
+    assert json.loads(capsys.readouterr().out)["status"] == "delivered"
+    assert order_store.main(["--db", db, "get", "nope"]) == 1
+
+
+# --- lookup_order (app.py): details only for the customer on the order ---
+@pytest.fixture
+def orders(store, monkeypatch):
+    store.bulk_load(ORDERS)
+    monkeypatch.setattr(app, "get_order_info", store.get)
+
+
+def test_order_id_alone_gets_the_status_only(orders):
+    answer = app.lookup_order("A10023")
+    assert answer.startswith("Order A10023 is shipped.")
+    assert "provides the email address or customer ID" in answer
+    for detail in ("59.90", "Pulse Smartwatch", "1Z999", "2026-03-05"):
+        assert detail not in answer
+
+
+@pytest.mark.parametrize("kwargs", [{"email": " ana@example.COM "}, {"customer_id": "c-1"}])
+def test_matching_email_or_customer_id_unlocks_details(orders, kwargs):
+    answer = app.lookup_order("a10023", **kwargs)
+    for detail in ("Total: 59.90 USD.", "Items: 1 x Pulse Smartwatch.", "Shipped with UPS, tracking number 1Z999.",
+                   "Estimated delivery: 2026-03-05."):
+        assert detail in answer
+
+
+@pytest.mark.parametrize("kwargs", [{"email": "someone@example.com"}, {"customer_id": "C-2"}, {"email": ""}])
+def test_someone_elses_details_get_the_status_only(orders, kwargs):
+    answer = app.lookup_order("A10023", **kwargs)
+    assert "Total" not in answer and "provides the email address or customer ID" in answer
+
+
+def test_orders_without_an_email_still_match_by_customer_id(orders):
+    assert "Total" not in app.lookup_order("A10024", email="ana@example.com")
+    assert "Total: 12.50." in app.lookup_order("A10024", customer_id="C-1")
+
+
+def test_unknown_orders_and_store_failures_are_tool_errors(orders, monkeypatch):
+    assert app.lookup_order("Z1").startswith("Error: No order found with ID 'Z1'")
+    monkeypatch.setattr(app, "get_order_info", lambda order_id: (_ for _ in ()).throw(RuntimeError("disk I/O error")))
+    assert app.lookup_order("A10023") == "Error: The order database is unavailable right now."
+
+
+def test_tool_call_arguments_reach_the_check(orders):
+    message = app.execute_tool_call("call_1", "get_order_info", json.dumps({"order_id": " A10023 ", "email": "ana@example.com"}))
+    assert "Total: 59.90 USD." in message["content"]
+    message = app.execute_tool_call("call_2", "get_order_info", json.dumps({"order_id": "A10023", "customer_id": "  "}))
+    assert "Total" not in message["content"]
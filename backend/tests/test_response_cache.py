@@ -0,0 +1,117 @@
+# backend/tests/test_response_cache.py - Response cache keys, version invalidation, backends and near-duplicate lookups
+import json
+import shutil
+import time
+
+import pytest
+
+import app
+import data_store
+from response_cache import MemoryBackend, ResponseCache, SQLiteBackend, normalize_query
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryBackend(max_entries=100)
+    return SQLiteBackend(str(tmp_path / "responses.sqlite3"), max_entries=100)
+
+
+def test_queries_differing_in_case_punctuation_and_spacing_share_an_entry(backend):
+    cache = ResponseCache(backend)
+    cache.put("What's your  return policy?", "model-a", "v1", "30 days.", 120.0)
+    assert normalize_query("What's your  return policy?") == "what s your return policy"
+    assert cache.get("what's your return policy", "model-a", "v1") == "30 days."
+    assert cache.get("WHAT'S YOUR RETURN POLICY!!", "model-a", "v1") == "30 days."
+    assert cache.get("what is your return policy", "model-a", "v1") is None
+
+
+def test_model_and_version_are_part_of_the_key(backend):
+    cache = ResponseCache(backend)
+    cache.put("hello", "model-a", "v1", "Hi!", 100.0)
+    assert cache.get("hello", "model-b", "v1") is None
+    assert cache.get("hello", "model-a", "v2") is None
+    assert cache.get("hello", "model-a", "v1") == "Hi!"
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+    assert cache.stats()["saved_latency_ms_total"] == 100.0
+
+
+def test_entries_expire_after_the_ttl(backend, monkeypatch):
+    cache = ResponseCache(backend, ttl_seconds=60)
+    cache.put("hello", "m", "v1", "Hi!", 1.0)
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert cache.get("hello", "m", "v1") is None
+
+
+def test_queries_without_words_are_not_stored(backend):
+    cache = ResponseCache(backend)
+    cache.put("?!", "m", "v1", "Huh?", 1.0)
+    assert len(backend) == 0
+
+
+def test_memory_backend_evicts_the_least_recently_used():
+    cache = ResponseCache(MemoryBackend(max_entries=2))
+    cache.put("one", "m", "v", "1", 1.0)
+    cache.put("two", "m", "v", "2", 1.0)
+    cache.get("one", "m", "v")
+    cache.put("three", "m", "v", "3", 1.0)
+    assert [cache.get(query, "m", "v") for query in ("one", "two", "three")] == ["1", None, "3"]
+
+
+def test_sqlite_backend_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "shared.sqlite3")
+    ResponseCache(SQLiteBackend(path)).put("hello", "m", "v1", "Hi!", 1.0)
+    assert ResponseCache(SQLiteBackend(path)).get("hello", "m", "v1") == "Hi!" # e.g. another worker process
+
+
+def test_near_duplicates_only_match_within_the_same_version():
+    cache = ResponseCache(MemoryBackend(), near_duplicate_threshold=0.6)
+    cache.put("tell me a joke about cats please", "m", "v1", "Meow.", 1.0)
+    assert cache.get("please tell me a joke about cats", "m", "v1") == "Meow." # same words, different order
+    assert cache.get("tell me a joke about cats", "m", "v1") == "Meow."
+    assert cache.get("tell me a joke about cats", "m", "v2") is None
+    assert cache.get("tell me about dogs", "m", "v1") is None
+    assert cache.stats()["near_duplicate_hits"] == 2
+
+
+# --- app.py: what the answer version covers ---
+@pytest.fixture
+def kb_copy(tmp_path, monkeypatch):
+    path = tmp_path / "knowledge_base.json"
+    shutil.copy(data_store.KNOWLEDGE_BASE_PATH, path)
+    monkeypatch.setattr(data_store, "KNOWLEDGE_BASE_PATH", str(path))
+    data_store.reload_knowledge_base(force=True)
+    yield path
+    monkeypatch.undo()
+    data_store.reload_knowledge_base(force=True)
+
+
+def test_knowledge_base_edits_retire_cached_answers(kb_copy):
+    app.store_response("versioned answer test", True, "Costs $89.99.", 500.0)
+    assert app.cached_response("versioned answer test", True) == "Costs $89.99."
+
+    data_store.reload_knowledge_base(force=True) # nothing changed: same version
+    assert app.cached_response("versioned answer test", True) == "Costs $89.99."
+
+    data = json.loads(kb_copy.read_text())
+    data["products"][0]["price"] = 1.0
+    kb_copy.write_text(json.dumps(data))
+    data_store.reload_knowledge_base(force=True)
+    assert app.cached_response("versioned answer test", True) is None
+
+
+def test_tool_definitions_are_part_of_the_version(monkeypatch):
+    app.store_response("tools version test", True, "Answer.", 10.0)
+    monkeypatch.setattr(app, "TOOLS_SCHEMA_VERSION", "other-tools")
+    assert app.cached_response("tools version test", True) is None
+
+
+def test_turns_with_session_history_are_neither_served_nor_stored():
+    app.store_response("session cache test", True, "Cached.", 10.0)
+    app.session_store.record_turn("cache-session", [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}])
+    cacheable = app.response_cache_applies("cache-session")
+    assert not cacheable
+    assert app.cached_response("session cache test", cacheable) is None
+    app.store_response("session cache test two", cacheable, "Not cached.", 10.0)
+    assert app.cached_response("session cache test two", True) is None
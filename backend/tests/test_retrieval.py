@@ -0,0 +1,94 @@
+# backend/tests/test_retrieval.py - data_store retrieval: the index syncs in the background while searches continue
+import threading
+import time
+
+import pytest
+
+import data_store
+from vector_index import HashingEmbeddingProvider
+
+
+class GatedProvider(HashingEmbeddingProvider):
+    """Embeds documents only once `gate` is set (queries go through immediately); can be made to fail."""
+
+    def __init__(self, name: str):
+        super().__init__()
+        self.name = name
+        self.gate = threading.Event()
+        self.error = None
+
+    def embed(self, texts):
+        if not self.gate.wait(5):
+            raise TimeoutError("gate never opened")
+        if self.error:
+            raise self.error
+        return super().embed(texts)
+
+    def embed_queries(self, texts):
+        return super().embed(texts)
+
+
+@pytest.fixture
+def fresh_retrieval(monkeypatch):
+    for name, value in (("_retrieval_index", None), ("_retrieval_dirty", True), ("_retrieval_syncing", False),
+                        ("_retrieval_sync_failed_at", None)):
+        monkeypatch.setattr(data_store, name, value)
+
+
+def _wait_until(condition, timeout: float = 5.0):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(0.005)
+
+
+def test_searches_are_served_while_the_index_syncs(fresh_retrieval, request):
+    provider = GatedProvider(f"gated-{request.node.name}")
+    index = data_store.get_retrieval_index(provider)
+    assert data_store._retrieval_syncing
+    # The sync is blocked embedding documents; lookups return at once from the (still empty) index
+    started = time.perf_counter()
+    assert data_store.retrieve_product_info_batch(["headphones"]) == [[]]
+    assert time.perf_counter() - started < 1.0
+    assert data_store.get_retrieval_index() is index # and don't start a second sync
+
+    provider.gate.set()
+    _wait_until(lambda: not data_store._retrieval_syncing)
+    assert len(index) == len(data_store._retrieval_documents())
+    assert not data_store._retrieval_dirty
+
+
+def test_failed_sync_keeps_the_index_and_waits_before_retrying(fresh_retrieval, request):
+    provider = GatedProvider(f"failing-{request.node.name}")
+    provider.error = RuntimeError("embeddings API down")
+    provider.gate.set()
+    data_store.get_retrieval_index(provider)
+    _wait_until(lambda: not data_store._retrieval_syncing)
+    assert data_store._retrieval_dirty
+    assert data_store._retrieval_sync_failed_at is not None
+
+    data_store.get_retrieval_index()
+    assert not data_store._retrieval_syncing # within RETRIEVAL_SYNC_RETRY_SECONDS
+
+    provider.error = None
+    data_store._retrieval_sync_failed_at -= data_store.RETRIEVAL_SYNC_RETRY_SECONDS
+    data_store.get_retrieval_index()
+    _wait_until(lambda: not data_store._retrieval_syncing)
+    assert not data_store._retrieval_dirty
+
+
+def test_turns_answered_locally_or_from_cache_never_embed_the_query(monkeypatch):
+    import app
+    from fake_openai import fake_client
+
+    retrieved = []
+    monkeypatch.setattr(app, "retrieve_product_info", lambda query: retrieved.append(query))
+    monkeypatch.setattr(app, "openai_client", fake_client([{"content": "A poem about the sea."}]))
+    app.response_cache.backend._entries.clear()
+
+    assert app.run_chat_turn({"query": "What can you do?"})[1] == 200 # knowledge base FAQ
+    assert retrieved == []
+    assert app.run_chat_turn({"query": "write me a short poem about the sea"})[1] == 200
+    assert retrieved == ["write me a short poem about the sea"]
+    assert app.run_chat_turn({"query": "write me a short poem about the sea"}) == ({"response": "A poem about the sea."}, 200)
+    assert len(retrieved) == 1 # the repeat came from the response cache
@@ -0,0 +1,140 @@
+# backend/tests/test_session_store.py - Session history compaction, tool_call/tool pairing, eviction and redact_turn
+import json
+
+import app
+from fake_openai import _message
+from session_store import SessionStore, compact_message, extractive_summary
+
+
+def plain_turn(n: int, size: int = 80) -> list:
+    return [{"role": "user", "content": f"question {n} " + "q" * size},
+            {"role": "assistant", "content": f"answer {n} " + "a" * size}]
+
+def tool_turn(n: int) -> list:
+    call_id = f"call_{n}"
+    return [
+        {"role": "user", "content": f"weather {n}?"},
+        {"role": "assistant", "content": None, "tool_calls": [
+            {"id": call_id, "type": "function", "function": {"name": "get_current_weather", "arguments": json.dumps({"location": f"City{n}"})}}
+        ]},
+        {"role": "tool", "tool_call_id": call_id, "name": "get_current_weather", "content": f"Sunny in City{n}. " + "w" * 120},
+        {"role": "assistant", "content": f"It is sunny in City{n}."},
+    ]
+
+def assert_tool_calls_paired(messages: list):
+    """Every assistant tool_call is answered by a tool message right after it, and no tool message is orphaned."""
+    expected = []
+    for message in messages:
+        if message["role"] == "tool":
+            assert expected and message["tool_call_id"] == expected.pop(0)
+        else:
+            assert not expected, f"tool results missing for {expected}"
+            expected = [call["id"] for call in message.get("tool_calls") or []]
+    assert not expected
+
+
+def test_history_within_budget_is_returned_verbatim():
+    store = SessionStore(token_budget=10_000)
+    store.record_turn("s", plain_turn(1))
+    store.record_turn("s", tool_turn(2))
+    assert store.history("s") == plain_turn(1) + tool_turn(2)
+    assert store.stats()["turns_compacted"] == 0
+
+
+def test_oldest_turns_are_folded_into_the_summary_until_the_prompt_fits():
+    store = SessionStore(token_budget=300)
+    for n in range(6):
+        store.record_turn("s", plain_turn(n))
+    history = store.history("s", reserve_tokens=50)
+    summary = history[0]["content"]
+    assert history[0]["role"] == "system" and summary.startswith("Summary of the earlier conversation:")
+    kept = [n for n in range(6) if plain_turn(n)[0] in history]
+    assert kept == list(range(kept[0], 6)) and kept[0] > 0 # whole turns, oldest first
+    assert f"User: question {kept[0] - 1} " in summary # the latest trimmed turn was folded in
+    assert all(f"question {n} " not in summary for n in kept)
+    assert sum(len(message["content"]) // 4 + 4 for message in history) + 50 <= 300
+    assert store.stats()["turns_compacted"] >= 1
+
+
+def test_compaction_never_splits_tool_calls_from_their_results():
+    store = SessionStore(token_budget=260)
+    for n in range(8):
+        store.record_turn("s", tool_turn(n) if n % 2 else plain_turn(n))
+    for reserve in (0, 40, 120):
+        history = store.history("s", reserve_tokens=reserve)
+        assert_tool_calls_paired(history)
+        assert history[-1]["role"] == "assistant" and history[-1].get("content")
+    assert store.stats()["turns_compacted"] > 0
+
+
+def test_summary_is_capped():
+    summary = ""
+    for n in range(100):
+        summary = extractive_summary(summary, plain_turn(n, size=150), max_chars=500)
+    assert len(summary) <= 500
+    assert "question 99" in summary and "question 0 " not in summary
+
+
+def test_sdk_messages_are_stored_as_plain_dicts():
+    sdk_message = _message({"tool_calls": [("call_9", "convert_currency", {"amount": 5})]})
+    assert compact_message(sdk_message) == {
+        "role": "assistant", "content": None,
+        "tool_calls": [{"id": "call_9", "type": "function", "function": {"name": "convert_currency", "arguments": '{"amount": 5}'}}],
+    }
+
+
+def test_least_recently_used_sessions_are_evicted(clock):
+    store = SessionStore(max_sessions=2, idle_ttl_seconds=60)
+    for session_id in ("a", "b"):
+        store.record_turn(session_id, plain_turn(1))
+    store.history("a") # a is now more recent than b
+    store.record_turn("c", plain_turn(1))
+    assert [store.has_history(session_id) for session_id in ("a", "b", "c")] == [True, False, True]
+    clock.advance(61)
+    store.record_turn("c", plain_turn(2))
+    assert not store.has_history("a") # idle past the TTL
+    assert store.stats()["sessions"] == 1
+
+
+def test_byte_budget_evicts_and_accounts_for_cleared_sessions():
+    store = SessionStore(max_total_bytes=2000)
+    for n in range(10):
+        store.record_turn(f"s{n}", plain_turn(n, size=200))
+    assert store.stats()["total_bytes"] <= 2000
+    assert store.has_history("s9")
+    store.clear("s9")
+    assert not store.has_history("s9")
+    assert store.stats()["total_bytes"] < 2000
+
+
+# --- redact_turn (app.py): secret tool results never reach session memory ---
+def password_turn(password: str, content: str = None) -> list:
+    return [
+        {"role": "user", "content": "make me a password"},
+        _message({"tool_calls": [("call_pw", "generate_random_password", {"length": 12})]}),
+        {"role": "tool", "tool_call_id": "call_pw", "name": "generate_random_password", "content": content or password},
+        {"role": "assistant", "content": f"Here is your new password: {password}"},
+    ]
+
+
+def test_redact_turn_removes_the_password_everywhere_it_appears():
+    redacted = app.redact_turn(password_turn("Zq7!pX2#mK9v"))
+    assert "Zq7!pX2#mK9v" not in json.dumps(redacted)
+    assert redacted[2]["content"] == app.REDACTED_TOOL_RESULT
+    assert redacted[3]["content"] == f"Here is your new password: {app.REDACTED_TOOL_RESULT}"
+    assert_tool_calls_paired(redacted) # the tool message stays, so the history remains valid for the API
+
+
+def test_redact_turn_keeps_errors_and_other_tools():
+    error = "Error: Invalid arguments provided - length"
+    assert app.redact_turn(password_turn("unused", content=error))[2]["content"] == error
+    weather = tool_turn(1)
+    assert app.redact_turn(weather) == [compact_message(message) for message in weather]
+
+
+def test_remember_turn_stores_the_redacted_turn():
+    turn = password_turn("Hn4$tR8@wQ1z")
+    app.remember_turn("redact-session", turn[:-1], turn[-1]["content"])
+    history = app.session_store.history("redact-session")
+    assert "Hn4$tR8@wQ1z" not in json.dumps(history)
+    assert_tool_calls_paired(history)
@@ -0,0 +1,71 @@
+# backend/tests/test_terminal_tools.py - Turns whose tool results already are the answer skip the second model call
+import asyncio
+import json
+
+import pytest
+
+import app
+import asgi_app
+from fake_openai import fake_client
+
+
+def tool_message(name: str, content: str) -> dict:
+    return {"tool_call_id": f"call_{name}", "role": "tool", "name": name, "content": content}
+
+
+def test_terminal_results_are_rendered_with_their_templates():
+    password = tool_message("generate_random_password", "s3cret!pass")
+    conversion = tool_message("convert_currency", "100.00 USD is approximately 92.00 EUR.")
+    assert app.terminal_response([conversion]) == "100.00 USD is approximately 92.00 EUR."
+    assert app.terminal_response([password, conversion]) == (
+        "Here is your new password: s3cret!pass\nKeep it somewhere safe - it isn't saved in this conversation's history."
+        "\n\n100.00 USD is approximately 92.00 EUR."
+    )
+
+
+@pytest.mark.parametrize("tool_messages", [
+    [],
+    [tool_message("get_current_weather", "Sunny, 20C.")],
+    [tool_message("generate_random_password", "pw"), tool_message("get_current_weather", "Sunny, 20C.")],
+    [tool_message("convert_currency", "Error: Unsupported currency code (USD or XYZ).")],
+    [tool_message("generate_random_password", "")],
+])
+def test_anything_else_needs_the_model(tool_messages):
+    assert app.terminal_response(tool_messages) is None
+
+
+def test_terminal_answers_can_be_switched_off(monkeypatch):
+    monkeypatch.setattr(app, "TERMINAL_TOOL_ANSWERS", False)
+    assert app.terminal_response([tool_message("convert_currency", "1.00 USD is approximately 0.92 EUR.")]) is None
+
+
+def password_then_summary():
+    return [{"tool_calls": [("call_pw", "generate_random_password", {"length": 16})]}, {"content": "unused"}]
+
+
+def test_chat_turn_answers_from_the_terminal_tool_with_one_model_call(monkeypatch):
+    fake = fake_client(password_then_summary())
+    monkeypatch.setattr(app, "openai_client", fake)
+    response_data, status_code = app.run_chat_turn({"query": "terminal test: make me a password", "session_id": "terminal-session"})
+    assert status_code == 200
+    assert response_data["response"].startswith("Here is your new password: ")
+    assert len(fake.chat.completions.calls) == 1
+
+    password = response_data["response"].split(": ", 1)[1].split("\n")[0]
+    assert len(password) == 16
+    assert password not in json.dumps(app.session_store.history("terminal-session")) # see redact_turn
+
+
+def test_chat_turn_with_other_tools_makes_the_second_call(monkeypatch):
+    fake = fake_client([{"tool_calls": [("call_w", "get_current_weather", {"location": "Paris"})]}, {"content": "No weather today."}])
+    monkeypatch.setattr(app, "openai_client", fake)
+    assert app.run_chat_turn({"query": "terminal test: weather in Paris"}) == ({"response": "No weather today."}, 200)
+    assert len(fake.chat.completions.calls) == 2
+
+
+def test_asgi_chat_turn_skips_the_second_call_too(monkeypatch):
+    fake = fake_client(password_then_summary(), is_async=True)
+    monkeypatch.setattr(asgi_app, "async_openai_client", fake)
+    response_data, status_code = asyncio.run(asgi_app.chat_turn({"query": "terminal test (asgi): make me a password"}))
+    assert status_code == 200 and response_data["response"].startswith("Here is your new password: ")
+    assert len(fake.chat.completions.calls) == 1
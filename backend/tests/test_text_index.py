@@ -0,0 +1,85 @@
+# backend/tests/test_text_index.py - InvertedIndex ranking/confidence and the local fast path's answer threshold
+import pytest
+
+import app
+import data_store
+from text_index import InvertedIndex, tokenize
+
+
+@pytest.fixture
+def index():
+    index = InvertedIndex(generic_terms=["price stock order"])
+    index.add("watch", "Pulse Smartwatch fitness tracker heart rate")
+    index.add("speaker", "Nimbus Portable Speaker bluetooth waterproof")
+    index.add("charger", "Volt USB-C Charger fast charging")
+    index.add("x200", "Model X200 drone camera")
+    index.add("cancel", "How do I cancel my order cancellation")
+    return index
+
+
+def confidence(index, query):
+    results = index.search(query, k=1)
+    return results[0][0], results[0][2]
+
+
+def test_tokenize_drops_stopwords_and_folds_plurals():
+    assert tokenize("What are the Speakers' prices?") == ["speaker", "price"]
+    assert tokenize("glass") == ["glass"]
+
+
+def test_query_fully_covered_by_a_document_is_confident(index):
+    for query in ("pulse smartwatch", "what is the price of the Pulse smartwatch?"):
+        doc_id, score = confidence(index, query)
+        assert doc_id == "watch" and score >= 0.75
+
+
+def test_unmatched_distinguishing_term_lowers_confidence(index):
+    doc_id, score = confidence(index, "Is the Pulse smartwatch waterproof?")
+    assert doc_id == "watch"
+    assert score < 0.75
+    doc_id, score = confidence(index, "pulse smartwatch sapphire")
+    assert doc_id == "watch" and score < 0.75 # a term the index has never seen counts too
+
+
+def test_unmatched_identifier_zeroes_confidence(index):
+    assert confidence(index, "Cancel order A10023") == ("cancel", 0.0)
+    assert confidence(index, "x200 drone") == ("x200", 1.0) # matched identifiers are fine
+
+
+def test_generic_terms_alone_are_never_confident(index):
+    assert confidence(index, "where is my order") == ("cancel", 0.0)
+
+
+def test_removed_documents_are_not_returned(index):
+    index.remove("watch")
+    assert "watch" not in index
+    assert all(doc_id != "watch" for doc_id, _, _ in index.search("pulse smartwatch"))
+
+
+@pytest.mark.parametrize("query", [
+    "How long does shipping take?", "What is your return policy?", "can I cancel my order",
+    "tell me about the wireless headphones", "is the Volt USB-C charger in stock",
+])
+def test_confident_matches_are_answered_locally(query):
+    assert app.answer_locally(query)
+
+
+@pytest.mark.parametrize("query", [
+    "Is the Pulse smartwatch waterproof?", "Cancel order A10023", "where is my order", "what is the price",
+    "write me a poem about shipping containers",
+])
+def test_partial_or_generic_matches_go_to_the_model(query):
+    assert app.answer_locally(query) is None
+
+
+def test_threshold_decides_local_answers(monkeypatch):
+    query = "how many days for delivery" # matches the shipping-time FAQ, but not every term
+    assert app.answer_locally(query) is None
+    score = data_store.faq_index.search(query, k=1)[0][2]
+    monkeypatch.setattr(data_store, "FAQ_CONFIDENCE_THRESHOLD", score)
+    assert app.answer_locally(query) == data_store._faqs["faq-shipping-time"]["answer"]
+
+
+def test_follow_ups_in_a_conversation_always_go_to_the_model():
+    app.session_store.record_turn("text-index-session", [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}])
+    assert app.answer_locally("How long does shipping take?", "text-index-session") is None
@@ -0,0 +1,164 @@
+# backend/tests/test_tool_cache.py - TTLCache: single-flight loading (threads and asyncio), failures, TTL and LRU
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from tool_cache import TTLCache
+
+CALLERS = 16
+
+
+def _wait_until(condition, timeout: float = 5.0):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out waiting for concurrent callers"
+        time.sleep(0.001)
+
+
+def test_concurrent_misses_call_the_loader_once():
+    cache = TTLCache("test", ttl_seconds=60)
+    calls = []
+
+    def loader():
+        calls.append(1)
+        # Hold the load open until every other caller is waiting on it
+        _wait_until(lambda: cache.coalesced == CALLERS - 1)
+        return "value"
+
+    with ThreadPoolExecutor(max_workers=CALLERS) as pool:
+        results = list(pool.map(lambda _: cache.get_or_load("k", loader), range(CALLERS)))
+
+    assert results == ["value"] * CALLERS
+    assert len(calls) == 1
+    stats = cache.stats()
+    assert (stats["misses"], stats["coalesced"], stats["size"]) == (1, CALLERS - 1, 1)
+    assert cache.get_or_load("k", lambda: "reloaded") == "value"
+    assert cache.stats()["hits"] == 1
+
+
+def test_failing_loader_raises_in_every_waiter_and_caches_nothing():
+    cache = TTLCache("test", ttl_seconds=60)
+    error = RuntimeError("upstream down")
+
+    def loader():
+        _wait_until(lambda: cache.coalesced == CALLERS - 1)
+        raise error
+
+    def call(_):
+        try:
+            cache.get_or_load("k", loader)
+        except RuntimeError as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=CALLERS) as pool:
+        raised = list(pool.map(call, range(CALLERS)))
+
+    assert all(e is error for e in raised)
+    assert cache.stats()["size"] == 0
+    assert cache.get_or_load("k", lambda: "recovered") == "recovered"
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = TTLCache("test", ttl_seconds=10)
+    assert cache.get_or_load("k", lambda: 1) == 1
+    clock.advance(9)
+    assert cache.get_or_load("k", lambda: 2) == 1
+    clock.advance(2)
+    assert cache.get_or_load("k", lambda: 3) == 3
+    assert cache.stats()["expirations"] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache("test", ttl_seconds=60, max_entries=2)
+    cache.get_or_load("a", lambda: "a")
+    cache.get_or_load("b", lambda: "b")
+    cache.get_or_load("a", lambda: "a2") # a is now the most recently used
+    cache.get_or_load("c", lambda: "c")
+    assert cache.get_or_load("a", lambda: "a3") == "a"
+    assert cache.get_or_load("b", lambda: "b2") == "b2"
+    assert cache.stats()["evictions"] == 2
+
+
+def test_async_concurrent_misses_await_one_load():
+    cache = TTLCache("test", ttl_seconds=60)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def main():
+        return await asyncio.gather(*(cache.get_or_load_async("k", loader) for _ in range(CALLERS)))
+
+    assert asyncio.run(main()) == ["value"] * CALLERS
+    assert len(calls) == 1
+    assert cache.stats()["coalesced"] == CALLERS - 1
+
+
+def test_async_failing_loader_raises_in_every_waiter_and_caches_nothing():
+    cache = TTLCache("test", ttl_seconds=60)
+
+    async def loader():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def recovered():
+        return "recovered"
+
+    async def main():
+        results = await asyncio.gather(*(cache.get_or_load_async("k", loader) for _ in range(4)), return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert cache.stats()["size"] == 0
+        return await cache.get_or_load_async("k", recovered)
+
+    assert asyncio.run(main()) == "recovered"
+
+
+def test_async_cancelled_caller_does_not_cancel_the_shared_load():
+    cache = TTLCache("test", ttl_seconds=60)
+    release = None
+
+    async def loader():
+        await release.wait()
+        return "value"
+
+    async def main():
+        nonlocal release
+        release = asyncio.Event()
+        impatient = asyncio.ensure_future(cache.get_or_load_async("k", loader))
+        patient = asyncio.ensure_future(cache.get_or_load_async("k", loader))
+        await asyncio.sleep(0)
+        impatient.cancel()
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await impatient
+        return await patient
+
+    assert asyncio.run(main()) == "value"
+    assert cache.stats()["size"] == 1
+
+
+def test_sync_waiter_is_released_if_the_loader_is_interrupted():
+    cache = TTLCache("test", ttl_seconds=60)
+    started = threading.Event()
+
+    def loader():
+        started.set()
+        _wait_until(lambda: cache.coalesced == 1)
+        raise KeyboardInterrupt
+
+    def leader():
+        with pytest.raises(KeyboardInterrupt):
+            cache.get_or_load("k", loader)
+
+    thread = threading.Thread(target=leader)
+    thread.start()
+    started.wait()
+    with pytest.raises(KeyboardInterrupt):
+        cache.get_or_load("k", lambda: "unused")
+    thread.join()
+    assert cache.get_or_load("k", lambda: "fresh") == "fresh"
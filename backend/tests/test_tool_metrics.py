@@ -0,0 +1,54 @@
+# backend/tests/test_tool_metrics.py - The tool latency histogram is labelled with the upstream outcome
+import json
+
+import pytest
+import requests
+
+import app
+
+
+class RecordingHistogram:
+    def __init__(self):
+        self.observations = []
+
+    def observe(self, value, **labels):
+        self.observations.append(labels)
+
+
+@pytest.fixture
+def tool_seconds(monkeypatch):
+    histogram = RecordingHistogram()
+    monkeypatch.setattr(app, "TOOL_SECONDS", histogram)
+    monkeypatch.setenv("OPENWEATHERMAP_API_KEY", "test-key")
+    app.weather_cache.clear()
+    return histogram
+
+
+def weather_call(location: str) -> dict:
+    return app.execute_tool_call("call_1", "get_current_weather", json.dumps({"location": location}))
+
+
+def test_upstream_http_status_is_the_label(monkeypatch, tool_seconds):
+    response = requests.models.Response()
+    response.status_code, response.url = 404, "http://weather.invalid/"
+    monkeypatch.setattr(app.weather_http.session, "get", lambda *args, **kwargs: response)
+    assert weather_call("Atlantis-metrics-404")["content"].startswith("Error: Could not find weather data")
+    assert tool_seconds.observations == [{"tool": "get_current_weather", "status": "404"}]
+
+
+@pytest.mark.parametrize("error, status", [
+    (requests.exceptions.ConnectTimeout("slow"), "timeout"),
+    (requests.exceptions.ConnectionError("refused"), "transport_error"),
+])
+def test_timeouts_and_transport_errors_have_their_own_labels(monkeypatch, tool_seconds, error, status):
+    monkeypatch.setattr(app.weather_http, "max_retries", 0)
+    monkeypatch.setattr(app.weather_http.session, "get", lambda *args, **kwargs: (_ for _ in ()).throw(error))
+    assert weather_call(f"Nowhere-metrics-{status}")["content"].startswith("Error")
+    assert tool_seconds.observations == [{"tool": "get_current_weather", "status": status}]
+    app.weather_http.breaker.record_success() # don't leave failures on the shared breaker
+
+
+def test_tools_without_an_upstream_call_report_ok_or_error(tool_seconds):
+    app.execute_tool_call("call_1", "generate_random_password", json.dumps({"length": 12}))
+    app.execute_tool_call("call_2", "generate_random_password", "{not json")
+    assert [labels["status"] for labels in tool_seconds.observations] == ["ok", "error"]
@@ -0,0 +1,117 @@
+# backend/tests/test_vector_index.py - VectorIndex add/search/delete/compact, persistence and the OpenAI provider options
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from vector_index import HashingEmbeddingProvider, OpenAIEmbeddingProvider, VectorIndex
+
+
+@pytest.fixture
+def index_path(tmp_path):
+    return str(tmp_path / "index")
+
+
+def new_index(path, **kwargs):
+    return VectorIndex(path, HashingEmbeddingProvider(), **kwargs)
+
+
+def top_ids(index, query, k=3):
+    return [doc_id for doc_id, _, _ in index.search([query], k=k)[0]]
+
+
+def test_search_ranks_the_closest_document_first(index_path):
+    index = new_index(index_path)
+    index.add(["kettle", "lamp"], ["electric kettle boils water fast", "desk lamp with warm light"],
+              [{"snippet": "kettle"}, {"snippet": "lamp"}])
+    hits = index.search(["boil water in a kettle", "warm desk light"], k=1)
+    assert [hit[0][0] for hit in hits] == ["kettle", "lamp"]
+    assert hits[0][0][2] == {"snippet": "kettle"}
+    assert -1.0 <= hits[0][0][1] <= 1.0
+
+
+def test_re_adding_an_id_replaces_it(index_path):
+    index = new_index(index_path)
+    index.add(["doc"], ["red apples"], [{"v": 1}])
+    index.add(["doc"], ["blue ocean waves"], [{"v": 2}])
+    assert len(index) == 1
+    assert index.payload("doc") == {"v": 2}
+    assert top_ids(index, "ocean waves") == ["doc"]
+
+
+def test_delete_removes_documents_from_results(index_path):
+    index = new_index(index_path)
+    index.add(["a", "b"], ["alpha text", "beta text"])
+    assert index.delete(["a", "missing"]) == 1
+    assert index.ids() == ["b"]
+    assert top_ids(index, "alpha text") == ["b"]
+    assert index.delete(["a"]) == 0
+
+
+def test_deleting_most_rows_compacts_the_file(index_path):
+    index = new_index(index_path, initial_capacity=8)
+    ids = [f"doc{i}" for i in range(100)]
+    index.add(ids, [f"document number {i} about topic {i % 7}" for i in range(100)])
+    index.delete(ids[:60])
+    assert len(index._ids) == 40 # tombstones were dropped
+    assert index.ids() == ids[60:]
+    assert top_ids(index, "document number 75 about topic 5", k=1) == ["doc75"]
+
+
+def test_index_is_reloaded_from_disk(index_path):
+    index = new_index(index_path)
+    index.add(["a", "b"], ["alpha text", "beta text"], [{"n": 1}, {"n": 2}])
+    index.delete(["a"])
+    reopened = new_index(index_path)
+    assert reopened.ids() == ["b"]
+    assert reopened.payload("b") == {"n": 2}
+    assert np.allclose(reopened._vectors[reopened._row_of["b"]], index._vectors[index._row_of["b"]])
+
+
+def test_writes_by_another_instance_are_picked_up(index_path):
+    # Two instances on the same files stand in for two worker processes
+    first, second = new_index(index_path), new_index(index_path)
+    first.add(["a"], ["alpha text"])
+    second.add(["b"], ["beta text"]) # refreshes under the lock before appending
+    assert top_ids(first, "beta text", k=1) == ["b"] # search refreshes from disk first
+    assert sorted(first.ids()) == ["a", "b"]
+    assert sorted(new_index(index_path).ids()) == ["a", "b"]
+
+
+def test_index_built_with_another_provider_is_refused(index_path):
+    new_index(index_path).add(["a"], ["alpha"])
+    with pytest.raises(ValueError):
+        VectorIndex(index_path, HashingEmbeddingProvider(dim=64))
+
+
+class FakeEmbeddings:
+    def __init__(self, options):
+        self.options = options
+        self.calls = []
+
+    def create(self, model, input):
+        self.calls.append(input)
+        return SimpleNamespace(data=[SimpleNamespace(embedding=[1.0, 0.0]) for _ in input],
+                               usage=SimpleNamespace(total_tokens=3 * len(input)))
+
+
+class FakeOpenAI:
+    def __init__(self, **options):
+        self.options = options
+        self.embeddings = FakeEmbeddings(options)
+
+    def with_options(self, **options):
+        return FakeOpenAI(**options)
+
+
+def test_openai_provider_bounds_query_embeddings_and_meters_every_request():
+    metered = []
+    client = FakeOpenAI(timeout=30, max_retries=2)
+    provider = OpenAIEmbeddingProvider(client, dim=2, batch_size=2, query_timeout=1.5, query_max_retries=0,
+                                       meter=lambda requests, tokens: metered.append((requests, tokens)))
+    assert provider.embed(["a", "b", "c"]).shape == (3, 2)
+    assert client.embeddings.calls == [["a", "b"], ["c"]]
+    assert provider.embed_queries(["q"]).shape == (1, 2)
+    assert provider.query_client.options == {"timeout": 1.5, "max_retries": 0}
+    assert provider.query_client.embeddings.calls == [["q"]]
+    assert metered == [(1, 6), (1, 3), (1, 3)]
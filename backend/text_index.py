@@ -0,0 +1,127 @@
+# backend/text_index.py - Small in-memory inverted index with BM25 scoring (used by data_store.py)
+import math
+import re
+import threading
+from collections import Counter
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a about an and any are as at be can could do does for from get have how i if in is it "
+    "know me much my need of on or our please so tell that the there this to want was what "
+    "when where which who why will with would you your".split()
+)
+
+
+def tokenize(text: str) -> list:
+    """Lowercases, splits on non-alphanumerics, drops stopwords and folds simple plurals."""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(str(text).lower()):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+class InvertedIndex:
+    """BM25 index supporting incremental add/remove of documents by id.
+
+    search() also returns a confidence in [0, 1]: the document's score divided by the score of an
+    average-length document containing every query term once, where query terms the index has
+    never seen count at the maximum IDF. Queries about things the index doesn't cover score low.
+
+    Only distinguishing terms count towards confidence: terms found in more than half of the
+    documents and the caller's generic_terms (words like "price" that could be asked of any
+    document) still rank results but never make a match confident on their own. Each distinguishing
+    term contributes at most its IDF, so a document that matches some of them very well can't make
+    up for the ones it lacks ("is the Pulse smartwatch waterproof?" is not answered by a card that
+    never mentions water). A query term containing a digit names a specific thing (an order number,
+    a model) and a document without it gets confidence 0.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, generic_terms=()):
+        self.k1 = k1
+        self.b = b
+        self.generic_terms = frozenset(term for text in generic_terms for term in tokenize(text))
+        self._postings = {} # term -> {doc_id: term frequency}
+        self._doc_lengths = {}
+        self._doc_terms = {} # doc_id -> indexed terms, so remove() only touches its own postings
+        self._total_length = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._doc_lengths)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._doc_lengths
+
+    def add(self, doc_id, text: str):
+        """Indexes text under doc_id, replacing any previous version of that document."""
+        term_counts = Counter(tokenize(text))
+        with self._lock:
+            self.remove(doc_id)
+            for term, count in term_counts.items():
+                self._postings.setdefault(term, {})[doc_id] = count
+            length = sum(term_counts.values())
+            self._doc_lengths[doc_id] = length
+            self._doc_terms[doc_id] = tuple(term_counts)
+            self._total_length += length
+
+    def remove(self, doc_id):
+        with self._lock:
+            length = self._doc_lengths.pop(doc_id, None)
+            if length is None:
+                return
+            self._total_length -= length
+            for term in self._doc_terms.pop(doc_id, ()):
+                postings = self._postings[term]
+                del postings[doc_id]
+                if not postings:
+                    del self._postings[term]
+
+    def _idf(self, doc_freq: int) -> float:
+        n = len(self._doc_lengths)
+        return math.log(1 + (n - doc_freq + 0.5) / (doc_freq + 0.5))
+
+    def search(self, query: str, k: int = 3) -> list:
+        """Returns up to k (doc_id, score, confidence) tuples, best first."""
+        query_terms = set(tokenize(query))
+        with self._lock:
+            if not query_terms or not self._doc_lengths:
+                return []
+            doc_count = len(self._doc_lengths)
+            avg_length = self._total_length / doc_count or 1.0
+            max_idf = self._idf(0)
+            scores = {}
+            distinguishing_scores = {} # per document: sum of each distinguishing term's score, capped at its IDF
+            best_possible = 0.0
+            identifiers = [] # postings (or None) of distinguishing terms containing a digit
+            for term in query_terms:
+                postings = self._postings.get(term)
+                distinguishing = term not in self.generic_terms and (
+                    not postings or doc_count < 2 or len(postings) * 2 <= doc_count
+                )
+                if distinguishing and any(char.isdigit() for char in term):
+                    identifiers.append(postings or {})
+                if not postings:
+                    best_possible += max_idf if distinguishing else 0.0
+                    continue
+                idf = self._idf(len(postings))
+                if distinguishing:
+                    best_possible += idf
+                for doc_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[doc_id] / avg_length)
+                    term_score = idf * tf * (self.k1 + 1) / (tf + norm)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + term_score
+                    if distinguishing:
+                        distinguishing_scores[doc_id] = distinguishing_scores.get(doc_id, 0.0) + min(term_score, idf)
+
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+            results = []
+            for doc_id, score in ranked:
+                confidence = min(1.0, distinguishing_scores.get(doc_id, 0.0) / best_possible) if best_possible else 0.0
+                if any(doc_id not in postings for postings in identifiers):
+                    confidence = 0.0
+                results.append((doc_id, score, confidence))
+        return results
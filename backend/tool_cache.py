@@ -0,0 +1,143 @@
+# backend/tool_cache.py - In-process TTL/LRU cache with single-flight loading for tool lookups
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+
+class _InFlight:
+    """A load in progress; concurrent callers for the same key wait on it instead of calling upstream."""
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    """Thread-safe cache with a per-cache TTL, LRU eviction at max_entries and request coalescing.
+
+    Only successful loads are stored: if the loader raises, the exception is passed to every
+    caller waiting on that load and nothing is cached.
+    """
+
+    def __init__(self, name: str, ttl_seconds: float, max_entries: int = 1024):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict() # key -> (expires_at, value), least recently used first
+        self._inflight = {}
+        self._inflight_async = {} # key -> asyncio.Task of the load in progress (ASGI app)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _fresh_locked(self, key):
+        """(True, value) for an unexpired entry, else (False, None). Caller holds the lock."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[1]
+            del self._entries[key]
+            self.expirations += 1
+        return False, None
+
+    def _store_locked(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_or_load(self, key, loader):
+        """Returns the cached value for key, calling loader() at most once per key across threads on a miss."""
+        with self._lock:
+            found, value = self._fresh_locked(key)
+            if found:
+                return value
+
+            flight = self._inflight.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                is_leader = False
+            else:
+                flight = _InFlight()
+                self._inflight[key] = flight
+                self.misses += 1
+                is_leader = True
+
+        if not is_leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+            return flight.value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if flight.error is None:
+                    self._store_locked(key, flight.value)
+                del self._inflight[key]
+            flight.event.set()
+
+    async def get_or_load_async(self, key, loader):
+        """get_or_load() for the event loop: loader is a coroutine function, awaited at most once per key.
+
+        The load runs as its own task, so a caller that is cancelled (e.g. its tool deadline passed)
+        doesn't cancel the load for the others waiting on it.
+        """
+        with self._lock:
+            found, value = self._fresh_locked(key)
+            if found:
+                return value
+            task = self._inflight_async.get(key)
+            if task is not None:
+                self.coalesced += 1
+            else:
+                task = asyncio.ensure_future(self._load_async(key, loader))
+                task.add_done_callback(lambda done: done.cancelled() or done.exception()) # no "never retrieved" warnings
+                self._inflight_async[key] = task
+                self.misses += 1
+        return await asyncio.shield(task)
+
+    async def _load_async(self, key, loader):
+        try:
+            value = await loader()
+        except BaseException:
+            with self._lock:
+                self._inflight_async.pop(key, None)
+            raise
+        with self._lock:
+            self._store_locked(key, value)
+            self._inflight_async.pop(key, None)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0
+            }
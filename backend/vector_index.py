@@ -0,0 +1,303 @@
+# backend/vector_index.py - Memory-mapped embedding index with batched cosine top-k (used for RAG in data_store.py)
+#
+# Vectors live in one contiguous float32 .npy file opened with numpy.memmap, so every worker process
+# maps the same pages instead of holding its own copy. Row metadata (ids, payloads, tombstones) is a
+# small JSON sidecar; readers reopen the mapping when the sidecar changes on disk. Writers in any
+# process serialize on an flock of <path>.lock and re-read the files first, so concurrent appends
+# from several workers can't overwrite each other's rows or metadata.
+import contextlib
+import hashlib
+import json
+import os
+import re
+import threading
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError: # Windows: no cross-process locking, run a single writer process
+    fcntl = None
+
+
+# --- Embedding Providers ---
+class EmbeddingProvider:
+    """Turns a list of texts into an (n, dim) float32 array. Subclasses set `name` and `dim`.
+
+    `default_min_score` is the cosine similarity below which a hit is usually noise for this provider.
+    """
+    name = "base"
+    dim = 0
+    default_min_score = 0.3
+
+    def embed(self, texts: list) -> np.ndarray:
+        raise NotImplementedError
+
+    def embed_queries(self, texts: list) -> np.ndarray:
+        """embed() for search queries, which sit on a request's critical path (see OpenAIEmbeddingProvider)."""
+        return self.embed(texts)
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """OpenAI embeddings API (text-embedding-3-small by default), batched.
+
+    Document batches use the client's own timeout and retries; query embeddings use
+    query_timeout/query_max_retries, since a request waits on them before its first completion.
+    meter(requests, tokens) is called after every API request, e.g. to charge admission control.
+    """
+    default_min_score = 0.35
+
+    def __init__(self, client, model: str = "text-embedding-3-small", dim: int = 1536, batch_size: int = 256,
+                 query_timeout: float = 2.0, query_max_retries: int = 0, meter=None):
+        self.client = client
+        self.model = model
+        self.name = f"openai-{model}"
+        self.dim = dim
+        self.batch_size = batch_size
+        self.query_client = client.with_options(timeout=query_timeout, max_retries=query_max_retries)
+        self.meter = meter
+
+    def _embed_with(self, client, texts: list) -> np.ndarray:
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            response = client.embeddings.create(model=self.model, input=texts[start:start + self.batch_size])
+            if self.meter:
+                self.meter(1, getattr(getattr(response, "usage", None), "total_tokens", 0) or 0)
+            vectors.extend(item.embedding for item in response.data)
+        return np.asarray(vectors, dtype=np.float32).reshape(len(texts), self.dim)
+
+    def embed(self, texts: list) -> np.ndarray:
+        return self._embed_with(self.client, texts)
+
+    def embed_queries(self, texts: list) -> np.ndarray:
+        return self._embed_with(self.query_client, texts)
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """Deterministic local embedder (signed feature hashing of words and word bigrams).
+
+    No network and stable across processes, so it works offline and in tests.
+    """
+    _token_pattern = re.compile(r"[a-z0-9]+")
+    default_min_score = 0.2
+
+    def __init__(self, dim: int = 256):
+        self.name = f"hashing-{dim}"
+        self.dim = dim
+
+    def _features(self, text: str) -> list:
+        words = self._token_pattern.findall(str(text).lower())
+        return words + [f"{a}_{b}" for a, b in zip(words, words[1:])]
+
+    def embed(self, texts: list) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+                bucket = int.from_bytes(digest[:4], "little") % self.dim
+                matrix[row, bucket] += 1.0 if digest[4] & 1 else -1.0
+        return matrix
+# --- End Embedding Providers ---
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32, copy=False)
+
+
+class VectorIndex:
+    """Append-only matrix of unit vectors with tombstone deletes.
+
+    add() appends rows (growing the file geometrically when full), delete() only flips a tombstone,
+    and compact() rewrites the file once tombstones dominate. search() scores a batch of queries
+    against all live rows with one matrix product.
+    """
+
+    def __init__(self, path: str, provider: EmbeddingProvider, initial_capacity: int = 1024):
+        self.path = path
+        self.provider = provider
+        self.vectors_path = f"{path}.vectors.npy"
+        self.meta_path = f"{path}.meta.json"
+        self.lock_path = f"{path}.lock"
+        self.initial_capacity = initial_capacity
+        self._lock = threading.RLock()
+        self._vectors = None
+        self._ids = []        # row -> doc id (None for deleted rows)
+        self._payloads = []   # row -> metadata dict
+        self._row_of = {}     # doc id -> row
+        self._alive = np.zeros(0, dtype=bool)
+        self._meta_stamp = None
+        with self._file_lock(exclusive=False):
+            self._load()
+
+    # --- Persistence ---
+    @contextlib.contextmanager
+    def _file_lock(self, exclusive: bool):
+        """Cross-process lock: exclusive while changing the files, shared while reading them."""
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _stat_meta(self):
+        """Identifies one version of the sidecar (each save replaces it with a new file)."""
+        try:
+            st = os.stat(self.meta_path)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _load(self):
+        if not os.path.exists(self.meta_path) or not os.path.exists(self.vectors_path):
+            self._ids, self._payloads, self._row_of = [], [], {}
+            self._alive = np.zeros(0, dtype=bool)
+            self._vectors = None
+            self._meta_stamp = None
+            return
+        with open(self.meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("provider") != self.provider.name or meta.get("dim") != self.provider.dim:
+            raise ValueError(f"Index at {self.path} was built with {meta.get('provider')}, not {self.provider.name}.")
+        self._ids = meta["ids"]
+        self._payloads = meta["payloads"]
+        self._row_of = {doc_id: row for row, doc_id in enumerate(self._ids) if doc_id is not None}
+        self._alive = np.array([doc_id is not None for doc_id in self._ids], dtype=bool)
+        self._vectors = np.load(self.vectors_path, mmap_mode="r+")
+        self._meta_stamp = self._stat_meta()
+
+    def _save_meta(self):
+        meta = {"provider": self.provider.name, "dim": self.provider.dim, "ids": self._ids, "payloads": self._payloads}
+        tmp_path = f"{self.meta_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self.meta_path)
+        self._meta_stamp = self._stat_meta()
+
+    def _refresh_if_changed(self, locked: bool = False):
+        """Picks up rows written by another worker process. Pass locked=True when already holding
+        the file lock (flock locks are per open file, so taking it again here would deadlock)."""
+        stamp = self._stat_meta()
+        if stamp is None or stamp == self._meta_stamp:
+            return
+        if locked:
+            self._load()
+        else:
+            with self._file_lock(exclusive=False):
+                self._load()
+
+    def _ensure_capacity(self, rows_needed: int):
+        capacity = 0 if self._vectors is None else self._vectors.shape[0]
+        if rows_needed <= capacity:
+            return
+        new_capacity = max(self.initial_capacity, capacity)
+        while new_capacity < rows_needed:
+            new_capacity *= 2
+        tmp_path = f"{self.vectors_path}.tmp.npy"
+        grown = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(new_capacity, self.provider.dim))
+        if capacity:
+            grown[:len(self._ids)] = self._vectors[:len(self._ids)]
+        grown.flush()
+        del grown
+        os.replace(tmp_path, self.vectors_path)
+        self._vectors = np.load(self.vectors_path, mmap_mode="r+")
+    # --- End Persistence ---
+
+    def __len__(self):
+        return len(self._row_of)
+
+    def ids(self) -> list:
+        return list(self._row_of)
+
+    def payload(self, doc_id):
+        row = self._row_of.get(doc_id)
+        return None if row is None else self._payloads[row]
+
+    def add(self, ids: list, texts: list, payloads: list = None):
+        """Embeds texts and appends them; re-adding an existing id replaces it."""
+        if not ids:
+            return
+        payloads = payloads or [{} for _ in ids]
+        vectors = _normalize_rows(self.provider.embed(list(texts)))
+        with self._lock, self._file_lock(exclusive=True):
+            self._refresh_if_changed(locked=True)
+            self._tombstone(ids)
+            start = len(self._ids)
+            self._ensure_capacity(start + len(ids))
+            self._vectors[start:start + len(ids)] = vectors
+            self._vectors.flush()
+            for offset, (doc_id, payload) in enumerate(zip(ids, payloads)):
+                self._row_of[doc_id] = start + offset
+            self._ids.extend(ids)
+            self._payloads.extend(payloads)
+            self._alive = np.concatenate([self._alive, np.ones(len(ids), dtype=bool)])
+            self._save_meta()
+
+    def _tombstone(self, ids) -> int:
+        removed = 0
+        for doc_id in ids:
+            row = self._row_of.pop(doc_id, None)
+            if row is not None:
+                self._ids[row] = None
+                self._payloads[row] = None
+                self._alive[row] = False
+                removed += 1
+        return removed
+
+    def delete(self, ids: list) -> int:
+        with self._lock, self._file_lock(exclusive=True):
+            self._refresh_if_changed(locked=True)
+            removed = self._tombstone(ids)
+            if removed:
+                if len(self._ids) > 64 and len(self._row_of) < len(self._ids) // 2:
+                    self._compact()
+                else:
+                    self._save_meta()
+            return removed
+
+    def compact(self):
+        """Rewrites the vector file without deleted rows."""
+        with self._lock, self._file_lock(exclusive=True):
+            self._refresh_if_changed(locked=True)
+            self._compact()
+
+    def _compact(self):
+        live_rows = np.flatnonzero(self._alive)
+        live_vectors = np.array(self._vectors[live_rows]) if self._vectors is not None else None
+        self._ids = [self._ids[row] for row in live_rows]
+        self._payloads = [self._payloads[row] for row in live_rows]
+        self._row_of = {doc_id: row for row, doc_id in enumerate(self._ids)}
+        self._alive = np.ones(len(self._ids), dtype=bool)
+        if os.path.exists(self.vectors_path):
+            os.remove(self.vectors_path)
+        self._vectors = None
+        self._ensure_capacity(max(len(self._ids), 1))
+        if len(self._ids):
+            self._vectors[:len(self._ids)] = live_vectors
+            self._vectors.flush()
+        self._save_meta()
+
+    def search(self, queries: list, k: int = 3) -> list:
+        """For each query text returns up to k (doc_id, cosine_score, payload) tuples, best first."""
+        if not queries:
+            return []
+        query_vectors = _normalize_rows(self.provider.embed_queries(list(queries)))
+        with self._lock:
+            self._refresh_if_changed()
+            count = len(self._ids)
+            if count == 0 or not len(self._row_of):
+                return [[] for _ in queries]
+            scores = query_vectors @ self._vectors[:count].T # (queries, rows)
+            scores[:, ~self._alive[:count]] = -np.inf
+            k = min(k, len(self._row_of))
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            results = []
+            for q, rows in enumerate(top):
+                rows = rows[np.argsort(-scores[q, rows])]
+                results.append([(self._ids[row], float(scores[q, row]), self._payloads[row]) for row in rows])
+            return results
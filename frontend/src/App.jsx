@@ -11,6 +11,8 @@ function App() {
   const [isLoading, setIsLoading] = useState(false);
   // Ref for the chat history container (for scrolling)
   const chatHistoryRef = useRef(null);
+  // Conversation id so the backend can keep this chat's history (one per page load)
+  const sessionIdRef = useRef(crypto.randomUUID());
 
   // Async function to handle sending messages
   const sendMessage = async () => {
@@ -34,7 +36,8 @@ function App() {
       // 2. Call backend API
       console.log(`Sending query to backend: ${userMessageText}`); // Use the correct variable
       const response = await axios.post('http://localhost:5000/chat', {
-        query: userMessageText
+        query: userMessageText,
+        session_id: sessionIdRef.current
       });
       console.log('Received response from backend:', response.data);
 